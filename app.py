@@ -9,29 +9,57 @@ Licença: MIT
 
 # Módulos nativos do Python
 import os
+import gzip
+import hashlib
+import json
+import math
+import threading
+import time
 
 # Bibliotecas de terceiros
-from flask import Flask, render_template, request, redirect, url_for
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from flask import Flask, Response, abort, g, render_template, request, redirect, send_from_directory, url_for
 from dotenv import load_dotenv
-import pandas as pd
-# import folium (para futuras implementações de mapas interativos)
 
 # Bibliotecas locais
-from caixa.modules.planilhas import formata_moeda
+# Os módulos que dependem de pandas, numpy e gspread são importados apenas nas rotas que os utilizam,
+# de forma que as páginas do portfolio não esperam pela importação dessas bibliotecas
+from caixa.modules.snapshot import carrega_snapshot, carrega_grupos, carrega_parciais, DIRETORIO_SNAPSHOTS
+from caixa.modules.metricas import MetricasHTTP
 
 
-# Credenciais e autenticação
 load_dotenv()
-arquivo_credenciais = "imoveis-da-caixa-293ec7fa1219.json"
-conteudo_credenciais = os.environ.get("GSPREAD_CREDENTIALS")
-with open (arquivo_credenciais, "w") as f:
-    f.write(conteudo_credenciais)
-conta = ServiceAccountCredentials.from_json_keyfile_name(arquivo_credenciais)
-api = gspread.authorize(conta)
-sheets_api = os.environ.get("SHEETS_API")
-planilha = api.open_by_key(sheets_api)
+
+# Armazenamento dos imóveis (SQLite local por padrão, ou o próprio Sheets com ARMAZENAMENTO=sheets)
+# É aberto apenas na primeira requisição que precisa dele e compartilhado por todas as requisições do processo,
+# de forma que a autenticação no Google não bloqueia a inicialização e uma falha do Sheets não impede o site de subir
+_armazenamento = None
+_trava_armazenamento = threading.Lock()
+
+
+def obtem_armazenamento():
+    """
+    Função para obter o armazenamento dos imóveis, aberto na primeira chamada.
+    """
+    global _armazenamento
+    if _armazenamento is None:
+        with _trava_armazenamento:
+            if _armazenamento is None:
+                from caixa.modules.armazenamento import abre_armazenamento
+                _armazenamento = abre_armazenamento()
+    return _armazenamento
+
+
+def le_imoveis(uf):
+    """
+    Função para obter os imóveis de um estado.
+    Utiliza o snapshot binário gerado pela atualização periódica (mapeado em memória e compartilhado entre os workers),
+    e recorre ao armazenamento apenas quando ele ainda não existe.
+    """
+    from caixa.modules.tabela import carrega_tabela
+    tabela = carrega_tabela(uf)
+    if tabela is not None:
+        return tabela.para_dataframe()
+    return obtem_armazenamento().le_estado(uf)
 
 
 # Dicionário de estados
@@ -69,6 +97,93 @@ estados_dict = {
 # Definições e rotas do Flask
 app = Flask(__name__)
 
+
+# Métricas das requisições (latência e cache por rota), expostas em /metrics
+metricas_http = MetricasHTTP()
+
+
+def rota_atual():
+    """
+    Retorna o modelo da rota da requisição (ex.: /imoveis/<uf>), para que as métricas não sejam separadas por estado ou município.
+    """
+    return request.url_rule.rule if request.url_rule is not None else "desconhecida"
+
+
+@app.before_request
+def inicia_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@app.after_request
+def registra_medicao(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        metricas_http.observa(rota_atual(), request.method, resposta.status_code, time.perf_counter() - inicio)
+    return resposta
+
+
+@app.template_filter('moeda')
+def moeda(valor):
+    from caixa.modules.planilhas import formata_moeda
+    return formata_moeda(valor)
+
+
+# Cabeçalho de cache das respostas versionadas: os navegadores e CDNs reutilizam a resposta por 5 minutos,
+# e por até um dia enquanto a revalidam em segundo plano (os dados são atualizados periodicamente)
+CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=86400"
+# Respostas já geradas, por rota e estado, reaproveitadas enquanto a versão dos dados não mudar
+_cache_respostas = {}
+
+
+def resposta_cacheavel(versao, gera_corpo, tipo="text/html; charset=utf-8", memoriza=None):
+    """
+    Função para gerar uma resposta HTTP a partir da versão dos dados que a originam.
+    A versão é usada como ETag forte: se o cliente já tem a mesma versão (If-None-Match), a resposta é 304, sem gerar o corpo.
+    Com memoriza (chave da resposta), o corpo gerado é guardado em memória e reaproveitado enquanto a versão não mudar.
+    O corpo é compactado com gzip quando o cliente aceita (com uma ETag própria, já que os bytes são outros).
+    Sem versão (dados calculados em tempo real), a resposta é gerada normalmente e não é cacheável.
+    """
+
+    if versao is None:
+        metricas_http.registra_cache(rota_atual(), 'sem_versao')
+        resposta = Response(gera_corpo(), mimetype=tipo)
+        resposta.headers['Cache-Control'] = 'no-cache'
+        return resposta
+
+    usa_gzip = 'gzip' in request.accept_encodings
+    # Corpos pequenos não são compactados: um cliente que aceita gzip pode ter guardado a versão com qualquer uma das ETags
+    etags_validas = [f"{versao}-gz", versao] if usa_gzip else [versao]
+    etag = next((etag for etag in etags_validas if etag in request.if_none_match), None)
+    if etag is not None:
+        metricas_http.registra_cache(rota_atual(), 'validado')
+        resposta = Response(status=304)
+    else:
+        em_cache = _cache_respostas.get(memoriza) if memoriza else None
+        metricas_http.registra_cache(rota_atual(), 'memoria' if em_cache is not None and em_cache[0] == versao else 'gerado')
+        if em_cache is None or em_cache[0] != versao:
+            corpo = gera_corpo()
+            corpo = corpo.encode('utf-8') if isinstance(corpo, str) else corpo
+            em_cache = (versao, corpo, gzip.compress(corpo, compresslevel=6) if len(corpo) > 1024 else None)
+            if memoriza:
+                _cache_respostas[memoriza] = em_cache
+        _, corpo, corpo_gzip = em_cache
+        resposta = Response(corpo, mimetype=tipo)
+        if usa_gzip and corpo_gzip is not None:
+            resposta.set_data(corpo_gzip)
+            resposta.headers['Content-Encoding'] = 'gzip'
+            etag = f"{versao}-gz"
+        else:
+            etag = versao
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = CACHE_CONTROL
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    return resposta
+
+
+def serializa_json(conteudo):
+    return json.dumps(conteudo, ensure_ascii=False, separators=(',', ':'))
+
+
 # Injeção de contexto - padroniza os metadados do site
 @app.context_processor
 def inject_site_metadata():
@@ -93,6 +208,28 @@ def bio():
 def imoveis():
     return render_template("imoveis.html", estados=estados_dict.keys())
 
+# Rota para mostrar as estatísticas nacionais
+@app.route("/imoveis/brasil")
+def mostrar_dados_nacionais():
+
+    from caixa.modules.nacional import UF_NACIONAL, prepara_dados_nacionais
+
+    # Utiliza o snapshot nacional gerado pela atualização periódica, se existir
+    snapshot = carrega_snapshot(UF_NACIONAL)
+    if snapshot is not None:
+        return resposta_cacheavel(
+            snapshot['versao'],
+            lambda: render_template("imoveis_nacional.html", dados=snapshot['dados'], estados_dict=estados_dict),
+            memoriza=('html', UF_NACIONAL)
+        )
+
+    # Sem snapshot: combina os agregados parciais de cada estado (sem reler os imóveis)
+    parciais = carrega_parciais()
+    if not parciais:
+        abort(404)
+    dados = prepara_dados_nacionais(parciais)
+    return render_template("imoveis_nacional.html", dados=dados, estados_dict=estados_dict)
+
 # Rota para mostrar os imóveis de um estado
 @app.route("/mostrar_imoveis", methods=['POST'])
 def mostrar_imoveis():
@@ -102,89 +239,189 @@ def mostrar_imoveis():
 # Rota para mostrar os dados do estado selecionado
 @app.route("/imoveis/<uf>")
 def mostrar_dados_uf(uf):
-
-    # Obtém os dados da planilha e converte para DataFrame
-    sheet = planilha.worksheet(uf)
-    dados = sheet.get_all_values()
-    df = pd.DataFrame(dados[1:], columns=dados[0])
-
-    # Limpeza e conversão de dados
-    # Lista de colunas para converter
-    colunas_para_converter = ['Preco', 'Valor_Avaliacao', 'Desconto', 'Area_Total', 'Area_Privativa', 'Area_Terreno']
-    for coluna in colunas_para_converter:
-        df[coluna] = df[coluna].str.replace(',', '.').astype(float)
-
-    # Filtrar imóveis com Preco >= 100
-    # Exclui imóveis com erro de preenchimento no campo Preço
-    df_filtrado = df[df['Preco'].astype(float) >= 100]
-
-    # Dados para exibição
-    # Obtém os 3 imóveis mais baratos e mais caros, bem como seus preços
-    mais_baratos = df_filtrado.nsmallest(3, 'Preco').to_dict('records')
-    mais_caros = df_filtrado.nlargest(3, 'Preco').to_dict('records')
-    mais_barato_valor = formata_moeda(df_filtrado['Preco'].min())
-    mais_caro_valor = formata_moeda(df_filtrado['Preco'].max())
-
-    # Obtém o imóvel com o maior desconto
-    mais_descontado = df_filtrado.nlargest(1, 'Desconto').to_dict('records')[0]
-
-    # Obtém a quantidade de imóveis com desconto maior que zero
-    # Ignora casos em que o desconto é zero ou negativo
-    quantidade_desconto = df_filtrado[df_filtrado['Desconto'] > 0].shape[0]
-
-    # Obtém o preço médio dos imóveis
-    preco_medio = df_filtrado['Preco'].mean().round(2)
-    preco_medio = formata_moeda(preco_medio)
-
-    # Obtém o tipo de imóvel mais comum
-    tipo_comum = df_filtrado['Tipo_Imovel'].mode()[0]
-
-    # Obtém a modalidade de venda mais comum
-    modalidade_comum = df_filtrado['Modalidade_venda'].mode()[0]
-
-    # Porcentagem de venda direta
-    # Soma as modalidades de Venda Direta Online e Venda Online
-    venda_direta = df_filtrado['Modalidade_venda'].str.contains('Venda Direta Online|Venda Online').sum()/len(df_filtrado)*100
-
-    # Estrutura de dados para exibição
-    dados = {
-        'mais_baratos': mais_baratos,
-        'mais_barato_valor': mais_barato_valor,
-        'mais_caro_valor': mais_caro_valor,
-        'mais_caros': mais_caros,
-        'mais_descontado': mais_descontado,
-        'quantidade_imoveis': len(df),
-        'quantidade_desconto': quantidade_desconto,
-        'preco_medio': preco_medio,
-        'modalidade': modalidade_comum,
-        'venda_direta': f'{venda_direta:.2f}%',
-        'tipo_comum': tipo_comum
-    }
-
-
-    """
-    # Cria um mapa a partir dos dados de cada estado
-    # Removido pois tornou o carregamento da página muito lento
-    
-    latitude_inicial = df['Latitude'].mean()
-    longitude_inicial = df['Longitude'].mean()
-    m = folium.Map([latitude_inicial, longitude_inicial], zoom_start=7)
-
-    # Itere sobre as linhas do DataFrame
-    for index, row in df.iterrows():
-        folium.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            tooltip=row['Endereco'],
-            popup=row['Descricao'],
-            icon=folium.Icon(color='red')
-        ).add_to(m)
-    
-    # Converter o mapa para HTML
-    mapa_html = m._repr_html_()
-
-    """
-
-    return render_template("imoveis_uf.html", uf=estados_dict[uf], dados=dados)
+    if uf not in estados_dict:
+        abort(404)
+    from caixa.modules.mapa import carrega_indice_pontos, limites_indice
+
+    # O mapa é carregado de forma assíncrona pela página, a partir da rota de pontos
+    # Aqui é necessário apenas o enquadramento inicial, obtido do índice espacial do estado
+    indice = carrega_indice_pontos(uf)
+    # Lista de municípios para a navegação por município, a partir dos agregados gerados pela atualização periódica
+    grupos = carrega_grupos(uf)
+
+    def renderiza(dados):
+        limites = limites_indice(indice)
+        cidades = []
+        if grupos is not None:
+            cidades = sorted(grupos['cidades'].items(), key=lambda item: item[1]['nome'])
+        return render_template("imoveis_uf.html", uf=estados_dict[uf], sigla=uf, dados=dados, limites=limites, cidades=cidades)
+
+    # Utiliza o snapshot gerado pela atualização periódica, se existir
+    # A página só muda quando muda a versão do snapshot, dos agregados por município ou do índice do mapa
+    snapshot = carrega_snapshot(uf)
+    if snapshot is not None:
+        versao = "-".join([
+            snapshot['versao'],
+            grupos['versao'] if grupos is not None else "",
+            str(indice['versao']) if indice is not None else ""
+        ])
+        return resposta_cacheavel(versao, lambda: renderiza(snapshot['dados']), memoriza=('html', uf))
+
+    # Sem snapshot: obtém os dados armazenados e calcula as estatísticas em tempo real
+    from caixa.modules.planilhas import prepara_dados_uf
+    return renderiza(prepara_dados_uf(le_imoveis(uf)))
+
+# API com os dados do estado selecionado (a mesma estrutura exibida na página)
+@app.route("/api/imoveis/<uf>")
+def api_dados_uf(uf):
+    if uf not in estados_dict:
+        abort(404)
+
+    snapshot = carrega_snapshot(uf)
+    if snapshot is not None:
+        conteudo = {'UF': uf, 'versao': snapshot['versao'], 'gerado_em': snapshot['gerado_em'], 'dados': snapshot['dados']}
+        return resposta_cacheavel(snapshot['versao'], lambda: serializa_json(conteudo), tipo="application/json", memoriza=('api', uf))
+
+    # Sem snapshot: calcula os dados em tempo real
+    from caixa.modules.planilhas import prepara_dados_uf
+    conteudo = {'UF': uf, 'versao': None, 'gerado_em': None, 'dados': prepara_dados_uf(le_imoveis(uf))}
+    return resposta_cacheavel(None, lambda: serializa_json(conteudo), tipo="application/json")
+
+# Rota com os imóveis de um estado para o mapa, agrupados conforme a área visível (bbox=oeste,sul,leste,norte) e o zoom
+@app.route("/imoveis/<uf>/pontos")
+def pontos_uf(uf):
+    if uf not in estados_dict:
+        abort(404)
+    from caixa.modules.mapa import ZOOM_MAXIMO, carrega_indice_pontos, constroi_indice_pontos, consulta_pontos, tiles_area
+
+    # Utiliza o índice espacial gerado pela atualização periódica, se existir
+    indice = carrega_indice_pontos(uf)
+    if indice is None:
+        indice = constroi_indice_pontos(le_imoveis(uf))
+
+    zoom = min(max(request.args.get('zoom', 6, type=int), 0), ZOOM_MAXIMO + 4)
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            limites = tuple(float(valor) for valor in bbox.split(','))
+            # Valores como nan e inf são aceitos por float(), mas não correspondem a uma área no mapa
+            if len(limites) != 4 or not all(math.isfinite(valor) for valor in limites):
+                raise ValueError(f"bbox inválido: {bbox}")
+            tiles = tiles_area(limites, zoom)
+        except ValueError:
+            abort(400)
+    else:
+        tiles = (0, 0, 2 ** zoom - 1, 2 ** zoom - 1)
+
+    # A resposta depende apenas da versão do índice, do zoom e dos tiles visíveis
+    versao = f"{indice['versao']}-{zoom}-{'-'.join(map(str, tiles))}"
+    return resposta_cacheavel(versao, lambda: serializa_json(consulta_pontos(indice, tiles, zoom)), tipo="application/geo+json")
+
+
+# Rota para mostrar os dados de um município (ou de um bairro) do estado selecionado
+# Os agregados são calculados na atualização periódica: cada página é uma consulta direta pelo identificador do município
+@app.route("/imoveis/<uf>/<cidade>")
+@app.route("/imoveis/<uf>/<cidade>/<bairro>")
+def mostrar_dados_cidade(uf, cidade, bairro=None):
+    if uf not in estados_dict:
+        abort(404)
+
+    # Utiliza os agregados gerados pela atualização periódica, se existirem
+    grupos = carrega_grupos(uf)
+    if grupos is not None:
+        cidades = grupos['cidades']
+    else:
+        from caixa.modules.planilhas import calcula_grupos
+        cidades = calcula_grupos(le_imoveis(uf))
+
+    dados_cidade = cidades.get(cidade)
+    if dados_cidade is None:
+        abort(404)
+    dados = dados_cidade
+    if bairro is not None:
+        dados = dados_cidade.get('bairros', {}).get(bairro)
+        if dados is None:
+            abort(404)
+
+    def renderiza():
+        return render_template("imoveis_cidade.html", uf=estados_dict[uf], sigla=uf, cidade=cidade, bairro=bairro,
+                               dados_cidade=dados_cidade, dados=dados)
+
+    # As páginas de municípios e bairros não são guardadas em memória (são muitas), mas usam a versão dos agregados como ETag
+    versao = f"{grupos['versao']}-{cidade}-{bairro or ''}" if grupos is not None else None
+    return resposta_cacheavel(versao, renderiza)
+
+
+# Busca de imóveis de todos os estados por múltiplos critérios, paginada
+# ex.: /api/busca?cidade=Campinas&tipo=Apartamento&preco_max=200000&desconto_min=40&ordem=preco&pagina=1
+# O índice em memória é construído a partir dos snapshots binários e reconstruído quando algum deles muda
+@app.route("/api/busca")
+def api_busca():
+    from caixa.modules.busca import carrega_indice, le_parametros
+
+    indice = carrega_indice(estados_dict)
+    if indice is None:
+        abort(503)
+    try:
+        parametros = le_parametros(request.args)
+    except ValueError:
+        abort(400)
+
+    # A resposta depende apenas da versão do índice e dos parâmetros da busca (a busca só é feita se o cliente não tiver a versão)
+    versao = f"{indice.versao}-{hashlib.sha1(request.query_string).hexdigest()[:16]}"
+    return resposta_cacheavel(versao, lambda: serializa_json(indice.busca(**parametros)), tipo="application/json")
+
+
+# Arquivos para download gerados pela atualização periódica (CSV compactado e Parquet por estado, CSV nacional e manifesto)
+# Servidos como arquivos estáticos, com suporte a Range (downloads retomáveis) e o hash do conteúdo como ETag
+@app.route("/dados/<path:arquivo>")
+def dados_publicados(arquivo):
+    from caixa.modules.publicacao import DIRETORIO_PUBLICACAO, ARQUIVO_MANIFESTO, carrega_manifesto
+
+    if arquivo == ARQUIVO_MANIFESTO:
+        resposta = send_from_directory(DIRETORIO_PUBLICACAO, arquivo, mimetype="application/json")
+    else:
+        # Apenas os arquivos registrados no manifesto são servidos (nunca os temporários de uma gravação em andamento)
+        entrada = (carrega_manifesto() or {}).get('arquivos', {}).get(arquivo)
+        if entrada is None:
+            abort(404)
+        resposta = send_from_directory(DIRETORIO_PUBLICACAO, arquivo, mimetype=entrada['tipo'], etag=entrada['sha256'],
+                                       as_attachment=True)
+        # O Werkzeug só informa o suporte a Range nas respostas a requisições com Range
+        resposta.headers['Accept-Ranges'] = 'bytes'
+    resposta.headers['Cache-Control'] = CACHE_CONTROL
+    return resposta
+
+
+# Verificação de saúde do processo: responde sem acessar o armazenamento nem importar bibliotecas pesadas
+@app.route("/saude")
+def saude():
+    return {'status': 'ok'}
+
+# Verificação de prontidão: as páginas de imóveis podem ser servidas a partir dos snapshots ou do armazenamento
+@app.route("/saude/pronto")
+def prontidao():
+    try:
+        snapshots = sum(1 for arquivo in os.listdir(DIRETORIO_SNAPSHOTS) if arquivo.endswith(".json"))
+    except OSError:
+        snapshots = 0
+    estado = {'status': 'ok', 'snapshots': snapshots, 'armazenamento': 'aberto' if _armazenamento is not None else 'não aberto'}
+
+    # Sem snapshots, as páginas dependem do armazenamento, que é aberto aqui para verificar a sua disponibilidade
+    if not snapshots:
+        try:
+            obtem_armazenamento()
+            estado['armazenamento'] = 'aberto'
+        except Exception as e:
+            estado.update(status='indisponível', erro=str(e))
+            return estado, 503
+    return estado
+
+
+# Métricas do processo no formato do Prometheus (com vários workers do gunicorn, cada processo expõe as suas)
+@app.route("/metrics")
+def metricas():
+    return Response(metricas_http.exporta(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 if __name__ == '__main__':
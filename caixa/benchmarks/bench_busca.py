@@ -0,0 +1,97 @@
+"""
+Benchmark da busca de imóveis por múltiplos critérios (rota /api/busca) sobre o índice em memória (caixa/modules/busca.py).
+Gera uma planilha sintética nacional, grava os snapshots binários de cada estado em um diretório temporário,
+constrói o índice e mede a latência (p50 e p99) de consultas típicas, diretamente no índice e pela rota da aplicação.
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.bench_busca [n_linhas] [repeticoes]
+"""
+
+import sys
+import time
+import random
+import tempfile
+import statistics
+from contextlib import redirect_stdout
+from io import StringIO
+from urllib.parse import urlencode
+
+from caixa.benchmarks.gerador import ESTADOS, gera_csv
+from caixa.modules import tabela
+from caixa.modules.planilhas import ArquivoLinhas, le_csv_caixa, linhas_csv, trata_planilha
+from caixa.modules.busca import carrega_indice, le_parametros
+
+
+def prepara_tabelas(n_linhas, diretorio):
+    """
+    Gera a planilha sintética e grava o snapshot binário de cada estado no diretório informado.
+    """
+    df = trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(n_linhas)])))).fillna("")
+    tabela.DIRETORIO_TABELAS = diretorio
+    with redirect_stdout(StringIO()):
+        for UF, df_uf in df.groupby('UF', observed=True):
+            tabela.salva_tabela(UF, df_uf)
+    return df
+
+
+def consultas(df, quantidade, semente=0):
+    """
+    Gera consultas típicas: município, tipo, preço máximo e desconto mínimo; estado ordenado por desconto;
+    faixa de área privativa e modalidade; todos os imóveis; e páginas mais distantes.
+    """
+    aleatorio = random.Random(semente)
+    cidades = df['Cidade'].astype(str).unique().tolist()
+    tipos = df['Tipo_Imovel'].astype(str).unique().tolist()
+    modalidades = df['Modalidade_venda'].astype(str).unique().tolist()
+    modelos = [
+        lambda: {'cidade': aleatorio.choice(cidades), 'tipo': aleatorio.choice(tipos),
+                 'preco_max': aleatorio.randint(100, 800) * 1000, 'desconto_min': aleatorio.randint(10, 50), 'ordem': 'preco'},
+        lambda: {'uf': aleatorio.choice(ESTADOS), 'ordem': '-desconto'},
+        lambda: {'area_privativa_min': 50, 'area_privativa_max': 100, 'modalidade': aleatorio.choice(modalidades),
+                 'ordem': '-area_privativa'},
+        lambda: {'preco_min': 200000, 'preco_max': 300000, 'pagina': aleatorio.randint(1, 20)},
+        lambda: {'ordem': 'preco', 'pagina': aleatorio.randint(1, 100)},
+    ]
+    return [modelos[i % len(modelos)]() for i in range(quantidade)]
+
+
+def percentis(tempos):
+    tempos = sorted(tempos)
+    return statistics.median(tempos) * 1000, tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))] * 1000
+
+
+def executa(n_linhas=100000, repeticoes=1000):
+    import app
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        df = prepara_tabelas(n_linhas, diretorio)
+
+        inicio = time.perf_counter()
+        indice = carrega_indice(ESTADOS)
+        print(f"Índice de {indice.linhas} imóveis construído em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+        parametros = consultas(df, repeticoes)
+        tempos_indice = []
+        for argumentos in parametros:
+            inicio = time.perf_counter()
+            indice.busca(**le_parametros({chave: str(valor) for chave, valor in argumentos.items()}))
+            tempos_indice.append(time.perf_counter() - inicio)
+
+        cliente = app.app.test_client()
+        tempos_rota = []
+        for argumentos in parametros:
+            inicio = time.perf_counter()
+            resposta = cliente.get(f"/api/busca?{urlencode(argumentos)}")
+            tempos_rota.append(time.perf_counter() - inicio)
+            assert resposta.status_code == 200, resposta.status_code
+
+    print(f"{'':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for nome, tempos in [('índice', tempos_indice), ('rota', tempos_rota)]:
+        p50, p99 = percentis(tempos)
+        print(f"{nome:>8} {p50:>9.2f} {p99:>9.2f}")
+
+
+if __name__ == '__main__':
+    n_linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    executa(n_linhas, repeticoes)
@@ -0,0 +1,62 @@
+"""
+Benchmark da comparação entre a planilha da Caixa e os registros armazenados (compara_registros),
+em comparação com a abordagem anterior de main.py (isin nos dois sentidos, sem normalização dos IDs).
+Os registros armazenados simulam a leitura do Sheets, com IDs numéricos, enquanto os da Caixa têm IDs em texto.
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.bench_diferencas [n_linhas]
+"""
+
+import sys
+
+import numpy as np
+
+from caixa.benchmarks.gerador import gera_csv
+from caixa.benchmarks.bench_trata_planilha import mede
+from caixa.modules.planilhas import ArquivoLinhas, le_csv_caixa, linhas_csv, trata_planilha
+from caixa.modules.diferencas import compara_registros
+
+
+def compara_anterior(df_caixa, df_armazenado):
+    df_novos = df_caixa[~df_caixa['ID_imovel'].isin(df_armazenado['ID_imovel'])]
+    df_arquivados = df_armazenado[~df_armazenado['ID_imovel'].isin(df_caixa['ID_imovel'])]
+    return {'novos': df_novos, 'arquivados': df_arquivados}
+
+
+def prepara_dados(n_linhas, proporcao=0.01):
+    """
+    Gera a planilha da Caixa e uma versão armazenada com 1% dos registros substituídos por outros (arquivados),
+    1% a menos e 1% com preço alterado.
+    """
+    df_caixa = trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(n_linhas)])))).fillna("")
+    return df_caixa, simula_armazenado(df_caixa, proporcao)
+
+
+def simula_armazenado(df_caixa, proporcao=0.01):
+    """
+    Gera, a partir da planilha da Caixa, a versão armazenada descrita em prepara_dados.
+    """
+    aleatorio = np.random.default_rng(0)
+    n_alteracoes = int(len(df_caixa) * proporcao)
+
+    df_armazenado = df_caixa.iloc[n_alteracoes:].copy().reset_index(drop=True)
+    df_armazenado['ID_imovel'] = df_armazenado['ID_imovel'].astype('int64')
+    df_armazenado.loc[:n_alteracoes - 1, 'ID_imovel'] += 10**12
+    alterados = aleatorio.choice(np.arange(n_alteracoes, len(df_armazenado)), n_alteracoes, replace=False)
+    df_armazenado.loc[alterados, 'Preco'] *= 1.1
+    return df_armazenado.sample(frac=1, random_state=0)
+
+
+def executa(n_linhas=100000):
+    df_caixa, df_armazenado = prepara_dados(n_linhas)
+    print(f"Comparação de {len(df_caixa)} registros da Caixa com {len(df_armazenado)} registros armazenados")
+    print("Esperado: 2% de novos, 1% de arquivados e 1% de alterados")
+
+    for nome, funcao in [('anterior', compara_anterior), ('atual', compara_registros)]:
+        tempo, pico, resultado = mede(lambda: funcao(df_caixa, df_armazenado))
+        contagens = ", ".join(f"{chave}: {len(valor)}" for chave, valor in resultado.items())
+        print(f"{nome:>9}: {tempo * 1000:.1f} ms | pico de memória {pico:.1f} MiB | {contagens}")
+
+
+if __name__ == '__main__':
+    executa(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,39 @@
+"""
+Benchmark da ingestão do CSV da Caixa: leitura em memória (conteúdo completo, decodificado, filtrado e copiado para StringIO)
+comparada com a leitura em streaming (linhas_csv + ArquivoLinhas), informando tempo e pico de memória.
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.bench_ingestao [n_linhas]
+"""
+
+import sys
+from io import StringIO
+
+from caixa.benchmarks.gerador import gera_csv
+from caixa.benchmarks.bench_trata_planilha import mede
+from caixa.modules.planilhas import TAMANHO_BLOCO, ArquivoLinhas, le_csv_caixa, linhas_csv
+
+
+def le_em_memoria(conteudo):
+    texto = conteudo.decode('iso-8859-1')
+    texto_limpo = "\n".join(linha for linha in texto.splitlines() if linha.strip('; \n\r'))
+    return le_csv_caixa(StringIO(texto_limpo))
+
+
+def le_em_streaming(conteudo):
+    blocos = (conteudo[i:i + TAMANHO_BLOCO] for i in range(0, len(conteudo), TAMANHO_BLOCO))
+    return le_csv_caixa(ArquivoLinhas(linhas_csv(blocos)))
+
+
+def executa(n_linhas=50000):
+    conteudo = gera_csv(n_linhas)
+    print(f"Planilha nacional sintética: {n_linhas} registros, {len(conteudo) / 2**20:.1f} MiB")
+
+    for nome, funcao in [('memória', le_em_memoria), ('streaming', le_em_streaming)]:
+        tempo, pico, df = mede(lambda: funcao(conteudo))
+        memoria_df = df.memory_usage(deep=True).sum() / 2**20
+        print(f"{nome:>9}: {tempo:.3f} s | pico de memória {pico:.1f} MiB | DataFrame final {memoria_df:.1f} MiB")
+
+
+if __name__ == '__main__':
+    executa(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,57 @@
+"""
+Benchmark da inicialização a frio da aplicação Flask (app.py), como em um worker recém-criado do gunicorn:
+cada repetição inicia um novo processo Python, importa a aplicação e atende à primeira requisição de uma página estática.
+Informa o tempo de importação, o tempo até a primeira resposta, o pico de memória do processo
+e os módulos pesados carregados (pandas, numpy, gspread).
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.bench_inicializacao [repeticoes] [rota]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Código executado em cada processo filho
+CODIGO = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+resposta = app.app.test_client().get(sys.argv[1])
+respondido = time.perf_counter()
+print(json.dumps({
+    'importacao': importado - inicio,
+    'primeira_resposta': respondido - inicio,
+    'status': resposta.status_code,
+    'memoria': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modulos': [modulo for modulo in ('pandas', 'numpy', 'gspread') if modulo in sys.modules],
+}))
+"""
+
+
+def mede_processo(rota="/"):
+    raiz = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    saida = subprocess.run(
+        [sys.executable, "-c", CODIGO, rota], cwd=raiz, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def executa(repeticoes=5, rota="/"):
+    medidas = [mede_processo(rota) for _ in range(repeticoes)]
+    importacao = statistics.median(m['importacao'] for m in medidas) * 1000
+    primeira = statistics.median(m['primeira_resposta'] for m in medidas) * 1000
+    memoria = statistics.median(m['memoria'] for m in medidas)
+    print(f"Inicialização a frio ({repeticoes} processos, rota {rota}, status {medidas[-1]['status']})")
+    print(f"  importação de app.py: {importacao:.0f} ms (mediana)")
+    print(f"  até a primeira resposta: {primeira:.0f} ms (mediana)")
+    print(f"  pico de memória: {memoria:.0f} MiB")
+    print(f"  módulos pesados carregados: {', '.join(medidas[-1]['modulos']) or 'nenhum'}")
+
+
+if __name__ == '__main__':
+    executa(int(sys.argv[1]) if len(sys.argv) > 1 else 5, sys.argv[2] if len(sys.argv) > 2 else "/")
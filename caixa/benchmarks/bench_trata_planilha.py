@@ -0,0 +1,77 @@
+"""
+Microbenchmark da leitura e do tratamento das planilhas da Caixa (le_csv_caixa + trata_planilha).
+Compara a implementação anterior (quatro passagens de regex, conversões encadeadas de texto e tipos inferidos)
+com a atual, em uma planilha nacional sintética, informando tempo e pico de memória.
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.bench_trata_planilha [n_linhas]
+"""
+
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+import pandas as pd
+
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules.planilhas import le_csv_caixa, trata_planilha
+
+
+def le_csv_anterior(fonte):
+    return pd.read_csv(fonte, header=1, sep=';', encoding='utf-8', on_bad_lines='skip')
+
+
+def trata_planilha_anterior(df):
+    df.rename(columns={' N° do imóvel': 'ID_imovel', 'Endereço': 'Endereco', 'Preço': 'Preco', 'Valor de avaliação': 'Valor_Avaliacao', 'Descrição': 'Descricao', 'Modalidade de venda': 'Modalidade_venda', 'Link de acesso': 'Link_acesso'}, inplace=True)
+    df['Tipo_Imovel'] = df['Descricao'].str.extract(r'^(\w+)')
+    df['Area_Total'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área total').astype(float)
+    df['Area_Privativa'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área privativa').astype(float)
+    df['Area_Terreno'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área do terreno').astype(float)
+    df['Preco'] = df['Preco'].astype(str)
+    df['Valor_Avaliacao'] = df['Valor_Avaliacao'].astype(str)
+    df['Preco'] = df['Preco'].str.replace('.', '').str.replace(',', '.').astype(float)
+    df['Valor_Avaliacao'] = df['Valor_Avaliacao'].str.replace('.', '').str.replace(',', '.').astype(float)
+    df['Desconto'] = (df['Valor_Avaliacao'] - df['Preco']) / df['Valor_Avaliacao']*100
+    return df
+
+
+def mede(funcao, repeticoes=3):
+    """
+    Executa a função algumas vezes e retorna o melhor tempo (s), o pico de memória (MiB) e o último resultado.
+    """
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return melhor, pico / 2**20, resultado
+
+
+def executa(n_linhas=50000):
+    conteudo = gera_csv(n_linhas).decode('iso-8859-1')
+    texto = "\n".join(linha for linha in conteudo.splitlines() if linha.strip('; \n\r'))
+    print(f"Planilha nacional sintética: {n_linhas} registros, {len(texto) / 2**20:.1f} MiB")
+
+    implementacoes = {
+        'anterior': lambda: trata_planilha_anterior(le_csv_anterior(StringIO(texto))),
+        'atual': lambda: trata_planilha(le_csv_caixa(StringIO(texto))),
+    }
+
+    resultados = {}
+    for nome, funcao in implementacoes.items():
+        tempo, pico, df = mede(funcao)
+        memoria_df = df.memory_usage(deep=True).sum() / 2**20
+        resultados[nome] = tempo
+        print(f"{nome:>9}: {tempo:.3f} s | pico de memória {pico:.1f} MiB | DataFrame final {memoria_df:.1f} MiB")
+
+    print(f"Ganho: {resultados['anterior'] / resultados['atual']:.2f}x")
+
+
+if __name__ == '__main__':
+    executa(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,80 @@
+"""
+Gerador de planilhas sintéticas no formato dos CSVs de imóveis da Caixa.
+Utilizado pelos benchmarks para medir o desempenho do processamento sem acesso à rede.
+"""
+
+import random
+
+
+CABECALHO = ' N° do imóvel;UF;Cidade;Bairro;Endereço;Preço;Valor de avaliação;Desconto;Descrição;Modalidade de venda;Link de acesso'
+ESTADOS = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+TIPOS = ['Apartamento', 'Casa', 'Terreno', 'Sobrado', 'Loja', 'Prédio']
+MODALIDADES = ['Venda Direta Online', 'Venda Online', 'Leilão SFI - Edital Único', 'Licitação Aberta', '1º Leilão SFI', '2º Leilão SFI']
+BAIRROS = ['CENTRO', 'JARDIM AMÉRICA', 'VILA NOVA', 'SÃO JOSÉ', 'PARQUE DAS FLORES', 'CONJUNTO HABITACIONAL', 'SANTA CRUZ', 'BELA VISTA']
+LOGRADOUROS = ['RUA', 'AVENIDA', 'TRAVESSA', 'ALAMEDA', 'ESTRADA']
+
+
+def formata_numero(valor):
+    """
+    Formata um número no padrão brasileiro (123.456,78), como nos CSVs da Caixa.
+    """
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def gera_descricao(aleatorio, tipo):
+    """
+    Gera uma descrição no formato da Caixa. Algumas áreas são omitidas, como ocorre nos dados reais.
+    """
+    partes = [tipo]
+    if aleatorio.random() < 0.9:
+        partes.append(f"{aleatorio.uniform(30, 600):.2f} de área total")
+    if tipo != 'Terreno' and aleatorio.random() < 0.85:
+        partes.append(f"{aleatorio.uniform(20, 300):.2f} de área privativa")
+    if aleatorio.random() < 0.8:
+        partes.append(f"{aleatorio.uniform(0, 1000):.2f} de área do terreno")
+    if tipo in ('Apartamento', 'Casa', 'Sobrado'):
+        partes.append(f"{aleatorio.randint(1, 4)} qto(s)")
+        partes.append(aleatorio.choice(['a.serv', 'WC', 'sala', 'cozinha', '1 vaga(s) de garagem']))
+    return ", ".join(partes) + "."
+
+
+def gera_linhas(n_linhas, estados=None, semente=0, proporcao_vazias=0.02):
+    """
+    Gera as linhas de texto de uma planilha sintética da Caixa, incluindo a linha inicial descartável e
+    linhas em branco (';;;') intercaladas aos registros.
+    """
+    aleatorio = random.Random(semente)
+    estados = estados or ESTADOS
+    cidades = {UF: [f"CIDADE {UF} {i:03d}" for i in range(max(5, n_linhas // 200))] for UF in estados}
+
+    yield ' Lista de Imóveis da Caixa;;;;;;;;;;'
+    yield CABECALHO
+    for i in range(n_linhas):
+        UF = estados[i % len(estados)]
+        tipo = aleatorio.choice(TIPOS)
+        avaliacao = aleatorio.uniform(40000, 1500000)
+        preco = avaliacao * aleatorio.uniform(0.35, 1.0)
+        desconto = (avaliacao - preco) / avaliacao * 100
+        id_imovel = 1000000000000 + semente * 10000000 + i
+        yield ";".join([
+            f" {id_imovel}",
+            UF,
+            aleatorio.choice(cidades[UF]),
+            aleatorio.choice(BAIRROS),
+            f"{aleatorio.choice(LOGRADOUROS)} {aleatorio.randint(1, 300)}, N. {aleatorio.randint(1, 2000)}",
+            formata_numero(preco),
+            formata_numero(avaliacao),
+            f"{desconto:.2f}",
+            gera_descricao(aleatorio, tipo),
+            aleatorio.choice(MODALIDADES),
+            f"https://venda-imoveis.caixa.gov.br/sistema/detalhe-imovel.asp?hdnimovel={id_imovel}"
+        ])
+        if aleatorio.random() < proporcao_vazias:
+            yield ';;;;;;;;;;'
+
+
+def gera_csv(n_linhas, estados=None, semente=0):
+    """
+    Gera o conteúdo binário (iso-8859-1) de uma planilha sintética da Caixa, como retornado pelo servidor.
+    """
+    return ("\r\n".join(gera_linhas(n_linhas, estados, semente)) + "\r\n").encode('iso-8859-1')
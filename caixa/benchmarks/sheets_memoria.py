@@ -0,0 +1,111 @@
+"""
+Planilha do Google Sheets simulada em memória, com a parte da API do gspread utilizada por ClienteSheets.
+Permite medir o armazenamento no Sheets (ArmazenamentoSheets) sem acesso à rede: as chamadas são contadas
+e, opcionalmente, cada uma espera uma latência fixa, simulando o tempo de resposta da API.
+"""
+
+import re
+import time
+
+from gspread.utils import a1_to_rowcol
+
+
+class AbaMemoria:
+    """
+    Aba simulada: uma lista de linhas (a primeira é o cabeçalho) e o número de linhas da grade.
+    """
+
+    def __init__(self, planilha, titulo, identificador, linhas=None, linhas_grade=1000):
+        self.planilha = planilha
+        self.title = titulo
+        self.id = identificador
+        self.valores = [list(linha) for linha in (linhas or [])]
+        self.row_count = max(linhas_grade, len(self.valores))
+
+    def get_all_records(self):
+        self.planilha._chamada('get_all_records')
+        if len(self.valores) < 2:
+            return []
+        cabecalho = self.valores[0]
+        return [dict(zip(cabecalho, linha)) for linha in self.valores[1:]]
+
+    def col_values(self, coluna):
+        self.planilha._chamada('col_values')
+        return [linha[coluna - 1] for linha in self.valores if len(linha) >= coluna and linha[coluna - 1] != ""]
+
+
+class PlanilhaMemoria:
+    """
+    Planilha simulada, com worksheets(), batch_update() (remoção e inclusão de linhas),
+    values_batch_clear() e values_batch_update().
+    As chamadas feitas são contadas por método em `chamadas`.
+    """
+
+    def __init__(self, abas=None, latencia=0.0):
+        """
+        abas: dicionário {título: linhas}, com o cabeçalho na primeira linha
+        latencia: tempo de espera (s) de cada chamada
+        """
+        self.latencia = latencia
+        self.chamadas = {}
+        self.abas = {}
+        for titulo, linhas in (abas or {}).items():
+            self.adiciona_aba(titulo, linhas)
+
+    def _chamada(self, metodo):
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def adiciona_aba(self, titulo, linhas=None):
+        self.abas[titulo] = AbaMemoria(self, titulo, len(self.abas), linhas)
+        return self.abas[titulo]
+
+    def _aba_por_id(self, identificador):
+        return next(aba for aba in self.abas.values() if aba.id == identificador)
+
+    def _aba_intervalo(self, intervalo):
+        """
+        Separa um intervalo no formato 'Aba'!A1 em (aba, linha, coluna), com linha e coluna a partir de 1.
+        """
+        titulo, separador, celula = intervalo.rpartition('!')
+        if not separador:
+            # Intervalo com apenas o título: a aba inteira
+            titulo, celula = celula, ''
+        aba = self.abas[titulo.strip("'")]
+        if not celula or not re.match(r'^[A-Z]+\d+$', celula):
+            return aba, 1, 1
+        return (aba, *a1_to_rowcol(celula))
+
+    def worksheets(self):
+        self._chamada('worksheets')
+        return list(self.abas.values())
+
+    def batch_update(self, body):
+        self._chamada('batch_update')
+        for requisicao in body['requests']:
+            if 'deleteDimension' in requisicao:
+                intervalo = requisicao['deleteDimension']['range']
+                aba = self._aba_por_id(intervalo['sheetId'])
+                del aba.valores[intervalo['startIndex']:intervalo['endIndex']]
+                aba.row_count -= intervalo['endIndex'] - intervalo['startIndex']
+            elif 'appendDimension' in requisicao:
+                self._aba_por_id(requisicao['appendDimension']['sheetId']).row_count += requisicao['appendDimension']['length']
+
+    def values_batch_clear(self, body):
+        self._chamada('values_batch_clear')
+        for intervalo in body['ranges']:
+            self._aba_intervalo(intervalo)[0].valores = []
+
+    def values_batch_update(self, body):
+        self._chamada('values_batch_update')
+        for intervalo in body['data']:
+            aba, linha, coluna = self._aba_intervalo(intervalo['range'])
+            if linha - 1 + len(intervalo['values']) > aba.row_count:
+                raise ValueError(f"Escrita além da grade da aba {aba.title}: {intervalo['range']}")
+            while len(aba.valores) < linha - 1 + len(intervalo['values']):
+                aba.valores.append([])
+            for deslocamento, valores in enumerate(intervalo['values']):
+                atual = aba.valores[linha - 1 + deslocamento]
+                atual.extend([""] * (coluna - 1 + len(valores) - len(atual)))
+                atual[coluna - 1:coluna - 1 + len(valores)] = valores
@@ -0,0 +1,115 @@
+"""
+Suíte de benchmarks das etapas críticas da atualização periódica e da aplicação, em planilhas sintéticas de tamanhos crescentes:
+    leitura: decodificação e leitura do CSV da Caixa em streaming (linhas_csv + ArquivoLinhas + le_csv_caixa)
+    tratamento: limpeza e organização das colunas (trata_planilha)
+    diferencas: comparação com os registros armazenados (compara_registros), com 2% de novos, 1% de arquivados e 1% de alterados
+    estatisticas: dados da página do estado e estatísticas do snapshot (prepara_dados_uf + calcula_stats)
+    sheets: leitura e atualização de uma aba do Sheets simulada em memória (ArmazenamentoSheets + PlanilhaMemoria)
+Para cada etapa, informa o melhor tempo, a vazão (registros/s) e o pico de memória alocada (tracemalloc).
+
+Uso (a partir da raiz do projeto):
+    python -m caixa.benchmarks.suite [tamanhos...] [--etapas leitura,tratamento,...] [--sem-memoria]
+    ex.: python -m caixa.benchmarks.suite 1000 10000 100000 1000000
+"""
+
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+from caixa.benchmarks.gerador import gera_csv
+from caixa.benchmarks.bench_trata_planilha import mede
+from caixa.benchmarks.bench_diferencas import simula_armazenado
+from caixa.benchmarks.sheets_memoria import PlanilhaMemoria
+from caixa.modules.planilhas import (TAMANHO_BLOCO, COLUNAS, ArquivoLinhas, calcula_stats, le_csv_caixa, linhas_csv,
+                                     prepara_dados_uf, trata_planilha)
+from caixa.modules.diferencas import compara_registros
+from caixa.modules.armazenamento import ArmazenamentoSheets
+from caixa.modules.sheets import ClienteSheets
+
+
+TAMANHOS = [1000, 10000, 100000]
+ETAPAS = ['leitura', 'tratamento', 'diferencas', 'estatisticas', 'sheets']
+UF = 'SP'
+
+
+def le_conteudo(conteudo):
+    blocos = (conteudo[i:i + TAMANHO_BLOCO] for i in range(0, len(conteudo), TAMANHO_BLOCO))
+    return le_csv_caixa(ArquivoLinhas(linhas_csv(blocos)))
+
+
+def atualiza_sheets(linhas_aba, df_caixa):
+    """
+    Lê a aba do estado de uma planilha simulada, compara com a planilha da Caixa e envia as alterações.
+    Retorna as chamadas feitas à planilha simulada.
+    """
+    planilha = PlanilhaMemoria({UF: linhas_aba, 'Arquivados': [COLUNAS]})
+    armazenamento = ArmazenamentoSheets(planilha)
+    # Sem limite de taxa: mede apenas o processamento local
+    armazenamento.cliente = ClienteSheets(planilha, leituras_por_minuto=10**9, escritas_por_minuto=10**9)
+    with redirect_stdout(StringIO()):
+        diferencas = compara_registros(df_caixa, armazenamento.le_estado(UF))
+        armazenamento.atualiza_estado(UF, diferencas['novos'], diferencas['arquivados'], diferencas['alterados'])
+        armazenamento.finaliza()
+    return planilha.chamadas
+
+
+def mede_tempo(funcao, repeticoes=3):
+    """
+    Como mede(), sem a medição de memória (que torna a execução mais lenta nas planilhas grandes).
+    """
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, None, resultado
+
+
+def prepara_etapas(n_linhas):
+    """
+    Gera a planilha sintética e os dados de entrada de cada etapa.
+    Retorna o tamanho do CSV (bytes) e um dicionário {etapa: função sem argumentos}.
+    """
+    conteudo = gera_csv(n_linhas, [UF])
+    df_bruto = le_conteudo(conteudo)
+    df_caixa = trata_planilha(df_bruto.copy()).fillna("")
+    df_armazenado = simula_armazenado(df_caixa)
+    linhas_aba = [COLUNAS] + ArmazenamentoSheets._valores(df_armazenado, COLUNAS)
+
+    return len(conteudo), {
+        'leitura': lambda: le_conteudo(conteudo),
+        'tratamento': lambda: trata_planilha(df_bruto.copy()),
+        'diferencas': lambda: compara_registros(df_caixa, df_armazenado),
+        'estatisticas': lambda: (prepara_dados_uf(df_caixa), calcula_stats(df_caixa)),
+        'sheets': lambda: atualiza_sheets(linhas_aba, df_caixa),
+    }
+
+
+def executa(tamanhos=TAMANHOS, etapas=ETAPAS, memoria=True):
+    print(f"{'registros':>10} {'etapa':>13} {'tempo (ms)':>11} {'registros/s':>12} {'MiB/s':>8} {'pico (MiB)':>11}")
+    for n_linhas in tamanhos:
+        tamanho, funcoes = prepara_etapas(n_linhas)
+        for etapa in etapas:
+            repeticoes = 3 if n_linhas <= 100000 else 1
+            if memoria:
+                tempo, pico, resultado = mede(funcoes[etapa], repeticoes)
+            else:
+                tempo, pico, resultado = mede_tempo(funcoes[etapa], repeticoes)
+            pico = f"{pico:.1f}" if pico is not None else "-"
+            print(f"{n_linhas:>10} {etapa:>13} {tempo * 1000:>11.1f} {n_linhas / tempo:>12,.0f} "
+                  f"{tamanho / 2**20 / tempo:>8.1f} {pico:>11}")
+            if etapa == 'sheets':
+                print(f"{'':>25} chamadas à API: {resultado}")
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    etapas = ETAPAS
+    if '--etapas' in argumentos:
+        posicao = argumentos.index('--etapas')
+        etapas = argumentos[posicao + 1].split(',')
+        del argumentos[posicao:posicao + 2]
+    memoria = '--sem-memoria' not in argumentos
+    tamanhos = [int(argumento) for argumento in argumentos if argumento != '--sem-memoria'] or TAMANHOS
+    executa(tamanhos, etapas, memoria)
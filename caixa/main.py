@@ -5,59 +5,88 @@ Data: 2024-03-13
 Versão: 0.1
 Licença: MIT
 Descrição: Este script é um buscador de planilhas de leilões da Caixa Econômica Federal. 
-O script acessa a página de leilões da Caixa, baixa a planilha de leilões disponíveis por UF e a salva em uma planilha do Google Sheets com a seguinte lógica de atualizações:
-1. Cria no Sheets uma planilha para cada estado + Arquivados + Controle (deve ser executada somente 1 vez)
-2. Para cada estado da lista:
-    1. Baixa a planilha de leilões da Caixa
-    2. Importa o Sheets para um dataframe
+O script acessa a página de leilões da Caixa, baixa a planilha de leilões disponíveis por UF e a salva no armazenamento configurado (SQLite local por padrão, ou Google Sheets com ARMAZENAMENTO=sheets) com a seguinte lógica de atualizações:
+1. Cria no Sheets uma planilha para cada estado + Arquivados + Controle (deve ser executada somente 1 vez, apenas ao utilizar o Sheets)
+   Ao passar do Sheets para o SQLite, a primeira execução importa os imóveis ativos e arquivados da planilha para o banco vazio
+   (com SHEETS_API configurada; MIGRA_SHEETS=0 desativa a importação)
+2. Processa os estados em uma fila, com até MAX_ESTADOS estados simultâneos (caixa/modules/sincronizacao.py)
+   Cada estado é processado de forma independente e, em caso de erro, repetido até TENTATIVAS_ESTADO vezes com espera exponencial;
+   a falha de um estado não interrompe os demais. O progresso fica em um diário (caixa/dados/sincronizacao.json),
+   e uma execução interrompida é retomada a partir dos estados ainda não concluídos (refeitos sem repetir escritas nem eventos)
+3. Para cada estado da fila:
+    1. Baixa a planilha de leilões da Caixa do estado
+       Requisições condicionais (ETag/Last-Modified) e o hash do conteúdo permitem ignorar as planilhas que não mudaram desde a última execução
+    2. Importa os dados armazenados do estado para um dataframe
     3. Trata os dados da planilha, limpando e organizando as colunas
-    4. Compara os dados da planilha com os dados do sheets (a partir do ID do imóvel)
-        1. Se um registro estiver na planilha mas não no sheets, adiciona a um dataframe Novos
-        2. Se um registro estiver no sheets mas não na planilha, adiciona a um dataframe Arquivados
-    5. Busca as coordenadas geográficas dos imóveis do dataframe Novos
-    6. Salva os dataframes Novos e Arquivados no Google Sheets, conforme a lógica a seguir:
-        1. Se não houver registros em df_novos nem em df_arquivados, não há a necessidade de atualizar o sheets
-        2. Se houver registros em df_novos, mas não em df_arquivados, basta adicionar os registros de df_novos ao final da planilha do estado
-        3. Se não houver registros em df_novos, mas houver em df_arquivados, devemos adicionar esses registros ao final da planilha 'Arquivados' , excluí-los de df_sheets e substituir a planilha respectiva no sheets
-        4. Se houver registros tanto em df_novos quanto em df_arquivados, devemos adicionar os registros de df_arquivados ao final da planilha 'Arquivados' , excluí-los de df_sheets, concatenar df_sheets com df_novos e substituir a planilha respectiva no sheets
-3. O script deve ser executado periodicamente para manter as planilhas atualizadas
+    4. Compara os dados da planilha com os dados armazenados (a partir do ID do imóvel)
+        1. Se um registro estiver na planilha mas não no armazenamento, adiciona a um dataframe Novos
+        2. Se um registro estiver no armazenamento mas não na planilha, adiciona a um dataframe Arquivados
+        3. Se um registro estiver em ambos, mas com preço ou desconto diferente, adiciona a um dataframe Alterados
+    5. Busca as coordenadas geográficas dos imóveis do dataframe Novos (GEOCODIFICA=1)
+       Os resultados ficam em um cache local (caixa/dados/geocodificacao.db), e apenas endereços inéditos são consultados
+    6. Salva os dataframes Novos e Arquivados no armazenamento, conforme a lógica a seguir:
+        1. Se não houver registros em df_novos, df_arquivados nem df_alterados, não há a necessidade de atualizar o armazenamento
+        2. Caso contrário, os registros de df_arquivados são movidos para os arquivados, os de df_novos são incluídos no estado
+           e os preços de df_alterados são atualizados
+        3. Com EXPORTA_SHEETS=1, as mesmas alterações são replicadas no Google Sheets
+        4. No Sheets, as escritas de todos os estados são acumuladas e enviadas em lote ao final, respeitando as cotas da API
+        5. As diferenças são registradas como eventos no histórico dos imóveis (caixa/dados/historico.db)
+    7. Calcula as estatísticas do estado e salva os arquivos lidos diretamente pela aplicação Flask:
+       o snapshot (caixa/dados/snapshots/UF.json), os agregados por município e bairro (caixa/dados/grupos/UF.json)
+       o índice espacial usado no mapa do estado (caixa/dados/mapas/UF.npz) e o snapshot binário dos imóveis (caixa/dados/tabelas/UF.imoveis)
+    8. Salva o agregado parcial do estado (caixa/dados/parciais/UF.json), combinado ao final com os dos demais estados
+       no snapshot nacional (caixa/dados/snapshots/Nacional.json)
+    9. Publica os imóveis do estado em arquivos para download (caixa/dados/publicacao): CSV compactado, Parquet particionado
+       por estado (com pyarrow ou fastparquet instalado) e um manifesto com linhas e hashes
+4. Ao final da fila:
+    1. Envia as escritas acumuladas para o Sheets e só então grava os metadados dos downloads e marca os estados como concluídos no diário
+    2. Recalcula o snapshot nacional a partir dos agregados parciais e publica o CSV nacional para download
+    3. Resume o tempo de cada etapa; o script termina com código 1 se algum estado falhou
+5. O script deve ser executado periodicamente para manter as planilhas atualizadas
+
+Uso (a partir de caixa/):
+    python main.py [--uf SP,RJ] [--dry-run] [--workers N] [--reinicia]
+    --uf: processa apenas os estados informados
+    --dry-run: apenas baixa, trata e compara as planilhas, informando as diferenças sem gravar nada
+    --workers: quantidade de estados processados simultaneamente (padrão: MAX_ESTADOS)
+    --reinicia: ignora a execução interrompida registrada no diário e inicia uma nova
 """
 
 # Bibliotecas nativas do Python
 import os
-import time
+import sys
+import argparse
 
 # Bibliotecas de terceiros
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from dotenv import load_dotenv
-import pandas as pd
 
 # Bibliotecas locais
-from modules.planilhas import baixa_planilha, trata_planilha
-#from modules.geoloc import processar_lotes (ocultado para implementação futura)
+from modules.planilhas import carrega_metadados_downloads
+from modules.snapshot import carrega_snapshot
+from modules.armazenamento import ARMAZENAMENTO, ArmazenamentoSheets, ArmazenamentoSQLite, abre_armazenamento, abre_planilha
+from modules.geoloc import CacheGeocodificacao
+from modules.nacional import UF_NACIONAL, atualiza_nacional
+from modules.publicacao import DIRETORIO_PUBLICACAO, UF_ARQUIVO_NACIONAL, caminho_csv, publica_nacional
+from modules.historico import HistoricoImoveis
+from modules.metricas import desativa_log, resumo_etapas
+from modules.sincronizacao import MAX_ESTADOS, DiarioSincronizacao, Sincronizacao
 
-# Credenciais e autenticação
 load_dotenv()
-arquivo_credenciais = "imoveis-da-caixa-293ec7fa1219.json"
-conteudo_credenciais = os.environ.get("GSPREAD_CREDENTIALS")
-with open (arquivo_credenciais, "w") as f:
-    f.write(conteudo_credenciais)
-conta = ServiceAccountCredentials.from_json_keyfile_name(arquivo_credenciais)
-api = gspread.authorize(conta)
-sheets_api = os.environ.get("SHEETS_API")
-planilha = api.open_by_key(sheets_api)
 
 
 # Variáveis
 estados = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
-colunas = ['ID_imovel', 'UF', 'Cidade', 'Bairro', 'Endereco', 'Preco', 'Valor_Avaliacao', 'Desconto', 'Descricao', 'Modalidade_venda', 'Link_acesso', 'Tipo_Imovel', 'Area_Total', 'Area_Privativa', 'Area_Terreno','Data_Inclusao']
+# Exporta as alterações também para o Google Sheets quando o armazenamento principal é local
+exporta_sheets = os.environ.get("EXPORTA_SHEETS") == "1" and ARMAZENAMENTO != "sheets"
+# Importa a planilha do Sheets para o SQLite quando o banco ainda está vazio (ativado por padrão quando a planilha está configurada)
+migra_sheets = os.environ.get("MIGRA_SHEETS", "1" if os.environ.get("SHEETS_API") else "0") == "1"
+# Geocodifica os imóveis novos com a API do Google Maps (desativado por padrão: cada endereço inédito é uma consulta paga)
+geocodifica = os.environ.get("GEOCODIFICA", "0") == "1"
 
-
-# Execução
 # Cria no Sheets uma planilha para cada estado + Arquivados + Stats
 """
 Executa a criação das planilhas no Google Sheets
+planilha = abre_planilha()
 for UF in estados:
     worksheet = planilha.add_worksheet(title=UF, rows=100, cols=20)
     print(f"Aba '{UF}' criada com sucesso.")
@@ -67,116 +96,91 @@ worksheet = planilha.add_worksheet(title='Stats', rows=100, cols=20)
 print(f"Aba 'Stats' criada com sucesso.")
 """
 
-# Itera sobre os estados da lista
-for UF in estados:
-    # Aguarda 5 segundos para contornar limitações de uso da API
-    time.sleep(5)
-    # Baixa a planilha de leilões da Caixa
-    df_caixa = baixa_planilha(UF)
-    if df_caixa is None:
-        continue
-
-    # Importa o Sheets para um dataframe
-    df_sheets = planilha.worksheet(UF).get_all_records()
-
-    # Verifica se o dataframe do Sheets está vazio
-    if not df_sheets:
-        print(f"Dataframe do Sheets para o estado {UF} está vazio.")
-        df_sheets = pd.DataFrame(columns=colunas)
-        planilha.worksheet(UF).update([df_sheets.columns.values.tolist()] + df_sheets.values.tolist())
-    else:
-        df_sheets = pd.DataFrame(df_sheets).fillna("")  # Substitui NaN por string vazia para evitar erros
-
-    # Trata os dados da planilha, limpando e padronizando as colunas
-    df_caixa = trata_planilha(df_caixa).fillna("")  # Substitui NaN por string vazia
-
-    # Compara os dados da planilha com os dados do sheets (a partir do ID do imóvel)
-    # Se um registro estiver na planilha mas não no sheets, adiciona a um dataframe Novos
-    df_novos = df_caixa[~df_caixa['ID_imovel'].isin(df_sheets['ID_imovel'])]
-    print(f"Novos registros encontrados para o estado {UF}: {len(df_novos)}")
-
-    # Se um registro estiver no sheets mas não na planilha, adiciona a um dataframe Arquivados
-    df_arquivados = df_sheets[~df_sheets['ID_imovel'].isin(df_caixa['ID_imovel'])]
-    print(f"Registros arquivados encontrados para o estado {UF}: {len(df_arquivados)}")
-
-    
-    """
-    # Ocultado para implementação futura
-    # Se o dataframe Novos não estiver vazio, busca as coordenadas geográficas dos imóveis
-    if not df_novos.empty:
-        # Cria uma cópia do DataFrame para evitar o aviso SettingWithCopyWarning
-        df_novos = df_novos.copy()
-        # Cria uma coluna temporária com o endereço completo
-        df_novos.loc[:, 'Endereco_Completo'] = df_novos.apply(lambda row: ', '.join([str(row['Endereco']), str(row['Bairro']), str(row['Cidade']), str(row['UF'])]), axis=1)
-
-        # Define o tamanho do lote (usado para contornar limitações de uso da API do Google Maps)
-        tamanho_lote = 2000
-
-        # Divide o DataFrame em lotes menores e processa cada lote separadamente
-        for i in range(0, len(df_novos), tamanho_lote):
-            df_lote = df_novos.iloc[i:i+tamanho_lote]
-            latitudes_lote, longitudes_lote = processar_lotes(df_lote)
-            
-            # Adiciona as latitudes e longitudes processadas ao DataFrame original
-            df_novos.loc[df_lote.index, 'Latitude'] = latitudes_lote
-            df_novos.loc[df_lote.index, 'Longitude'] = longitudes_lote
-
-            # Aguarda 60 segundos para evitar limitações de uso da API
-            time.sleep(60)
-
-        # Remove a coluna temporária 'Endereco_Completo'
-        df_novos = df_novos.drop(columns=['Endereco_Completo'])
-    """
-        
-
-    # Salva os dataframes Novos e Arquivados no Google Sheets
-    # Se não houver registros em df_novos nem em df_arquivados, não há a necessidade de atualizar o sheets
-    if df_novos.empty and df_arquivados.empty:
-        print(f"Não há registros para atualizar no estado {UF}.")
-        continue
-
-    # Se houver registros em df_novos, mas não em df_arquivados, basta adicionar os registros de df_novos ao final da planilha do estado
-    elif not df_novos.empty and df_arquivados.empty:
-        planilha.worksheet(UF).append_rows(df_novos.values.tolist())
-        df_sheets = pd.concat([df_sheets, df_novos], ignore_index=True)
-
-        # Calcula e adiciona estatísticas a partir do DataFrame de imóveis
-        # Ocultado para implementação futura
-        # stats = calcula_stats(df_sheets)
-        # adiciona_stats(planilha, stats, UF)
-
-        print(f"Dataframes atualizados para o estado {UF}.")
-        continue
-
-    # Se não houver registros em df_novos, mas houver em df_arquivados, devemos adicionar esses registros ao final da planilha 'Arquivados' , excluí-los de df_sheets e substituir a planilha respectiva no sheets
-    elif df_novos.empty and not df_arquivados.empty:
-        planilha.worksheet('Arquivados').append_rows(df_arquivados.values.tolist())
-        df_sheets = df_sheets[~df_sheets['ID_imovel'].isin(df_arquivados['ID_imovel'])]
-        planilha.worksheet(UF).clear()
-        planilha.worksheet(UF).update([df_sheets.columns.values.tolist()] + df_sheets.values.tolist())
-
-        # Calcula e adiciona estatísticas a partir do DataFrame de imóveis
-        # Ocultado para implementação futura
-        # stats = calcula_stats(df_sheets)
-        # adiciona_stats(planilha, stats, UF)
-
-        print(f"Dataframes atualizados para o estado {UF}.")
-        continue
-
-    # Se houver registros tanto em df_novos quanto em df_arquivados, devemos adicionar os registros de df_arquivados ao final da planilha 'Arquivados' , excluí-los de df_sheets, concatenar df_sheets com df_novos e substituir a planilha respectiva no sheets
-    else:
-        planilha.worksheet('Arquivados').append_rows(df_arquivados.values.tolist())
-        df_sheets = df_sheets[~df_sheets['ID_imovel'].isin(df_arquivados['ID_imovel'])]
-        df_sheets = pd.concat([df_sheets, df_novos], ignore_index=True)
-        planilha.worksheet(UF).clear()
-        planilha.worksheet(UF).update([df_sheets.columns.values.tolist()] + df_sheets.values.tolist())
 
-        # Calcula e adiciona estatísticas a partir do DataFrame de imóveis
-        # Ocultado para implementação futura
-        # stats = calcula_stats(df_sheets)
-        # adiciona_stats(planilha, stats, UF)
-
-        print(f"Dataframes atualizados para o estado {UF}.")
-        continue
-
-print("Execução concluída com sucesso.")
+def le_argumentos():
+    parser = argparse.ArgumentParser(description="Atualiza os imóveis dos leilões da Caixa a partir das planilhas de cada estado.")
+    parser.add_argument("--uf", help="estados a processar, separados por vírgula (padrão: todos)")
+    parser.add_argument("--dry-run", action="store_true", help="apenas informa as diferenças encontradas, sem gravar nada")
+    parser.add_argument("--workers", type=int, default=MAX_ESTADOS, help="estados processados simultaneamente")
+    parser.add_argument("--reinicia", action="store_true", help="inicia uma nova execução, ignorando a execução interrompida")
+    argumentos = parser.parse_args()
+    if argumentos.workers < 1:
+        parser.error("--workers deve ser maior que zero")
+    if argumentos.uf:
+        selecionados = [UF.strip().upper() for UF in argumentos.uf.split(",") if UF.strip()]
+        desconhecidos = sorted(set(selecionados) - set(estados))
+        if desconhecidos:
+            parser.error(f"estados desconhecidos: {', '.join(desconhecidos)}")
+        argumentos.estados = [UF for UF in estados if UF in selecionados]
+    else:
+        argumentos.estados = estados
+    return argumentos
+
+
+def main():
+    argumentos = le_argumentos()
+    simulacao = argumentos.dry_run
+
+    # A simulação não grava nada: o armazenamento é aberto somente para leitura e as etapas não são gravadas em LOG_METRICAS
+    if simulacao:
+        desativa_log()
+
+    # Armazenamento principal (SQLite local, por padrão) e, opcionalmente, exportação para o Google Sheets
+    armazenamento = abre_armazenamento(somente_leitura=simulacao)
+    exportacao = ArmazenamentoSheets(abre_planilha()) if exporta_sheets and not simulacao else None
+    # Primeira execução com o SQLite em uma instalação que usava o Sheets como armazenamento principal: o banco vazio
+    # recebe os imóveis ativos e arquivados da planilha, de forma que as datas de inclusão e os arquivados sejam mantidos
+    # e a exportação continue em sincronia com o banco
+    if isinstance(armazenamento, ArmazenamentoSQLite) and migra_sheets and armazenamento.vazio():
+        origem = exportacao if exportacao is not None else ArmazenamentoSheets(abre_planilha())
+        if simulacao:
+            # O banco da simulação é somente leitura: a importação é feita em um banco em memória
+            armazenamento = ArmazenamentoSQLite(":memory:")
+        armazenamento.importa(origem, estados)
+    # Cache persistente das coordenadas já geocodificadas
+    cache_geocodificacao = CacheGeocodificacao() if geocodifica and not simulacao else None
+    # Histórico de eventos dos imóveis (listagens, alterações de preço e desconto, arquivamentos)
+    historico = HistoricoImoveis() if not simulacao else None
+    # Diário da execução: uma execução interrompida com a mesma fila de estados é retomada (não usado na simulação)
+    diario = DiarioSincronizacao() if not simulacao else None
+    estados_pendentes = diario.inicia(argumentos.estados, argumentos.reinicia) if diario is not None else argumentos.estados
+
+    # Requisições condicionais evitam baixar e processar planilhas que não mudaram desde a última execução
+    sincronizacao = Sincronizacao(armazenamento, exportacao, historico, cache_geocodificacao,
+                                  carrega_metadados_downloads(), diario, simulacao)
+    resumos, falhas = sincronizacao.executa(estados_pendentes, argumentos.workers)
+
+    if simulacao:
+        print("Simulação concluída, nenhum dado foi gravado. Diferenças por estado:")
+        for UF in estados_pendentes:
+            if UF in falhas:
+                print(f"  {UF}: falhou ({falhas[UF]})")
+            elif resumos[UF].get('sem_alteracao'):
+                print(f"  {UF}: sem alterações")
+            else:
+                print(f"  {UF}: {resumos[UF]['novos']} novos, {resumos[UF]['arquivados']} arquivados, "
+                      f"{resumos[UF]['alterados']} alterados")
+        return 1 if falhas else 0
+
+    # Atualiza as estatísticas nacionais combinando os agregados parciais dos estados
+    # Apenas os parciais dos estados atualizados nesta execução foram recalculados; os demais são reaproveitados
+    if sincronizacao.estados_atualizados or carrega_snapshot(UF_NACIONAL) is None:
+        atualiza_nacional()
+    # O arquivo nacional para download é a concatenação dos arquivos dos estados
+    if sincronizacao.estados_atualizados or not os.path.exists(os.path.join(DIRETORIO_PUBLICACAO, caminho_csv(UF_ARQUIVO_NACIONAL))):
+        publica_nacional()
+
+    # Resume o tempo de cada etapa (o detalhamento por estado fica em LOG_METRICAS)
+    resumo_etapas()
+    if falhas:
+        print(f"Execução concluída com falhas nos estados: {', '.join(sorted(falhas))}. "
+              "Execute novamente para retomar os estados pendentes.")
+        return 1
+    # A execução só é encerrada no diário quando todos os estados da fila foram concluídos
+    diario.conclui()
+    print("Execução concluída com sucesso.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
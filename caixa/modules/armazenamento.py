@@ -0,0 +1,286 @@
+"""
+Backends de armazenamento dos imóveis da Caixa.
+O armazenamento padrão é um banco SQLite local (caixa/dados/imoveis.db), que funciona como base de dados principal.
+O Google Sheets pode ser usado como backend (ARMAZENAMENTO=sheets) ou como destino opcional de exportação (EXPORTA_SHEETS=1).
+Todos os backends implementam a mesma interface:
+    le_estado(UF) -> DataFrame com os imóveis ativos do estado
+    le_arquivados(UF=None) -> DataFrame com os imóveis arquivados (de um estado ou de todos)
+    atualiza_estado(UF, df_novos, df_arquivados, df_alterados) -> DataFrame com os imóveis ativos após a atualização
+    finaliza() -> envia as escritas pendentes (o Sheets acumula as escritas de todos os estados e as envia em lote)
+"""
+
+import os
+import pathlib
+import sqlite3
+
+import pandas as pd
+
+from .planilhas import COLUNAS, COLUNAS_NUMERICAS, converte_numericos, organiza_colunas
+from .diferencas import normaliza_ids
+from .snapshot import DIRETORIO_DADOS
+
+
+# Backend de armazenamento selecionado por variável de ambiente ('sqlite' ou 'sheets')
+ARMAZENAMENTO = os.environ.get("ARMAZENAMENTO", "sqlite")
+CAMINHO_BANCO = os.environ.get("CAMINHO_BANCO", os.path.join(DIRETORIO_DADOS, "imoveis.db"))
+# Colunas atualizadas nos registros com preço ou desconto alterados
+COLUNAS_PRECO = ['Preco', 'Valor_Avaliacao', 'Desconto']
+
+
+def abre_planilha():
+    """
+    Função para autenticar no Google Sheets e abrir a planilha de imóveis.
+    """
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    arquivo_credenciais = "imoveis-da-caixa-293ec7fa1219.json"
+    conteudo_credenciais = os.environ.get("GSPREAD_CREDENTIALS")
+    with open(arquivo_credenciais, "w") as f:
+        f.write(conteudo_credenciais)
+    conta = ServiceAccountCredentials.from_json_keyfile_name(arquivo_credenciais)
+    api = gspread.authorize(conta)
+    return api.open_by_key(os.environ.get("SHEETS_API"))
+
+
+def abre_armazenamento(planilha=None, tipo=None, somente_leitura=False):
+    """
+    Função para instanciar o backend de armazenamento configurado.
+    Com somente_leitura=True (simulação), o banco SQLite não é criado nem migrado; no Sheets, as escritas só são
+    enviadas por finaliza(), que não é chamada na simulação.
+    """
+    tipo = tipo or ARMAZENAMENTO
+    if tipo == "sqlite":
+        return ArmazenamentoSQLite(somente_leitura=somente_leitura)
+    if tipo == "sheets":
+        return ArmazenamentoSheets(planilha if planilha is not None else abre_planilha())
+    raise ValueError(f"Backend de armazenamento desconhecido: {tipo}")
+
+
+class ArmazenamentoSQLite:
+    """
+    Armazenamento local em SQLite, com uma tabela de imóveis ativos e uma de arquivados.
+    Ambas são indexadas por ID_imovel e UF.
+    """
+
+    def __init__(self, caminho=None, somente_leitura=False):
+        self.caminho = caminho or CAMINHO_BANCO
+        if not somente_leitura:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+            self.conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+            self._cria_tabelas()
+        elif os.path.exists(self.caminho):
+            # Conexão somente leitura: o arquivo não é alterado (nem as tabelas criadas ou migradas)
+            uri = pathlib.Path(os.path.abspath(self.caminho)).as_uri() + "?mode=ro"
+            self.conexao = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            # Sem o arquivo, um banco vazio em memória: todos os estados são lidos como vazios
+            self.conexao = sqlite3.connect(":memory:", check_same_thread=False)
+            self._cria_tabelas()
+
+    def _cria_tabelas(self):
+        definicao = ", ".join(
+            f'"{coluna}" {"REAL" if coluna in COLUNAS_NUMERICAS else "TEXT"}' for coluna in COLUNAS
+        )
+        with self.conexao:
+            self.conexao.execute(f"CREATE TABLE IF NOT EXISTS imoveis ({definicao})")
+            self.conexao.execute(f"CREATE TABLE IF NOT EXISTS arquivados ({definicao})")
+            # Inclui as colunas adicionadas após a criação do banco (ex.: Latitude e Longitude)
+            for tabela in ['imoveis', 'arquivados']:
+                existentes = {linha[1] for linha in self.conexao.execute(f"PRAGMA table_info({tabela})")}
+                for coluna in COLUNAS:
+                    if coluna not in existentes:
+                        tipo = "REAL" if coluna in COLUNAS_NUMERICAS else "TEXT"
+                        self.conexao.execute(f'ALTER TABLE {tabela} ADD COLUMN "{coluna}" {tipo}')
+            self.conexao.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_imoveis_id ON imoveis (ID_imovel)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_imoveis_uf ON imoveis (UF)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_arquivados_id ON arquivados (ID_imovel)")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_arquivados_uf ON arquivados (UF)")
+
+    def _linhas(self, df):
+        """
+        Converte um DataFrame em linhas prontas para inserção, com NaN e strings vazias como NULL.
+        """
+        df = organiza_colunas(df)
+        df['ID_imovel'] = normaliza_ids(df['ID_imovel'])
+        df = df.astype(object).where(df.notna() & (df != ""), None)
+        return df.values.tolist()
+
+    def le_estado(self, UF):
+        return pd.read_sql_query("SELECT * FROM imoveis WHERE UF = ?", self.conexao, params=(UF,))
+
+    def le_arquivados(self, UF=None):
+        if UF is None:
+            return pd.read_sql_query("SELECT * FROM arquivados", self.conexao)
+        return pd.read_sql_query("SELECT * FROM arquivados WHERE UF = ?", self.conexao, params=(UF,))
+
+    def vazio(self):
+        """
+        Verifica se o banco ainda não tem imóveis ativos nem arquivados.
+        """
+        return not self.conexao.execute("SELECT EXISTS (SELECT 1 FROM imoveis) OR EXISTS (SELECT 1 FROM arquivados)").fetchone()[0]
+
+    def importa(self, origem, estados):
+        """
+        Importa os imóveis ativos dos estados e os arquivados de outro armazenamento (ex.: o Google Sheets, ao trocar o backend).
+        Os registros são copiados como estão, preservando as datas de inclusão e o histórico de arquivados.
+        Retorna a quantidade de imóveis ativos e arquivados importados.
+        """
+        colunas_sql = ", ".join(f'"{coluna}"' for coluna in COLUNAS)
+        marcadores = ", ".join("?" for _ in COLUNAS)
+        df_ativos = pd.concat([origem.le_estado(UF).assign(UF=UF) for UF in estados], ignore_index=True)
+        df_arquivados = origem.le_arquivados()
+        with self.conexao:
+            if not df_ativos.empty:
+                self.conexao.executemany(
+                    f"INSERT OR REPLACE INTO imoveis ({colunas_sql}) VALUES ({marcadores})", self._linhas(df_ativos)
+                )
+            if not df_arquivados.empty:
+                self.conexao.executemany(
+                    f"INSERT INTO arquivados ({colunas_sql}) VALUES ({marcadores})", self._linhas(df_arquivados)
+                )
+        print(f"Importados {len(df_ativos)} imóveis ativos e {len(df_arquivados)} arquivados para o SQLite.")
+        return len(df_ativos), len(df_arquivados)
+
+    def atualiza_estado(self, UF, df_novos, df_arquivados, df_alterados=None):
+        colunas_sql = ", ".join(f'"{coluna}"' for coluna in COLUNAS)
+        marcadores = ", ".join("?" for _ in COLUNAS)
+        # Executa arquivamento e inclusão em uma única transação
+        with self.conexao:
+            if not df_arquivados.empty:
+                self.conexao.executemany(
+                    f"INSERT INTO arquivados ({colunas_sql}) VALUES ({marcadores})", self._linhas(df_arquivados)
+                )
+                self.conexao.executemany(
+                    "DELETE FROM imoveis WHERE ID_imovel = ?",
+                    [(id_imovel,) for id_imovel in normaliza_ids(df_arquivados['ID_imovel'])]
+                )
+            if not df_novos.empty:
+                self.conexao.executemany(
+                    f"INSERT OR REPLACE INTO imoveis ({colunas_sql}) VALUES ({marcadores})", self._linhas(df_novos)
+                )
+            if df_alterados is not None and not df_alterados.empty:
+                atribuicoes = ", ".join(f'"{coluna}" = ?' for coluna in COLUNAS_PRECO)
+                valores = converte_numericos(df_alterados[COLUNAS_PRECO])
+                valores = valores.astype(object).where(valores.notna(), None)
+                valores['ID_imovel'] = normaliza_ids(df_alterados['ID_imovel'])
+                self.conexao.executemany(
+                    f"UPDATE imoveis SET {atribuicoes} WHERE ID_imovel = ?", valores.values.tolist()
+                )
+        return self.le_estado(UF)
+
+    def finaliza(self):
+        # As alterações já são gravadas em atualiza_estado
+        pass
+
+
+class ArmazenamentoSheets:
+    """
+    Armazenamento no Google Sheets, com uma aba por estado e uma aba 'Arquivados'.
+    As escritas são acumuladas pelo ClienteSheets e enviadas em lote por finaliza().
+    As atualizações são feitas por diferença: apenas as linhas arquivadas são removidas e as novas são adicionadas ao final,
+    de forma que o volume de escrita depende do tamanho da alteração, e não do tamanho da aba.
+    """
+
+    def __init__(self, planilha):
+        # Importado aqui para que o uso do SQLite não dependa da importação do gspread
+        from .sheets import ClienteSheets
+
+        self.planilha = planilha
+        self.cliente = ClienteSheets(planilha)
+        # Último estado lido de cada aba, reaproveitado na atualização para evitar uma nova leitura
+        self._estados = {}
+
+    def le_estado(self, UF):
+        registros = self.cliente.le_registros(UF)
+
+        # Verifica se a aba do estado está vazia
+        if not registros:
+            print(f"Dataframe do Sheets para o estado {UF} está vazio.")
+            df = pd.DataFrame(columns=COLUNAS)
+            self.cliente.substitui_valores(UF, [COLUNAS])
+        else:
+            df = pd.DataFrame(registros).fillna("")  # Substitui NaN por string vazia para evitar erros
+
+        # Os registros começam na linha 2 da planilha (a linha 1 é o cabeçalho)
+        df.index = range(2, len(df) + 2)
+        self._estados[UF] = df
+        return df
+
+    def le_arquivados(self, UF=None):
+        df = pd.DataFrame(self.cliente.le_registros('Arquivados')).fillna("")
+        if df.empty:
+            return pd.DataFrame(columns=COLUNAS)
+        if UF is None:
+            return df
+        return df[df['UF'] == UF].reset_index(drop=True)
+
+    def atualiza_estado(self, UF, df_novos, df_arquivados, df_alterados=None):
+        df_sheets = self._estados.pop(UF, None)
+        if df_sheets is None:
+            df_sheets = self.le_estado(UF)
+            self._estados.pop(UF)
+        ids_sheets = normaliza_ids(df_sheets['ID_imovel'])
+
+        # Considera apenas as alterações que ainda não estão refletidas no Sheets
+        df_novos = df_novos[~normaliza_ids(df_novos['ID_imovel']).isin(ids_sheets)]
+        df_arquivados = df_sheets[ids_sheets.isin(normaliza_ids(df_arquivados['ID_imovel']))]
+
+        # Atualiza somente as células de preço dos registros alterados
+        if df_alterados is not None and not df_alterados.empty:
+            df_sheets = self._atualiza_precos(UF, df_sheets, ids_sheets, df_alterados)
+
+        # Se não houver registros em df_novos nem em df_arquivados, não há a necessidade de atualizar o sheets
+        if df_novos.empty and df_arquivados.empty:
+            return df_sheets.reset_index(drop=True)
+
+        # Adiciona os registros arquivados ao final da aba 'Arquivados' e remove somente as suas linhas da aba do estado
+        # O índice de df_sheets corresponde ao número da linha de cada registro na planilha
+        if not df_arquivados.empty:
+            self.cliente.adiciona_linhas('Arquivados', self._valores(df_arquivados, df_sheets.columns))
+            self.cliente.remove_linhas(UF, df_arquivados.index.tolist())
+            df_sheets = df_sheets.drop(df_arquivados.index)
+
+        # Adiciona os registros novos ao final da aba do estado
+        if not df_novos.empty:
+            self.cliente.adiciona_linhas(UF, self._valores(df_novos, df_sheets.columns))
+            df_sheets = pd.concat([df_sheets, df_novos]) if not df_sheets.empty else df_novos
+
+        return df_sheets.reset_index(drop=True)
+
+    @staticmethod
+    def _valores(df, colunas):
+        """
+        Converte um DataFrame em linhas na ordem das colunas da aba, com valores ausentes como string vazia.
+        Colunas que ainda não existem na aba (ex.: Latitude e Longitude em abas antigas) são descartadas.
+        """
+        df = df.reindex(columns=colunas)
+        return df.astype(object).where(df.notna(), "").values.tolist()
+
+    def _atualiza_precos(self, UF, df_sheets, ids_sheets, df_alterados):
+        """
+        Registra a atualização das colunas de preço das linhas com preço ou desconto alterados.
+        """
+        linhas_por_id = pd.Series(df_sheets.index, index=ids_sheets.values)
+        linhas_por_id = linhas_por_id[~linhas_por_id.index.duplicated()]
+        posicoes = [df_sheets.columns.get_loc(coluna) + 1 for coluna in COLUNAS_PRECO]
+        consecutivas = posicoes == list(range(posicoes[0], posicoes[0] + len(posicoes)))
+
+        df_sheets = df_sheets.copy()
+        for id_imovel, valores in zip(normaliza_ids(df_alterados['ID_imovel']), df_alterados[COLUNAS_PRECO].values.tolist()):
+            linha = linhas_por_id.get(id_imovel)
+            if linha is None:
+                continue
+            if consecutivas:
+                self.cliente.atualiza_celulas(UF, linha, posicoes[0], valores)
+            else:
+                for coluna, valor in zip(posicoes, valores):
+                    self.cliente.atualiza_celulas(UF, linha, coluna, [valor])
+            df_sheets.loc[linha, COLUNAS_PRECO] = valores
+        return df_sheets
+
+    def finaliza(self):
+        self.cliente.envia()
+        print(f"Chamadas à API do Sheets: {self.cliente.chamadas['leitura']} leituras, {self.cliente.chamadas['escrita']} escritas.")
@@ -0,0 +1,220 @@
+"""
+Busca de imóveis por múltiplos critérios (rota /api/busca), sobre um índice em memória construído a partir dos snapshots
+binários de todos os estados (caixa/modules/tabela.py):
+- faixas de valores (preço, avaliação, desconto e áreas): cada coluna é ordenada uma única vez na construção do índice,
+  e os limites de uma faixa são localizados por busca binária (np.searchsorted);
+- igualdade (estado, município, bairro, tipo de imóvel e modalidade de venda): índice invertido com as linhas de cada valor,
+  guardadas como bitmap (np.packbits) para os valores frequentes e como lista de linhas para os demais.
+Os critérios são convertidos em bitmaps das linhas e intersectados pelo numpy; a ordenação dos resultados reaproveita
+a ordem já calculada da coluna, e apenas as linhas da página solicitada são decodificadas.
+O índice é reconstruído quando o snapshot binário de algum estado é substituído por uma nova versão.
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+from .planilhas import identificador
+from .tabela import carrega_tabela
+
+
+# Critérios de faixa: parâmetro -> coluna (parâmetros <nome>_min e <nome>_max, e ordem=<nome> ou ordem=-<nome>)
+FAIXAS = {
+    'preco': 'Preco',
+    'avaliacao': 'Valor_Avaliacao',
+    'desconto': 'Desconto',
+    'area_total': 'Area_Total',
+    'area_privativa': 'Area_Privativa',
+    'area_terreno': 'Area_Terreno',
+}
+# Critérios de igualdade: parâmetro -> coluna (vários valores separados por vírgula)
+# Os valores são comparados pelo identificador (sem acentos nem diferença entre maiúsculas e minúsculas)
+CATEGORIAS = {
+    'uf': 'UF',
+    'cidade': 'Cidade',
+    'bairro': 'Bairro',
+    'tipo': 'Tipo_Imovel',
+    'modalidade': 'Modalidade_venda',
+}
+# Colunas retornadas para cada imóvel
+COLUNAS_RESULTADO = ['ID_imovel', 'UF', 'Cidade', 'Bairro', 'Endereco', 'Preco', 'Valor_Avaliacao', 'Desconto', 'Tipo_Imovel',
+                     'Modalidade_venda', 'Area_Total', 'Area_Privativa', 'Area_Terreno', 'Latitude', 'Longitude', 'Link_acesso']
+ORDEM_PADRAO = 'preco'
+POR_PAGINA = 50
+MAX_POR_PAGINA = 200
+
+_indice = None
+_trava_indice = threading.Lock()
+
+
+class IndiceBusca:
+    """
+    Índice de busca sobre os snapshots binários de um conjunto de estados.
+    As linhas do índice são as linhas das tabelas concatenadas, na ordem dos estados.
+    """
+
+    def __init__(self, tabelas):
+        self.tabelas = list(tabelas)
+        self.versao = hashlib.sha1("".join(tabela.versao for tabela in self.tabelas).encode()).hexdigest()[:16]
+        self.linhas = sum(len(tabela) for tabela in self.tabelas)
+        self.bytes_bitmap = (self.linhas + 7) // 8
+        # Origem de cada linha: a tabela (posição em self.tabelas) e a linha na tabela
+        self.origem_tabela = np.repeat(np.arange(len(self.tabelas), dtype=np.int16), [len(tabela) for tabela in self.tabelas])
+        self.origem_linha = np.concatenate([np.arange(len(tabela), dtype=np.int32) for tabela in self.tabelas] or [np.zeros(0, np.int32)])
+
+        # Faixas: valores da coluna em ordem crescente (ausentes ao final) e as linhas correspondentes
+        self.ordens = {}
+        for nome, coluna in FAIXAS.items():
+            valores = np.concatenate([tabela.coluna(coluna) for tabela in self.tabelas] or [np.zeros(0)])
+            ordem = np.argsort(valores, kind='stable').astype(np.int32)
+            ordenados = valores[ordem]
+            self.ordens[nome] = (ordem, ordenados, int(np.count_nonzero(~np.isnan(ordenados))))
+
+        # Igualdade: código global de cada linha por identificador do valor, e as linhas de cada código
+        self.invertidos = {}
+        for nome, coluna in CATEGORIAS.items():
+            codigos_globais = {}
+            partes = []
+            for tabela in self.tabelas:
+                # Converte os códigos locais da tabela (um por valor distinto) em códigos globais; ausentes permanecem -1
+                mapa = np.array([codigos_globais.setdefault(identificador(valor), len(codigos_globais))
+                                 for valor in tabela.valores(coluna)] + [-1], dtype=np.int32)
+                partes.append(mapa[tabela.coluna(coluna)])
+            codigos = np.concatenate(partes or [np.zeros(0, np.int32)])
+            ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+            inicios = np.searchsorted(codigos[ordem], np.arange(len(codigos_globais) + 1))
+            entradas = {}
+            for chave, codigo in codigos_globais.items():
+                linhas = ordem[inicios[codigo]:inicios[codigo + 1]]
+                # Bitmap quando ocupa menos memória que a lista de linhas (int32)
+                if len(linhas) * 4 > self.bytes_bitmap:
+                    bitmap = np.zeros(self.linhas, dtype=bool)
+                    bitmap[linhas] = True
+                    entradas[chave] = np.packbits(bitmap)
+                else:
+                    entradas[chave] = linhas
+            self.invertidos[nome] = entradas
+
+    def _bitmap_faixa(self, nome, minimo, maximo):
+        ordem, ordenados, validos = self.ordens[nome]
+        inicio = 0 if minimo is None else np.searchsorted(ordenados[:validos], minimo, side='left')
+        fim = validos if maximo is None else np.searchsorted(ordenados[:validos], maximo, side='right')
+        bitmap = np.zeros(self.linhas, dtype=bool)
+        bitmap[ordem[inicio:fim]] = True
+        return bitmap
+
+    def _bitmap_categoria(self, nome, valores):
+        bitmap = np.zeros(self.linhas, dtype=bool)
+        for valor in valores:
+            entrada = self.invertidos[nome].get(identificador(valor))
+            if entrada is None:
+                continue
+            if entrada.dtype == np.uint8:
+                bitmap |= np.unpackbits(entrada, count=self.linhas).view(bool)
+            else:
+                bitmap[entrada] = True
+        return bitmap
+
+    def busca(self, faixas=None, categorias=None, ordem=ORDEM_PADRAO, pagina=1, por_pagina=POR_PAGINA):
+        """
+        Retorna os imóveis que atendem a todos os critérios, ordenados e paginados:
+            faixas: {nome: (mínimo, máximo)}, com None para um limite aberto
+            categorias: {nome: [valores]}, com os valores de um mesmo critério combinados por "ou"
+            ordem: nome de uma faixa, precedido de "-" para a ordem decrescente (imóveis sem o valor ficam ao final)
+        Retorna um dicionário com o total de imóveis encontrados e os imóveis da página.
+        """
+
+        decrescente = ordem.startswith('-')
+        nome_ordem = ordem.lstrip('-')
+        if nome_ordem not in FAIXAS:
+            raise ValueError(f"Ordem inválida: {ordem}")
+
+        selecionados = None
+        for nome, (minimo, maximo) in (faixas or {}).items():
+            bitmap = self._bitmap_faixa(nome, minimo, maximo)
+            selecionados = bitmap if selecionados is None else np.logical_and(selecionados, bitmap, out=selecionados)
+        for nome, valores in (categorias or {}).items():
+            bitmap = self._bitmap_categoria(nome, valores)
+            selecionados = bitmap if selecionados is None else np.logical_and(selecionados, bitmap, out=selecionados)
+
+        # Linhas selecionadas na ordem da coluna de ordenação
+        linhas_ordem, _, validos = self.ordens[nome_ordem]
+        if decrescente:
+            linhas_ordem = np.concatenate([linhas_ordem[:validos][::-1], linhas_ordem[validos:]])
+        if selecionados is not None:
+            linhas_ordem = linhas_ordem[selecionados[linhas_ordem]]
+
+        total = len(linhas_ordem)
+        inicio = (pagina - 1) * por_pagina
+        return {
+            'versao': self.versao,
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'paginas': -(-total // por_pagina),
+            'imoveis': [self.imovel(int(linha)) for linha in linhas_ordem[inicio:inicio + por_pagina]],
+        }
+
+    def imovel(self, linha):
+        """
+        Retorna um imóvel do índice como dicionário, decodificando apenas as suas colunas.
+        """
+        tabela = self.tabelas[self.origem_tabela[linha]]
+        linha_tabela = int(self.origem_linha[linha])
+        registro = tabela.registros[linha_tabela]
+        imovel = {}
+        for coluna in COLUNAS_RESULTADO:
+            if coluna in tabela.colunas_texto:
+                codigo = int(registro[coluna])
+                imovel[coluna] = tabela.valores(coluna)[codigo] if codigo >= 0 else None
+            else:
+                valor = float(registro[coluna])
+                imovel[coluna] = None if np.isnan(valor) else valor
+        return imovel
+
+
+def carrega_indice(estados):
+    """
+    Função para obter o índice de busca dos estados com snapshot binário.
+    O índice é reaproveitado enquanto nenhum snapshot binário for substituído; retorna None se nenhum estado tiver snapshot.
+    """
+
+    global _indice
+    tabelas = [tabela for tabela in (carrega_tabela(UF) for UF in estados) if tabela is not None]
+    if not tabelas:
+        return None
+    indice = _indice
+    if indice is not None and len(indice.tabelas) == len(tabelas) and all(a is b for a, b in zip(indice.tabelas, tabelas)):
+        return indice
+    with _trava_indice:
+        indice = _indice
+        if indice is None or len(indice.tabelas) != len(tabelas) or any(a is not b for a, b in zip(indice.tabelas, tabelas)):
+            indice = _indice = IndiceBusca(tabelas)
+    return indice
+
+
+def le_parametros(argumentos):
+    """
+    Função para converter os parâmetros da requisição (request.args) nos argumentos de IndiceBusca.busca.
+    Gera ValueError para parâmetros inválidos.
+    """
+
+    faixas = {}
+    for nome in FAIXAS:
+        minimo, maximo = argumentos.get(f'{nome}_min'), argumentos.get(f'{nome}_max')
+        if minimo is not None or maximo is not None:
+            faixas[nome] = tuple(float(valor.replace(',', '.')) if valor not in (None, '') else None for valor in (minimo, maximo))
+    categorias = {}
+    for nome in CATEGORIAS:
+        if argumentos.get(nome):
+            categorias[nome] = [valor for valor in argumentos.get(nome).split(',') if valor.strip()]
+    pagina = int(argumentos.get('pagina', 1))
+    por_pagina = int(argumentos.get('por_pagina', POR_PAGINA))
+    if pagina < 1 or not 1 <= por_pagina <= MAX_POR_PAGINA:
+        raise ValueError("Paginação inválida")
+    ordem = argumentos.get('ordem', ORDEM_PADRAO)
+    if ordem.lstrip('-') not in FAIXAS:
+        raise ValueError(f"Ordem inválida: {ordem}")
+    return {'faixas': faixas, 'categorias': categorias, 'ordem': ordem,
+            'pagina': pagina, 'por_pagina': por_pagina}
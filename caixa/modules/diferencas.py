@@ -0,0 +1,88 @@
+"""
+Comparação entre a planilha da Caixa e os registros armazenados de um estado.
+Identifica, a partir do ID do imóvel, os registros novos, os arquivados e os que tiveram preço ou desconto alterados.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Campos comparados nos registros presentes nas duas bases, e a diferença mínima considerada alteração
+CAMPOS_COMPARADOS = ['Preco', 'Desconto']
+TOLERANCIA = 0.01
+
+
+def normaliza_ids(serie):
+    """
+    Função para padronizar os IDs dos imóveis como texto.
+    O CSV e o Sheets podem devolver o mesmo ID como número ou como texto.
+    """
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype(str)
+    return serie.astype(str).str.strip()
+
+
+def _numerico(serie):
+    """
+    Converte uma coluna para um array de floats. Apenas os valores em texto com vírgula decimal passam pela conversão de texto.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype=float)
+    valores = pd.to_numeric(serie, errors='coerce')
+    pendentes = valores.isna() & serie.notna() & (serie != "")
+    if pendentes.any():
+        valores[pendentes] = pd.to_numeric(serie[pendentes].astype(str).str.replace(',', '.'), errors='coerce')
+    return valores.to_numpy(dtype=float)
+
+
+def compara_registros(df_caixa, df_armazenado, campos=CAMPOS_COMPARADOS):
+    """
+    Função para comparar a planilha da Caixa com os registros armazenados de um estado.
+    Os IDs são normalizados uma única vez e os IDs armazenados são indexados em uma tabela hash,
+    consultada uma única vez para cada registro da Caixa.
+    Retorna um dicionário com:
+        'novos': registros da Caixa ausentes do armazenamento
+        'arquivados': registros armazenados ausentes da Caixa
+        'alterados': registros da Caixa cujo valor mudou em algum dos campos comparados,
+                     com os valores anteriores nas colunas <campo>_anterior
+    """
+
+    ids_caixa = normaliza_ids(df_caixa['ID_imovel']).to_numpy()
+    ids_armazenados = normaliza_ids(df_armazenado['ID_imovel']).to_numpy()
+
+    # Índice hash dos IDs armazenados: cada ID distinto recebe um código, e cada código guarda a primeira linha em que aparece
+    codigos, ids_unicos = pd.factorize(ids_armazenados)
+    primeira_linha = np.empty(len(ids_unicos), dtype=np.intp)
+    primeira_linha[codigos[::-1]] = np.arange(len(codigos))[::-1]
+    codigos_caixa = pd.Index(ids_unicos).get_indexer(ids_caixa)
+
+    # Registros da Caixa sem correspondência são novos
+    encontrados = codigos_caixa >= 0
+    df_novos = df_caixa[~encontrados]
+
+    # Registros armazenados sem correspondência são arquivados
+    presentes = np.zeros(len(ids_unicos), dtype=bool)
+    presentes[codigos_caixa[encontrados]] = True
+    df_arquivados = df_armazenado[~presentes[codigos]]
+
+    posicoes = primeira_linha[codigos_caixa[encontrados]]
+
+    # Compara os campos dos registros presentes nas duas bases
+    alterado = np.zeros(encontrados.sum(), dtype=bool)
+    anteriores = {}
+    for campo in campos:
+        if campo not in df_caixa.columns or campo not in df_armazenado.columns:
+            continue
+        atual = _numerico(df_caixa[campo][encontrados])
+        anterior = _numerico(df_armazenado[campo].iloc[posicoes])
+        diferente = np.abs(atual - anterior) > TOLERANCIA
+        # Um valor ausente que passa a existir (ou deixa de existir) também é uma alteração
+        diferente |= np.isnan(atual) != np.isnan(anterior)
+        alterado |= diferente
+        anteriores[f'{campo}_anterior'] = anterior
+
+    df_alterados = df_caixa[encontrados][alterado].copy()
+    for coluna, valores in anteriores.items():
+        df_alterados[coluna] = valores[alterado]
+
+    return {'novos': df_novos, 'arquivados': df_arquivados, 'alterados': df_alterados}
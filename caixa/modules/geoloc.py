@@ -1,38 +1,174 @@
 """
-Funções para obter as coordenadas geográficas de um endereço
-Acabou não sendo utilizada no projeto final	por impactar no tempo de execução
+Funções para obter as coordenadas geográficas dos imóveis
+Os resultados ficam em um cache persistente (SQLite), de forma que nenhum endereço é consultado duas vezes.
+Apenas os endereços ausentes do cache são enviados ao geocodificador, em paralelo e respeitando um limite de requisições por minuto.
+O geocodificador é intercambiável: GeocodificadorGoogle (API do Google Maps) ou GeocodificadorLocal (tabela offline, usada em testes).
 """
 
-from geopy import geocoders
 import os
-from dotenv import load_dotenv
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
-load_dotenv()
-maps_api = os.environ.get("MAPS_API")
-g = geocoders.GoogleV3(api_key=maps_api)
+import pandas as pd
 
-def obtem_coordenadas(address):
+from .limitador import LimitadorTaxa
+from .snapshot import DIRETORIO_DADOS
+
+
+CAMINHO_CACHE = os.environ.get("CACHE_GEOCODIFICACAO", os.path.join(DIRETORIO_DADOS, "geocodificacao.db"))
+GEOCODIFICACOES_POR_MINUTO = int(os.environ.get("GEOCODIFICACOES_POR_MINUTO", 600))
+MAX_GEOCODIFICACOES = int(os.environ.get("MAX_GEOCODIFICACOES", 4))
+COLUNAS_ENDERECO = ['Endereco', 'Bairro', 'Cidade', 'UF']
+
+
+def normaliza_texto(texto):
+    """
+    Função para normalizar um trecho de endereço: sem acentos, em maiúsculas e com espaços simples.
     """
-    Função para obter as coordenadas geográficas de um endereço
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(texto.upper().split())
+
+
+def chave_endereco(endereco, bairro, cidade, UF):
+    """
+    Função para gerar a chave do cache de geocodificação (Endereco|Bairro|Cidade|UF normalizados).
     """
-    location = g.geocode(address, timeout=10)
-    if location:
-        return location.latitude, location.longitude
-    else:
+    return "|".join(normaliza_texto(parte) for parte in (endereco, bairro, cidade, UF))
+
+
+class GeocodificadorGoogle:
+    """
+    Geocodificador baseado na API do Google Maps (geopy), com a chave em MAPS_API.
+    """
+
+    def __init__(self, api_key=None):
+        from geopy import geocoders
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self.g = geocoders.GoogleV3(api_key=api_key or os.environ.get("MAPS_API"))
+
+    def geocodifica(self, endereco):
+        location = self.g.geocode(endereco, timeout=10)
+        if location:
+            return location.latitude, location.longitude
         return None, None
-    
 
-def processar_lotes(df):
+
+class GeocodificadorLocal:
     """
-    Função para processar em lotes os registros de um DataFrame, a fim de contornar limitações de uso da API do Google Maps
+    Geocodificador offline, a partir de uma tabela {endereço: (latitude, longitude)}.
+    Os endereços da tabela são normalizados; endereços desconhecidos retornam (None, None).
     """
 
-    latitudes = []
-    longitudes = []
-    
-    for index, row in df.iterrows():
-        latitude, longitude = obtem_coordenadas(row['Endereco_Completo'])
-        latitudes.append(latitude)
-        longitudes.append(longitude)
-    
-    return latitudes, longitudes
\ No newline at end of file
+    def __init__(self, coordenadas=None):
+        self.coordenadas = {normaliza_texto(endereco): valor for endereco, valor in (coordenadas or {}).items()}
+        self.consultas = 0
+
+    def geocodifica(self, endereco):
+        self.consultas += 1
+        return self.coordenadas.get(normaliza_texto(endereco), (None, None))
+
+
+class CacheGeocodificacao:
+    """
+    Cache persistente de geocodificação em SQLite, indexado pela chave normalizada do endereço.
+    Endereços não encontrados também são armazenados (com coordenadas nulas), para não serem consultados novamente.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CAMINHO_CACHE
+        if self.caminho != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+        self.conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self.trava = threading.Lock()
+        with self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS geocodificacao "
+                "(chave TEXT PRIMARY KEY, latitude REAL, longitude REAL, atualizado_em TEXT)"
+            )
+
+    def busca(self, chaves):
+        """
+        Retorna um dicionário {chave: (latitude, longitude)} com as chaves presentes no cache.
+        """
+        encontrados = {}
+        chaves = list(chaves)
+        with self.trava:
+            # Consulta em lotes, respeitando o limite de parâmetros do SQLite
+            for inicio in range(0, len(chaves), 500):
+                lote = chaves[inicio:inicio + 500]
+                marcadores = ", ".join("?" for _ in lote)
+                for chave, latitude, longitude in self.conexao.execute(
+                    f"SELECT chave, latitude, longitude FROM geocodificacao WHERE chave IN ({marcadores})", lote
+                ):
+                    encontrados[chave] = (latitude, longitude)
+        return encontrados
+
+    def salva(self, resultados):
+        """
+        Grava um dicionário {chave: (latitude, longitude)} no cache, em uma única transação.
+        """
+        agora = datetime.now().isoformat(timespec='seconds')
+        with self.trava, self.conexao:
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO geocodificacao VALUES (?, ?, ?, ?)",
+                [(chave, latitude, longitude, agora) for chave, (latitude, longitude) in resultados.items()]
+            )
+
+
+def geocodifica_df(df, geocodificador=None, cache=None, limitador=None, max_geocodificacoes=MAX_GEOCODIFICACOES):
+    """
+    Função para preencher as colunas Latitude e Longitude de um DataFrame de imóveis.
+    Endereços repetidos são consultados uma única vez, e apenas os ausentes do cache são enviados ao geocodificador,
+    em um pool de threads limitado a max_geocodificacoes e a GEOCODIFICACOES_POR_MINUTO requisições por minuto.
+    Retorna uma cópia do DataFrame, com a quantidade de endereços enviados ao geocodificador em df.attrs['geocodificacoes'].
+    """
+
+    df = df.copy()
+    df.attrs['geocodificacoes'] = 0
+    if df.empty:
+        df['Latitude'] = pd.Series(dtype=float)
+        df['Longitude'] = pd.Series(dtype=float)
+        return df
+
+    cache = cache or CacheGeocodificacao()
+    limitador = limitador or LimitadorTaxa(GEOCODIFICACOES_POR_MINUTO)
+
+    chaves = [chave_endereco(*partes) for partes in df[COLUNAS_ENDERECO].itertuples(index=False)]
+    enderecos = dict(zip(chaves, (", ".join(map(str, partes)) for partes in df[COLUNAS_ENDERECO].itertuples(index=False))))
+
+    # Consulta o cache com os endereços distintos
+    coordenadas = cache.busca(enderecos)
+    faltantes = [chave for chave in enderecos if chave not in coordenadas]
+    print(f"Geocodificação: {len(enderecos)} endereços distintos, {len(coordenadas)} no cache, {len(faltantes)} a consultar.")
+
+    # Consulta os endereços ausentes do cache
+    if faltantes:
+        geocodificador = geocodificador or GeocodificadorGoogle()
+
+        def consulta(chave):
+            limitador.aguarda()
+            try:
+                return chave, geocodificador.geocodifica(enderecos[chave])
+            except Exception as e:
+                print(f"Erro ao geocodificar '{enderecos[chave]}': {e}")
+                return chave, None
+
+        with ThreadPoolExecutor(max_workers=max_geocodificacoes) as executor:
+            resultados = dict(executor.map(consulta, faltantes))
+
+        # Erros não são gravados no cache, para que o endereço seja consultado novamente na próxima execução
+        novos = {chave: valor for chave, valor in resultados.items() if valor is not None}
+        cache.salva(novos)
+        coordenadas.update(novos)
+
+    df['Latitude'] = [coordenadas.get(chave, (None, None))[0] for chave in chaves]
+    df['Longitude'] = [coordenadas.get(chave, (None, None))[1] for chave in chaves]
+    df['Latitude'] = df['Latitude'].astype(float)
+    df['Longitude'] = df['Longitude'].astype(float)
+    df.attrs['geocodificacoes'] = len(faltantes)
+    return df
@@ -0,0 +1,187 @@
+"""
+Histórico de eventos dos imóveis, em uma tabela SQLite apenas de inserção (caixa/dados/historico.db).
+A cada atualização periódica, as diferenças encontradas em cada estado são gravadas como eventos, em uma única transação:
+    listado: imóvel que aparece pela primeira vez na planilha da Caixa
+    relistado: imóvel arquivado anteriormente que volta à planilha
+    preco_alterado / desconto_alterado: imóvel ativo cujo preço ou desconto mudou
+    arquivado: imóvel que deixou a planilha da Caixa
+A tabela é ordenada fisicamente pelo ID do imóvel (WITHOUT ROWID), de forma que o histórico de um imóvel
+é lido em uma única busca no índice, independentemente da quantidade de eventos acumulados.
+Para manter a tabela compacta, a data é gravada como timestamp Unix (em segundos) e o tipo do evento como um código inteiro.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from .diferencas import TOLERANCIA, normaliza_ids
+from .planilhas import converte_numericos
+from .snapshot import DIRETORIO_DADOS
+
+
+CAMINHO_HISTORICO = os.environ.get("CAMINHO_HISTORICO", os.path.join(DIRETORIO_DADOS, "historico.db"))
+
+# Tipos de evento
+LISTADO = "listado"
+RELISTADO = "relistado"
+PRECO_ALTERADO = "preco_alterado"
+DESCONTO_ALTERADO = "desconto_alterado"
+ARQUIVADO = "arquivado"
+# Código inteiro de cada tipo de evento, gravado na tabela
+TIPOS = [LISTADO, RELISTADO, PRECO_ALTERADO, DESCONTO_ALTERADO, ARQUIVADO]
+CODIGOS = {tipo: codigo for codigo, tipo in enumerate(TIPOS)}
+
+
+def _eventos(df, tipo, UF, data):
+    """
+    Converte um DataFrame de imóveis em linhas de eventos (ID_imovel, data, tipo, UF, preco, desconto).
+    """
+    if df.empty:
+        return []
+    valores = converte_numericos(df.reindex(columns=['Preco', 'Desconto']))
+    valores = valores.astype(object).where(valores.notna(), None)
+    return [(id_imovel, data, CODIGOS[tipo], UF, preco, desconto)
+            for id_imovel, (preco, desconto) in zip(normaliza_ids(df['ID_imovel']), valores.itertuples(index=False))]
+
+
+def _mudou(atual, anterior):
+    """
+    Identifica os valores alterados (acima da tolerância, ou que passaram a existir ou deixaram de existir).
+    """
+    return ((atual - anterior).abs() > TOLERANCIA) | (atual.isna() != anterior.isna())
+
+
+class HistoricoImoveis:
+    """
+    Histórico de eventos dos imóveis em SQLite, com consultas do histórico de preços e do tempo de anúncio de cada imóvel.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CAMINHO_HISTORICO
+        if self.caminho != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+        self.conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        with self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS eventos (ID_imovel TEXT NOT NULL, data INTEGER NOT NULL, tipo INTEGER NOT NULL, "
+                "UF TEXT, preco REAL, desconto REAL, PRIMARY KEY (ID_imovel, data, tipo)) WITHOUT ROWID"
+            )
+
+    def _ultimos_eventos(self, ids):
+        """
+        Retorna um DataFrame, indexado pelo ID, com o tipo, o preço e o desconto do evento mais recente de cada imóvel
+        que já tem eventos no histórico.
+        """
+        linhas = []
+        ids = list(dict.fromkeys(ids))
+        # Consulta em lotes, respeitando o limite de parâmetros do SQLite
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio:inicio + 500]
+            marcadores = ", ".join("?" for _ in lote)
+            # Com MAX, o SQLite retorna as demais colunas da linha com a data mais recente
+            linhas += self.conexao.execute(
+                f"SELECT ID_imovel, tipo, preco, desconto, MAX(data) FROM eventos WHERE ID_imovel IN ({marcadores}) GROUP BY ID_imovel", lote
+            ).fetchall()
+        ultimos = pd.DataFrame(linhas, columns=['ID_imovel', 'tipo', 'preco', 'desconto', 'data']).set_index('ID_imovel')
+        ultimos[['preco', 'desconto']] = ultimos[['preco', 'desconto']].astype(float)
+        return ultimos
+
+    def registra(self, UF, df_novos, df_arquivados, df_alterados=None, data=None):
+        """
+        Grava os eventos de uma atualização de um estado, em uma única transação.
+        df_alterados deve conter as colunas <campo>_anterior geradas por compara_registros; data é um datetime (padrão: agora).
+        Retorna a quantidade de eventos gravados.
+        As diferenças que já constam do histórico (o mesmo registro repetido ao retomar uma execução interrompida antes
+        do envio das escritas ao Sheets) são ignoradas, sem duplicar eventos nem gerar relistagens.
+        """
+
+        data = int((data or datetime.now()).timestamp())
+        linhas = []
+        df_alterados = df_alterados if df_alterados is not None else pd.DataFrame(columns=['ID_imovel'])
+
+        # Último evento de cada imóvel das diferenças: ativo (listado, relistado ou alterado) ou arquivado
+        ultimos = self._ultimos_eventos(pd.concat([normaliza_ids(df['ID_imovel']) for df in (df_novos, df_arquivados, df_alterados)]))
+        arquivado = ultimos['tipo'] == CODIGOS[ARQUIVADO]
+        ids_ativos, ids_arquivados = ultimos.index[~arquivado], ultimos.index[arquivado]
+
+        # Imóveis novos: relistados quando foram arquivados anteriormente; os que já estão ativos no histórico são ignorados
+        if not df_novos.empty:
+            ids_novos = normaliza_ids(df_novos['ID_imovel'])
+            relistados = ids_novos.isin(ids_arquivados).to_numpy()
+            listados = ~relistados & ~ids_novos.isin(ids_ativos).to_numpy()
+            linhas += _eventos(df_novos[listados], LISTADO, UF, data)
+            linhas += _eventos(df_novos[relistados], RELISTADO, UF, data)
+
+        if not df_alterados.empty:
+            valores = converte_numericos(df_alterados)
+            # Alterações já registradas: o último evento do imóvel tem o mesmo preço e o mesmo desconto
+            ultimo = ultimos.reindex(normaliza_ids(df_alterados['ID_imovel']).to_numpy()).set_index(df_alterados.index)
+            registradas = (ultimo['tipo'].notna() & (ultimo['tipo'] != CODIGOS[ARQUIVADO])
+                           & ~_mudou(valores['Preco'], ultimo['preco']) & ~_mudou(valores['Desconto'], ultimo['desconto']))
+            for campo, tipo in [('Preco', PRECO_ALTERADO), ('Desconto', DESCONTO_ALTERADO)]:
+                if f'{campo}_anterior' in valores.columns:
+                    alterados = _mudou(valores[campo], valores[f'{campo}_anterior']) & ~registradas
+                    linhas += _eventos(df_alterados[alterados.to_numpy()], tipo, UF, data)
+
+        # Imóveis arquivados, exceto os que já constam como arquivados no histórico
+        if not df_arquivados.empty:
+            linhas += _eventos(df_arquivados[~normaliza_ids(df_arquivados['ID_imovel']).isin(ids_arquivados).to_numpy()], ARQUIVADO, UF, data)
+
+        with self.conexao:
+            self.conexao.executemany("INSERT OR IGNORE INTO eventos VALUES (?, ?, ?, ?, ?, ?)", linhas)
+        print(f"Histórico do estado {UF}: {len(linhas)} eventos registrados.")
+        return len(linhas)
+
+    def eventos(self, id_imovel):
+        """
+        Retorna um DataFrame com os eventos de um imóvel, em ordem cronológica.
+        """
+        df = pd.read_sql_query(
+            "SELECT data, tipo, UF, preco, desconto FROM eventos WHERE ID_imovel = ? ORDER BY data",
+            self.conexao, params=(str(id_imovel).strip(),)
+        )
+        df['data'] = [datetime.fromtimestamp(data) for data in df['data']]
+        df['tipo'] = [TIPOS[codigo] for codigo in df['tipo']]
+        return df
+
+    def historico_precos(self, id_imovel):
+        """
+        Retorna a lista de (data, preco, desconto) de um imóvel: o valor inicial e cada alteração de preço ou desconto.
+        Os eventos de uma mesma atualização têm a mesma data e os mesmos valores, e são retornados uma única vez.
+        """
+        linhas = self.conexao.execute(
+            "SELECT data, preco, desconto FROM eventos WHERE ID_imovel = ? AND tipo IN (?, ?, ?, ?) GROUP BY data ORDER BY data",
+            (str(id_imovel).strip(), *(CODIGOS[tipo] for tipo in [LISTADO, RELISTADO, PRECO_ALTERADO, DESCONTO_ALTERADO]))
+        ).fetchall()
+        return [(datetime.fromtimestamp(data), preco, desconto) for data, preco, desconto in linhas]
+
+    def dias_no_mercado(self, id_imovel, ate=None):
+        """
+        Retorna a quantidade de dias em que o imóvel esteve anunciado (somando os períodos entre listagens e arquivamentos),
+        até a data informada (ou até agora, se o imóvel continua ativo).
+        Retorna None caso o imóvel não tenha eventos no histórico.
+        """
+
+        ate = ate or datetime.now()
+        eventos = self.conexao.execute(
+            "SELECT data, tipo FROM eventos WHERE ID_imovel = ? AND tipo IN (?, ?, ?) ORDER BY data",
+            (str(id_imovel).strip(), *(CODIGOS[tipo] for tipo in [LISTADO, RELISTADO, ARQUIVADO]))
+        ).fetchall()
+        if not eventos:
+            return None
+
+        dias = 0
+        inicio = None
+        for data, tipo in eventos:
+            data = datetime.fromtimestamp(data)
+            if tipo == CODIGOS[ARQUIVADO]:
+                if inicio is not None:
+                    dias += (data - inicio).days
+                inicio = None
+            elif inicio is None:
+                inicio = data
+        if inicio is not None:
+            dias += max((ate - inicio).days, 0)
+        return dias
@@ -0,0 +1,43 @@
+"""
+Limitador de taxa (token bucket) para chamadas a APIs externas com cotas por minuto, como Google Sheets e Google Maps.
+"""
+
+import threading
+import time
+
+
+class LimitadorTaxa:
+    """
+    Limitador de taxa no modelo token bucket.
+    O balde começa cheio com `capacidade` fichas e é reabastecido continuamente à razão de `taxa_por_minuto` fichas por minuto.
+    Cada chamada a aguarda() consome uma ficha, bloqueando até que haja uma disponível.
+    Pode ser compartilhado entre threads.
+    """
+
+    def __init__(self, taxa_por_minuto, capacidade=None):
+        self.taxa_por_segundo = taxa_por_minuto / 60
+        self.capacidade = capacidade or max(1, int(taxa_por_minuto / 6))
+        self.fichas = float(self.capacidade)
+        self.ultima_reposicao = time.monotonic()
+        self.trava = threading.Lock()
+
+    def _repoe(self):
+        agora = time.monotonic()
+        self.fichas = min(self.capacidade, self.fichas + (agora - self.ultima_reposicao) * self.taxa_por_segundo)
+        self.ultima_reposicao = agora
+
+    def aguarda(self, fichas=1):
+        """
+        Bloqueia até que haja fichas disponíveis e as consome.
+        Retorna o tempo total de espera, em segundos.
+        """
+        espera_total = 0.0
+        while True:
+            with self.trava:
+                self._repoe()
+                if self.fichas >= fichas:
+                    self.fichas -= fichas
+                    return espera_total
+                espera = (fichas - self.fichas) / self.taxa_por_segundo
+            time.sleep(espera)
+            espera_total += espera
@@ -0,0 +1,234 @@
+"""
+Índice espacial dos imóveis de cada estado, usado pelo mapa da aplicação Flask.
+O índice é calculado uma única vez durante a atualização periódica (caixa/main.py) e gravado em um arquivo .npz por estado.
+Para cada nível de zoom, os imóveis são agrupados em uma grade sobre a projeção Web Mercator (a mesma dos mapas em tiles),
+com células de 64 pixels. A consulta de uma área retorna apenas as células visíveis, de forma que o tamanho da resposta
+depende da área e do zoom do mapa, e não da quantidade total de imóveis do estado.
+"""
+
+import os
+import hashlib
+
+import numpy as np
+
+from .snapshot import DIRETORIO_DADOS
+
+
+DIRETORIO_MAPAS = os.path.join(DIRETORIO_DADOS, "mapas")
+# Células por tile (256 px) em cada eixo: células de 64 px
+CELULAS_POR_TILE = 4
+# Acima deste zoom, a consulta retorna os imóveis individualmente, sem agrupamento
+ZOOM_MAXIMO = 16
+# Quantidade máxima de imóveis individuais em uma resposta
+LIMITE_PONTOS = 2000
+
+# Cache em memória dos índices já lidos, invalidado pela data de modificação do arquivo
+_cache_indices = {}
+
+
+def projeta(latitude, longitude):
+    """
+    Função para converter coordenadas geográficas em coordenadas Web Mercator normalizadas (0 a 1 em cada eixo).
+    """
+    latitude = np.clip(np.asarray(latitude, dtype=float), -85.0511, 85.0511)
+    x = (np.asarray(longitude, dtype=float) + 180) / 360
+    y = (1 - np.log(np.tan(np.radians(latitude)) + 1 / np.cos(np.radians(latitude))) / np.pi) / 2
+    return np.clip(x, 0, 1 - 1e-12), np.clip(y, 0, 1 - 1e-12)
+
+
+def latitude_projetada(y):
+    """
+    Função inversa de projeta() para o eixo y.
+    """
+    return float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y)))))
+
+
+def tiles_area(bbox, zoom):
+    """
+    Função para obter o intervalo de tiles (x0, y0, x1, y1) que cobre uma área (oeste, sul, leste, norte) em um zoom.
+    As consultas são alinhadas aos tiles, o que permite reaproveitar em cache as respostas de áreas próximas.
+    """
+    oeste, sul, leste, norte = bbox
+    (x0, x1), (y0, y1) = projeta([norte, sul], [oeste, leste])
+    n = 2 ** zoom
+    return int(x0 * n), int(y0 * n), int(x1 * n), int(y1 * n)
+
+
+def constroi_indice_pontos(df):
+    """
+    Função para construir o índice espacial a partir de um DataFrame de imóveis com Latitude e Longitude.
+    Retorna um dicionário de arrays:
+        imóveis (ordenados pela latitude): latitude, longitude, ID_imovel, preco, desconto, endereco, link
+        para cada zoom z de 0 a ZOOM_MAXIMO, as células não vazias (ordenadas por linha e coluna da grade):
+            z{z}_chave, z{z}_quantidade, z{z}_latitude, z{z}_longitude e z{z}_mais_barato (posição do imóvel mais barato)
+    """
+
+    # Importados aqui: a aplicação Flask apenas consulta o índice, o que depende somente do numpy
+    import pandas as pd
+    from .planilhas import converte_numericos
+
+    if 'Latitude' not in df.columns or 'Longitude' not in df.columns:
+        df = pd.DataFrame(columns=['ID_imovel', 'Latitude', 'Longitude', 'Preco', 'Desconto', 'Endereco', 'Link_acesso'])
+    df = converte_numericos(df)
+    df = df[df['Latitude'].notna() & df['Longitude'].notna()].sort_values('Latitude', kind='stable')
+
+    indice = {
+        'latitude': df['Latitude'].to_numpy(dtype=float),
+        'longitude': df['Longitude'].to_numpy(dtype=float),
+        'ID_imovel': df['ID_imovel'].astype(str).to_numpy(dtype=str),
+        'preco': df['Preco'].to_numpy(dtype=float),
+        'desconto': df['Desconto'].to_numpy(dtype=float),
+        'endereco': df['Endereco'].astype(str).to_numpy(dtype=str),
+        'link': df['Link_acesso'].astype(str).to_numpy(dtype=str),
+    }
+
+    x, y = projeta(indice['latitude'], indice['longitude'])
+    # Preços ausentes são ordenados por último na escolha do imóvel mais barato de cada célula
+    preco = np.nan_to_num(indice['preco'], nan=np.inf)
+    for zoom in range(ZOOM_MAXIMO + 1):
+        n = 2 ** zoom * CELULAS_POR_TILE
+        chaves = (y * n).astype(np.int64) * n + (x * n).astype(np.int64)
+        celulas, posicao, quantidade = np.unique(chaves, return_inverse=True, return_counts=True)
+        ordem = np.lexsort((preco, posicao))
+        primeiros = np.r_[0, np.cumsum(quantidade)[:-1]].astype(np.int64)
+        indice[f'z{zoom}_chave'] = celulas
+        indice[f'z{zoom}_quantidade'] = quantidade
+        indice[f'z{zoom}_latitude'] = np.bincount(posicao, weights=indice['latitude'], minlength=len(celulas)) / np.maximum(quantidade, 1)
+        indice[f'z{zoom}_longitude'] = np.bincount(posicao, weights=indice['longitude'], minlength=len(celulas)) / np.maximum(quantidade, 1)
+        indice[f'z{zoom}_mais_barato'] = ordem[primeiros] if len(celulas) else np.zeros(0, dtype=np.int64)
+
+    conteudo = hashlib.sha1()
+    for nome in ['latitude', 'longitude', 'preco', 'desconto', 'ID_imovel']:
+        conteudo.update(indice[nome].tobytes())
+    indice['versao'] = np.array(conteudo.hexdigest()[:16])
+    return indice
+
+
+def caminho_indice_pontos(UF):
+    """
+    Função para obter o caminho do arquivo do índice espacial de um estado.
+    """
+    return os.path.join(DIRETORIO_MAPAS, f"{UF}.npz")
+
+
+def salva_indice_pontos(UF, df):
+    """
+    Função para calcular e salvar o índice espacial de um estado, de forma atômica.
+    """
+    indice = constroi_indice_pontos(df)
+    os.makedirs(DIRETORIO_MAPAS, exist_ok=True)
+    caminho = caminho_indice_pontos(UF)
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, "wb") as f:
+        np.savez(f, **indice)
+    os.replace(caminho_temporario, caminho)
+
+    print(f"Índice do mapa do estado {UF} salvo: {len(indice['latitude'])} imóveis com coordenadas.")
+    return str(indice['versao'])
+
+
+def carrega_indice_pontos(UF):
+    """
+    Função para carregar o índice espacial de um estado.
+    Retorna None caso ainda não exista índice para o estado.
+    """
+
+    caminho = caminho_indice_pontos(UF)
+    try:
+        modificado_em = os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+    em_cache = _cache_indices.get(UF)
+    if em_cache and em_cache[0] == modificado_em:
+        return em_cache[1]
+
+    with np.load(caminho) as arquivo:
+        indice = {nome: arquivo[nome] for nome in arquivo.files}
+    _cache_indices[UF] = (modificado_em, indice)
+    return indice
+
+
+def _imovel(indice, posicao):
+    """
+    Converte um imóvel do índice em uma feature GeoJSON.
+    """
+    preco = indice['preco'][posicao]
+    desconto = indice['desconto'][posicao]
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [float(indice['longitude'][posicao]), float(indice['latitude'][posicao])]},
+        'properties': {
+            'quantidade': 1,
+            'ID_imovel': str(indice['ID_imovel'][posicao]),
+            'preco': None if np.isnan(preco) else float(preco),
+            'desconto': None if np.isnan(desconto) else round(float(desconto), 2),
+            'endereco': str(indice['endereco'][posicao]),
+            'link': str(indice['link'][posicao]),
+        }
+    }
+
+
+def consulta_pontos(indice, tiles, zoom):
+    """
+    Função para consultar os imóveis de um intervalo de tiles (x0, y0, x1, y1) em um zoom.
+    Até ZOOM_MAXIMO, retorna um agrupamento por célula (com a quantidade de imóveis e o menor preço);
+    células com um único imóvel e zooms maiores retornam os imóveis individualmente.
+    Retorna uma FeatureCollection GeoJSON.
+    """
+
+    x0, y0, x1, y1 = tiles
+    features = []
+
+    if zoom > ZOOM_MAXIMO:
+        # Imóveis individuais: busca binária no intervalo de latitudes e filtro pelas longitudes
+        n = 2 ** zoom
+        norte, sul = latitude_projetada(y0 / n), latitude_projetada((y1 + 1) / n)
+        oeste, leste = x0 / n * 360 - 180, (x1 + 1) / n * 360 - 180
+        inicio, fim = np.searchsorted(indice['latitude'], [sul, norte], side='left')
+        longitudes = indice['longitude'][inicio:fim]
+        posicoes = inicio + np.flatnonzero((longitudes >= oeste) & (longitudes < leste))
+        features = [_imovel(indice, posicao) for posicao in posicoes[:LIMITE_PONTOS]]
+        return {'type': 'FeatureCollection', 'features': features}
+
+    zoom = max(zoom, 0)
+    n = 2 ** zoom * CELULAS_POR_TILE
+    cx0, cx1 = x0 * CELULAS_POR_TILE, (x1 + 1) * CELULAS_POR_TILE
+    cy0, cy1 = y0 * CELULAS_POR_TILE, (y1 + 1) * CELULAS_POR_TILE
+
+    # As células são ordenadas por linha e coluna: as linhas visíveis formam um intervalo contínuo de chaves
+    chaves = indice[f'z{zoom}_chave']
+    inicio, fim = np.searchsorted(chaves, [cy0 * n, cy1 * n])
+    colunas = chaves[inicio:fim] % n
+    posicoes = inicio + np.flatnonzero((colunas >= cx0) & (colunas < cx1))
+
+    quantidades = indice[f'z{zoom}_quantidade']
+    latitudes, longitudes = indice[f'z{zoom}_latitude'], indice[f'z{zoom}_longitude']
+    mais_baratos = indice[f'z{zoom}_mais_barato']
+    for posicao in posicoes:
+        quantidade = int(quantidades[posicao])
+        if quantidade == 1:
+            features.append(_imovel(indice, mais_baratos[posicao]))
+            continue
+        preco_minimo = indice['preco'][mais_baratos[posicao]]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(float(longitudes[posicao]), 6), round(float(latitudes[posicao]), 6)]},
+            'properties': {
+                'quantidade': quantidade,
+                'preco_minimo': None if np.isnan(preco_minimo) else float(preco_minimo),
+            }
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def limites_indice(indice):
+    """
+    Função para obter os limites ([sul, oeste], [norte, leste]) dos imóveis do índice, usados no enquadramento inicial do mapa.
+    Retorna None caso nenhum imóvel tenha coordenadas.
+    """
+    if indice is None or not len(indice['latitude']):
+        return None
+    return [[float(indice['latitude'][0]), float(indice['longitude'].min())],
+            [float(indice['latitude'][-1]), float(indice['longitude'].max())]]
@@ -0,0 +1,189 @@
+"""
+Métricas de desempenho da atualização periódica (caixa/main.py) e da aplicação Flask.
+- Etapas da atualização: cada etapa (download, decodificação, leitura, tratamento, comparação, geocodificação,
+  leitura e escrita do armazenamento) é medida por etapa() e registrada como uma linha JSON em LOG_METRICAS,
+  com o estado, a duração e atributos como quantidade de linhas, bytes e chamadas a APIs.
+  Com LOG_METRICAS=-, as linhas são impressas na saída padrão.
+- Aplicação Flask: histogramas de latência das requisições e contagem de acertos de cache por rota (MetricasHTTP),
+  exportados no formato de texto do Prometheus pela rota /metrics.
+Depende apenas da biblioteca padrão, para não pesar na inicialização da aplicação.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+
+from .snapshot import DIRETORIO_DADOS
+
+
+LOG_METRICAS = os.environ.get("LOG_METRICAS", os.path.join(DIRETORIO_DADOS, "metricas.jsonl"))
+# Limites (em segundos) das faixas dos histogramas de latência
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Resultados de cache considerados acertos: 304 (o cliente já tem a versão) e resposta reaproveitada da memória
+ACERTOS_CACHE = ('validado', 'memoria')
+
+# Identificador da execução, incluído em todas as etapas registradas pelo processo
+EXECUCAO = datetime.now().strftime("%Y%m%dT%H%M%S")
+# Etapas registradas nesta execução, usadas no resumo ao final da atualização
+etapas_registradas = []
+_trava_etapas = threading.Lock()
+
+
+def registra_etapa(registro):
+    """
+    Função para registrar uma etapa já medida: guarda-a em etapas_registradas e grava a linha JSON em LOG_METRICAS.
+    """
+    registro = {'execucao': EXECUCAO, **registro}
+    linha = json.dumps(registro, ensure_ascii=False, default=str)
+    with _trava_etapas:
+        etapas_registradas.append(registro)
+        if LOG_METRICAS == "-":
+            print(linha, file=sys.stdout)
+        elif LOG_METRICAS:
+            os.makedirs(os.path.dirname(os.path.abspath(LOG_METRICAS)), exist_ok=True)
+            with open(LOG_METRICAS, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+
+
+def desativa_log():
+    """
+    Função para deixar de gravar as etapas no arquivo LOG_METRICAS (na simulação, que não grava nada em disco).
+    As etapas continuam registradas em memória e, com LOG_METRICAS=-, impressas na saída padrão.
+    """
+    global LOG_METRICAS
+    if LOG_METRICAS != "-":
+        LOG_METRICAS = ""
+
+
+@contextmanager
+def etapa(nome, UF=None, **atributos):
+    """
+    Mede a duração de uma etapa da atualização e a registra ao final (inclusive em caso de erro).
+    Retorna o dicionário do registro, ao qual podem ser acrescentados atributos durante a etapa:
+        with etapa('tratamento', UF, linhas=len(df)) as registro:
+            ...
+            registro['bytes'] = tamanho
+    """
+    registro = {'etapa': nome, 'UF': UF, 'inicio': datetime.now().isoformat(timespec='milliseconds'), **atributos}
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro['erro'] = type(e).__name__
+        raise
+    finally:
+        registro['duracao'] = round(time.perf_counter() - inicio, 6)
+        registra_etapa(registro)
+
+
+def resumo_etapas(etapas=None, quantidade=5):
+    """
+    Função para imprimir o tempo total de cada etapa e as combinações de estado e etapa mais demoradas,
+    com as chamadas a APIs acumuladas.
+    """
+
+    etapas = etapas_registradas if etapas is None else etapas
+    if not etapas:
+        return
+    por_etapa = {}
+    chamadas = {}
+    for registro in etapas:
+        por_etapa[registro['etapa']] = por_etapa.get(registro['etapa'], 0) + registro['duracao']
+        for chave, valor in registro.items():
+            if chave.startswith('chamadas_') and isinstance(valor, int):
+                chamadas[chave] = chamadas.get(chave, 0) + valor
+
+    print("Tempo por etapa:")
+    for nome, duracao in sorted(por_etapa.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {nome}: {duracao:.2f} s")
+    print("Estados e etapas mais demorados:")
+    for registro in sorted(etapas, key=lambda registro: registro['duracao'], reverse=True)[:quantidade]:
+        print(f"  {registro['UF'] or '-'} / {registro['etapa']}: {registro['duracao']:.2f} s")
+    if chamadas:
+        print("Chamadas a APIs: " + ", ".join(f"{chave[len('chamadas_'):]}: {valor}" for chave, valor in sorted(chamadas.items())))
+
+
+def _rotulos(**rotulos):
+    """
+    Formata os rótulos de uma métrica do Prometheus, escapando barras invertidas, aspas e quebras de linha.
+    """
+    def escapa(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{nome}="{escapa(valor)}"' for nome, valor in rotulos.items()) + "}"
+
+
+class MetricasHTTP:
+    """
+    Métricas das requisições atendidas pela aplicação Flask, mantidas em memória por processo:
+    histogramas de latência por rota, método e status, e contagem dos resultados de cache por rota
+    ('validado': 304, 'memoria': resposta reaproveitada, 'gerado': resposta gerada, 'sem_versao': não cacheável).
+    """
+
+    def __init__(self, limites=LIMITES_LATENCIA):
+        self.limites = tuple(limites)
+        self.trava = threading.Lock()
+        # (rota, método, status) -> [contagem de cada faixa, soma das durações, total]
+        self.latencias = {}
+        # (rota, resultado) -> contagem
+        self.cache = {}
+
+    def observa(self, rota, metodo, status, duracao):
+        chave = (rota, metodo, str(status))
+        with self.trava:
+            dados = self.latencias.get(chave)
+            if dados is None:
+                dados = self.latencias[chave] = [[0] * len(self.limites), 0.0, 0]
+            faixa = bisect_left(self.limites, duracao)
+            if faixa < len(self.limites):
+                dados[0][faixa] += 1
+            dados[1] += duracao
+            dados[2] += 1
+
+    def registra_cache(self, rota, resultado):
+        with self.trava:
+            self.cache[(rota, resultado)] = self.cache.get((rota, resultado), 0) + 1
+
+    def exporta(self):
+        """
+        Retorna as métricas no formato de texto do Prometheus (versão 0.0.4).
+        """
+        with self.trava:
+            latencias = {chave: (list(dados[0]), dados[1], dados[2]) for chave, dados in self.latencias.items()}
+            cache = dict(self.cache)
+
+        linhas = [
+            "# HELP caixa_http_requisicao_segundos Latência das requisições HTTP por rota.",
+            "# TYPE caixa_http_requisicao_segundos histogram",
+        ]
+        for (rota, metodo, status), (faixas, soma, total) in sorted(latencias.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites, faixas):
+                acumulado += contagem
+                linhas.append(f"caixa_http_requisicao_segundos_bucket{_rotulos(rota=rota, metodo=metodo, status=status, le=limite)} {acumulado}")
+            linhas.append(f"caixa_http_requisicao_segundos_bucket{_rotulos(rota=rota, metodo=metodo, status=status, le='+Inf')} {total}")
+            linhas.append(f"caixa_http_requisicao_segundos_sum{_rotulos(rota=rota, metodo=metodo, status=status)} {soma:.6f}")
+            linhas.append(f"caixa_http_requisicao_segundos_count{_rotulos(rota=rota, metodo=metodo, status=status)} {total}")
+
+        linhas += [
+            "# HELP caixa_cache_respostas_total Respostas cacheáveis por rota e resultado do cache.",
+            "# TYPE caixa_cache_respostas_total counter",
+        ]
+        totais = {}
+        acertos = {}
+        for (rota, resultado), contagem in sorted(cache.items()):
+            linhas.append(f"caixa_cache_respostas_total{_rotulos(rota=rota, resultado=resultado)} {contagem}")
+            totais[rota] = totais.get(rota, 0) + contagem
+            acertos[rota] = acertos.get(rota, 0) + (contagem if resultado in ACERTOS_CACHE else 0)
+
+        linhas += [
+            "# HELP caixa_cache_acertos_razao Proporção de respostas servidas pelo cache (304 ou memória) por rota.",
+            "# TYPE caixa_cache_acertos_razao gauge",
+        ]
+        for rota, total in sorted(totais.items()):
+            linhas.append(f"caixa_cache_acertos_razao{_rotulos(rota=rota)} {acertos[rota] / total:.6f}")
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,180 @@
+"""
+Estatísticas nacionais a partir de agregados parciais de cada estado.
+Cada estado gera, durante a atualização periódica, um agregado parcial combinável (contagens, somas, somas dos quadrados,
+imóveis extremos, rankings e um esboço de quantis do desconto). As estatísticas nacionais são obtidas pela combinação
+dos 27 parciais, sem reler os imóveis: quando apenas alguns estados mudam, somente os seus parciais são recalculados.
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+from .planilhas import COLUNAS_RESUMO, converte_numericos, formata_moeda
+from .snapshot import carrega_parciais, salva_snapshot
+
+
+# Identificador do snapshot nacional (o mesmo usado em adiciona_stats)
+UF_NACIONAL = "Nacional"
+# Quantidade de imóveis guardados nos rankings (mais baratos, mais caros e mais descontados)
+TOP_K = 10
+# Largura das faixas do esboço de quantis do desconto (em pontos percentuais)
+LARGURA_FAIXA_DESCONTO = 0.1
+
+
+def _registros(df):
+    colunas = [coluna for coluna in ['UF'] + COLUNAS_RESUMO if coluna in df.columns]
+    df = df[colunas]
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _momentos(serie):
+    """
+    Contagem, soma e soma dos quadrados de uma série, que permitem combinar médias e desvios padrão.
+    """
+    serie = serie.dropna()
+    return {'n': int(len(serie)), 'soma': float(serie.sum()), 'soma_quadrados': float((serie ** 2).sum())}
+
+
+def calcula_parcial(df):
+    """
+    Função para calcular o agregado parcial de um estado a partir de um DataFrame de imóveis.
+    Assim como em prepara_dados_uf, os preços abaixo de R$ 100 (erros de preenchimento) são ignorados nas estatísticas.
+    """
+
+    df = converte_numericos(df)
+    df_filtrado = df[df['Preco'] >= 100]
+    # Imóveis com valor de avaliação zerado têm desconto infinito, que não entra no esboço nem nos momentos
+    descontos_validos = np.isfinite(df_filtrado['Desconto'])
+    desconto = df_filtrado['Desconto'][descontos_validos]
+
+    # Esboço de quantis: histograma esparso do desconto em faixas de largura fixa, combinável por soma
+    faixas = (desconto / LARGURA_FAIXA_DESCONTO).round().astype(int).value_counts()
+
+    return {
+        'quantidade': int(len(df)),
+        'preco': _momentos(df_filtrado['Preco']),
+        'desconto': {
+            **_momentos(desconto),
+            'positivos': int((desconto > 0).sum()),
+            'esboco': {str(faixa): int(contagem) for faixa, contagem in faixas.items()},
+        },
+        'mais_baratos': _registros(df_filtrado.nsmallest(TOP_K, 'Preco')),
+        'mais_caros': _registros(df_filtrado.nlargest(TOP_K, 'Preco')),
+        'mais_descontados': _registros(df_filtrado[descontos_validos].nlargest(TOP_K, 'Desconto')),
+        'modalidades': {str(chave): int(valor) for chave, valor in df_filtrado['Modalidade_venda'].value_counts().items() if valor},
+        'tipos': {str(chave): int(valor) for chave, valor in df_filtrado['Tipo_Imovel'].value_counts().items() if valor},
+    }
+
+
+def _soma_contagens(dicionarios):
+    total = {}
+    for dicionario in dicionarios:
+        for chave, valor in dicionario.items():
+            total[chave] = total.get(chave, 0) + valor
+    return total
+
+
+def _soma_momentos(momentos):
+    return {chave: sum(m[chave] for m in momentos) for chave in ['n', 'soma', 'soma_quadrados']}
+
+
+def combina_parciais(parciais):
+    """
+    Função para combinar agregados parciais (de estados, ou de outras combinações) em um único agregado.
+    """
+
+    parciais = list(parciais)
+    return {
+        'quantidade': sum(p['quantidade'] for p in parciais),
+        'preco': _soma_momentos([p['preco'] for p in parciais]),
+        'desconto': {
+            **_soma_momentos([p['desconto'] for p in parciais]),
+            'positivos': sum(p['desconto']['positivos'] for p in parciais),
+            'esboco': _soma_contagens(p['desconto']['esboco'] for p in parciais),
+        },
+        'mais_baratos': heapq.nsmallest(TOP_K, (r for p in parciais for r in p['mais_baratos']), key=lambda r: r['Preco']),
+        'mais_caros': heapq.nlargest(TOP_K, (r for p in parciais for r in p['mais_caros']), key=lambda r: r['Preco']),
+        'mais_descontados': heapq.nlargest(TOP_K, (r for p in parciais for r in p['mais_descontados']), key=lambda r: r['Desconto']),
+        'modalidades': _soma_contagens(p['modalidades'] for p in parciais),
+        'tipos': _soma_contagens(p['tipos'] for p in parciais),
+    }
+
+
+def quantil_esboco(esboco, q):
+    """
+    Função para estimar um quantil a partir do esboço de quantis (com erro máximo de meia faixa).
+    """
+    total = sum(esboco.values())
+    if not total:
+        return None
+    alvo = q * total
+    acumulado = 0
+    for faixa in sorted(esboco, key=int):
+        acumulado += esboco[faixa]
+        if acumulado >= alvo:
+            return int(faixa) * LARGURA_FAIXA_DESCONTO
+    return int(max(esboco, key=int)) * LARGURA_FAIXA_DESCONTO
+
+
+def _media_desvio(momentos):
+    n = momentos['n']
+    if not n:
+        return None, None
+    media = momentos['soma'] / n
+    variancia = max(momentos['soma_quadrados'] / n - media ** 2, 0)
+    return media, math.sqrt(variancia)
+
+
+def prepara_dados_nacionais(parciais_por_uf):
+    """
+    Função para calcular os dados exibidos na página nacional a partir dos agregados parciais de cada estado.
+    Retorna o dicionário utilizado pelo template imoveis_nacional.html.
+    """
+
+    parcial = combina_parciais(parciais_por_uf.values())
+    preco_medio, desvio_preco = _media_desvio(parcial['preco'])
+    desconto_medio, _ = _media_desvio(parcial['desconto'])
+    modalidades = sorted(parcial['modalidades'].items(), key=lambda item: item[1], reverse=True)
+    tipos = sorted(parcial['tipos'].items(), key=lambda item: item[1], reverse=True)
+    venda_direta = sum(v for m, v in parcial['modalidades'].items() if 'Venda Direta Online' in m or 'Venda Online' in m)
+
+    estados = []
+    for UF, parcial_uf in sorted(parciais_por_uf.items()):
+        media_uf, _ = _media_desvio(parcial_uf['preco'])
+        estados.append({
+            'UF': UF,
+            'quantidade': parcial_uf['quantidade'],
+            'preco_medio': formata_moeda(media_uf) if media_uf is not None else '-',
+            'mediana_desconto': quantil_esboco(parcial_uf['desconto']['esboco'], 0.5),
+        })
+
+    return {
+        'quantidade_imoveis': parcial['quantidade'],
+        'quantidade_estados': len(parciais_por_uf),
+        'quantidade_desconto': parcial['desconto']['positivos'],
+        'preco_medio': formata_moeda(preco_medio) if preco_medio is not None else '-',
+        'desvio_padrao_preco': formata_moeda(desvio_preco) if desvio_preco is not None else '-',
+        'desconto_medio': desconto_medio,
+        'mediana_desconto': quantil_esboco(parcial['desconto']['esboco'], 0.5),
+        'mais_baratos': parcial['mais_baratos'][:3],
+        'mais_caros': parcial['mais_caros'][:3],
+        'mais_descontado': parcial['mais_descontados'][0] if parcial['mais_descontados'] else None,
+        'modalidades': modalidades,
+        'modalidade': modalidades[0][0] if modalidades else '-',
+        'venda_direta': f"{venda_direta / parcial['preco']['n'] * 100:.2f}%" if parcial['preco']['n'] else '-',
+        'tipo_comum': tipos[0][0] if tipos else '-',
+        'estados': estados,
+    }
+
+
+def atualiza_nacional():
+    """
+    Função para recalcular o snapshot nacional a partir dos agregados parciais gravados de cada estado.
+    Os parciais dos estados que não mudaram são reaproveitados, de forma que o custo não depende da quantidade de imóveis.
+    """
+    parciais = carrega_parciais()
+    if not parciais:
+        print("Sem agregados parciais para calcular as estatísticas nacionais.")
+        return None
+    return salva_snapshot(UF_NACIONAL, prepara_dados_nacionais(parciais), combina_parciais(parciais.values()))
@@ -2,33 +2,240 @@
 Funções para baixar e tratar planilhas de leilões da Caixa Econômica Federal.
 """
 
+import os
+import re
+import codecs
+import json
+import hashlib
+
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 from io import StringIO
 from datetime import datetime
 
+from .snapshot import DIRETORIO_DADOS
+from .geoloc import normaliza_texto
+from .metricas import etapa
+
+
+# Colunas da planilha tratada, na ordem em que são gravadas
+COLUNAS = ['ID_imovel', 'UF', 'Cidade', 'Bairro', 'Endereco', 'Preco', 'Valor_Avaliacao', 'Desconto', 'Descricao', 'Modalidade_venda', 'Link_acesso', 'Tipo_Imovel', 'Area_Total', 'Area_Privativa', 'Area_Terreno', 'Data_Inclusao', 'Latitude', 'Longitude']
+# Colunas numéricas da planilha tratada
+COLUNAS_NUMERICAS = ['Preco', 'Valor_Avaliacao', 'Desconto', 'Area_Total', 'Area_Privativa', 'Area_Terreno', 'Latitude', 'Longitude']
+
+# Colunas do CSV da Caixa e seus tipos
+# Preço e Valor de avaliação são convertidos para float já na leitura (formato brasileiro: 123.456,78)
+TIPOS_CSV = {
+    ' N° do imóvel': str,
+    'UF': str,
+    'Cidade': str,
+    'Bairro': str,
+    'Endereço': str,
+    'Preço': 'float64',
+    'Valor de avaliação': 'float64',
+    'Desconto': str,
+    'Descrição': str,
+    'Modalidade de venda': str,
+    'Link de acesso': str
+}
+# Colunas com poucos valores distintos, armazenadas como category
+COLUNAS_CATEGORICAS = ['UF', 'Cidade', 'Bairro', 'Modalidade_venda', 'Tipo_Imovel']
+
+# Colunas e quantidade dos imóveis mais baratos guardados nos agregados por município e bairro
+COLUNAS_RESUMO = ['ID_imovel', 'Endereco', 'Bairro', 'Preco', 'Desconto', 'Tipo_Imovel', 'Modalidade_venda', 'Link_acesso']
+QUANTIDADE_MAIS_BARATOS = 5
+# Expressão regular para extrair, em uma única passagem, o tipo e as áreas do imóvel a partir da descrição
+# Ex.: "Apartamento, 48.48 de área total, 43.37 de área privativa, 0.00 de área do terreno, 2 qto(s), ..."
+REGEX_DESCRICAO = re.compile(
+    r'^(?P<Tipo_Imovel>\w+)'
+    r'(?:.*?, (?P<Area_Total>\d+\.\d+) de área total)?'
+    r'(?:.*?, (?P<Area_Privativa>\d+\.\d+) de área privativa)?'
+    r'(?:.*?, (?P<Area_Terreno>\d+\.\d+) de área do terreno)?'
+)
+
+# Cabeçalhos das requisições ao site da Caixa
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+# Arquivo com ETag, Last-Modified e hash do conteúdo da última planilha processada de cada estado
+ARQUIVO_METADADOS_DOWNLOADS = os.path.join(DIRETORIO_DADOS, "downloads.json")
+# Valor retornado por baixa_planilha quando a planilha não mudou desde o último download processado
+SEM_ALTERACAO = object()
+# Leitura em streaming: o CSV é decodificado, filtrado e analisado à medida que é baixado
+LEITURA_STREAMING = os.environ.get("LEITURA_STREAMING") == "1"
+TAMANHO_BLOCO = 64 * 1024
+
+
+class ConteudoHTML(ValueError):
+    """
+    Indica que o servidor da Caixa retornou uma página HTML no lugar do CSV.
+    """
+
+
+def linhas_csv(blocos, hash_conteudo=None):
+    """
+    Gerador que decodifica (iso-8859-1) blocos de bytes à medida que chegam e produz as linhas do CSV,
+    descartando as linhas em branco (';;;') e interrompendo a leitura caso o conteúdo seja uma página HTML.
+    Se informado, hash_conteudo é atualizado com os bytes originais.
+    """
+    decodificador = codecs.getincrementaldecoder('iso-8859-1')()
+    resto = ''
+    primeira = True
+    fim = False
+    blocos = iter(blocos)
+    while not fim:
+        bloco = next(blocos, None)
+        if bloco is None:
+            texto, fim = resto + decodificador.decode(b'', final=True), True
+        else:
+            if hash_conteudo is not None:
+                hash_conteudo.update(bloco)
+            texto = resto + decodificador.decode(bloco)
+        linhas = texto.splitlines()
+        # A última linha do bloco pode estar incompleta; é mantida para o próximo bloco
+        resto = '' if fim or not linhas or texto.endswith(('\n', '\r')) else linhas.pop()
+        for linha in linhas:
+            if not linha.strip('; \n\r'):
+                continue
+            if primeira:
+                if linha.strip().startswith('<!DOCTYPE html>'):
+                    raise ConteudoHTML("Não é um CSV válido, parece ser uma página HTML.")
+                primeira = False
+            yield linha + '\n'
+
+
+class ArquivoLinhas:
+    """
+    Objeto similar a arquivo que entrega ao pandas o texto produzido por um gerador de linhas, sem montar uma cópia completa do conteúdo.
+    """
+
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._pendente = ''
+
+    def read(self, tamanho=-1):
+        partes = [self._pendente]
+        total = len(self._pendente)
+        while tamanho is None or tamanho < 0 or total < tamanho:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            partes.append(linha)
+            total += len(linha)
+        texto = ''.join(partes)
+        if tamanho is None or tamanho < 0:
+            self._pendente = ''
+            return texto
+        self._pendente = texto[tamanho:]
+        return texto[:tamanho]
+
+    def __iter__(self):
+        return self._linhas
+
+
+def cria_sessao(max_conexoes):
+    """
+    Função para criar uma sessão HTTP compartilhada entre os downloads, com até max_conexoes conexões simultâneas.
+    A sessão mantém um pool de conexões (keep-alive) com o servidor da Caixa, evitando um novo handshake por planilha.
+    """
+
+    sessao = requests.Session()
+    sessao.headers.update(HEADERS)
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_conexoes)
+    sessao.mount('https://', adaptador)
+    return sessao
+
 
-def baixa_planilha(UF):
+def carrega_metadados_downloads():
+    """
+    Função para carregar os metadados (ETag, Last-Modified e hash) dos últimos downloads processados.
+    """
+    try:
+        with open(ARQUIVO_METADADOS_DOWNLOADS, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def salva_metadados_downloads(metadados):
+    """
+    Função para salvar os metadados dos downloads processados.
+    Deve ser chamada somente após o processamento completo de um estado, para que uma falha não faça a planilha ser ignorada na próxima execução.
+    """
+    os.makedirs(DIRETORIO_DADOS, exist_ok=True)
+    caminho_temporario = ARQUIVO_METADADOS_DOWNLOADS + ".tmp"
+    with open(caminho_temporario, "w", encoding="utf-8") as f:
+        json.dump(metadados, f, indent=2)
+    os.replace(caminho_temporario, ARQUIVO_METADADOS_DOWNLOADS)
+
+
+def baixa_planilha(UF, sessao=None, metadados=None, streaming=None):
     """
     Função para baixar a planilha de leilões da Caixa de um estado específico.
+    Se forem informados os metadados do último download (ETag, Last-Modified e hash), faz uma requisição condicional
+    e retorna SEM_ALTERACAO quando a planilha não mudou, sem analisar o conteúdo.
+    Com streaming=True (ou LEITURA_STREAMING=1), o conteúdo é analisado à medida que é baixado, sem cópias intermediárias;
+    nesse modo, a comparação do hash só é possível após a leitura.
+    Os metadados do novo download ficam disponíveis em df.attrs['metadados']. Quando o conteúdo é igual ao do último download,
+    os novos validadores (ETag e Last-Modified) enviados pelo servidor são atualizados no próprio dicionário metadados,
+    para que as próximas requisições condicionais possam receber 304.
     """
 
+    streaming = LEITURA_STREAMING if streaming is None else streaming
+
     url = f'https://venda-imoveis.caixa.gov.br/listaweb/Lista_imoveis_{UF}.csv'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
+    metadados = metadados or {}
+
+    # Cabeçalhos da requisição condicional
+    headers = dict(HEADERS)
+    if metadados.get('etag'):
+        headers['If-None-Match'] = metadados['etag']
+    if metadados.get('last_modified'):
+        headers['If-Modified-Since'] = metadados['last_modified']
 
     print(f"Baixando planilha de leilões da Caixa para o estado {UF}...")
-    response = requests.get(url, headers=headers)
+    # No modo streaming, a etapa de download mede apenas a resposta inicial: o corpo é lido na etapa de leitura
+    with etapa('download', UF, streaming=streaming) as registro:
+        if sessao is None:
+            response = requests.get(url, headers=headers, stream=streaming)
+        else:
+            response = sessao.get(url, headers=headers, timeout=60, stream=streaming)
+        registro['status'] = response.status_code
+        if response.status_code == 200 and not streaming:
+            registro['bytes'] = len(response.content)
 
-    if response.status_code != 200:
+    if response.status_code == 304:
+        print(f"Planilha {UF} não foi alterada desde o último download (304).")
+        # No modo streaming, a conexão só volta ao pool da sessão quando a resposta é fechada
+        response.close()
+        return SEM_ALTERACAO
+    elif response.status_code != 200:
         print(f"Erro {response.status_code}: Não foi possível acessar a planilha {UF}.")
+        response.close()
         return None
+    elif streaming:
+        with etapa('leitura', UF, streaming=True) as registro:
+            df, hash_conteudo = le_resposta_streaming(response, UF)
+            registro['linhas'] = len(df) if df is not None else 0
+        if df is None:
+            return None
+        if hash_conteudo == metadados.get('hash'):
+            print(f"Planilha {UF} tem o mesmo conteúdo do último download.")
+            metadados.update(etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+            return SEM_ALTERACAO
     else:
         print(f"Planilha {UF} baixada com sucesso.")
+        # Compara o hash do conteúdo com o do último download processado
+        hash_conteudo = hashlib.sha256(response.content).hexdigest()
+        if hash_conteudo == metadados.get('hash'):
+            print(f"Planilha {UF} tem o mesmo conteúdo do último download.")
+            metadados.update(etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+            return SEM_ALTERACAO
         # Assume que o conteúdo original está em cp1252 e o converte para uma string UTF-8
-        content_utf8 = response.content.decode('iso-8859-1')
-        content_utf8_clean = "\n".join(line for line in content_utf8.splitlines() if line.strip('; \n\r'))
+        with etapa('decodificacao', UF, bytes=len(response.content)):
+            content_utf8 = response.content.decode('iso-8859-1')
+            content_utf8_clean = "\n".join(line for line in content_utf8.splitlines() if line.strip('; \n\r'))
         # Verificar se o conteúdo parece ser um CSV
         if content_utf8_clean.strip().startswith('<!DOCTYPE html>'):
             print("Não é um CSV válido, parece ser uma página HTML.")
@@ -39,14 +246,67 @@ def baixa_planilha(UF):
             # Usa StringIO para transformar a string UTF-8 em um objeto similar a arquivo
             data = StringIO(content_utf8_clean)
             try:
-                df = pd.read_csv(data, header=1, sep=';', encoding='utf-8', on_bad_lines='skip')
+                with etapa('leitura', UF) as registro:
+                    df = le_csv_caixa(data)
+                    registro['linhas'] = len(df)
                 print("CSV convertido com sucesso.")     
-            except pd.errors.ParserError as e:
+            except ValueError as e:
                 print(f"Erro ao analisar o CSV: {e}")
                 return None
+
+    df.attrs['metadados'] = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'hash': hash_conteudo
+    }
     return df
 
 
+def le_resposta_streaming(response, UF):
+    """
+    Função para ler em streaming o corpo de uma resposta HTTP com o CSV da Caixa.
+    Retorna o DataFrame (ou None em caso de erro) e o hash do conteúdo.
+    """
+
+    hash_conteudo = hashlib.sha256()
+    try:
+        df = le_csv_caixa(ArquivoLinhas(linhas_csv(response.iter_content(TAMANHO_BLOCO), hash_conteudo)))
+        print(f"Planilha {UF} baixada e convertida com sucesso.")
+    except ConteudoHTML as e:
+        print(e)
+        return None, None
+    except ValueError as e:
+        print(f"Erro ao analisar o CSV: {e}")
+        return None, None
+    except requests.RequestException as e:
+        print(f"Erro ao baixar a planilha {UF}: {e}")
+        return None, None
+    finally:
+        response.close()
+    return df, hash_conteudo.hexdigest()
+
+
+def le_csv_caixa(fonte):
+    """
+    Função para ler o CSV da Caixa (já sem as linhas em branco) para um DataFrame.
+    Lê apenas as colunas utilizadas, com tipos explícitos, convertendo os valores monetários durante a própria leitura.
+    """
+    return pd.read_csv(
+        fonte, header=1, sep=';', on_bad_lines='skip',
+        usecols=list(TIPOS_CSV), dtype=TIPOS_CSV, thousands='.', decimal=','
+    )
+
+
+def converte_moeda(serie):
+    """
+    Função para converter uma coluna de valores no formato brasileiro (123.456,78) para float.
+    Colunas já numéricas são mantidas.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    return pd.to_numeric(serie.astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False), errors='coerce')
+
+
 def trata_planilha(df):
     """
     Função para tratar os dados da planilha de leilões da Caixa, limpando e organizando as colunas e formatando os dados para análise
@@ -54,24 +314,18 @@ def trata_planilha(df):
 
     df.rename(columns={' N° do imóvel': 'ID_imovel', 'Endereço': 'Endereco', 'Preço': 'Preco', 'Valor de avaliação': 'Valor_Avaliacao', 'Descrição': 'Descricao', 'Modalidade de venda': 'Modalidade_venda', 'Link de acesso': 'Link_acesso'}, inplace=True)
 
-    # Extrair o tipo de imóvel (a primeira palavra da string)
-    df['Tipo_Imovel'] = df['Descricao'].str.extract(r'^(\w+)')
+    # O ID do imóvel é lido como texto; remove espaços ao redor
+    df['ID_imovel'] = df['ID_imovel'].astype(str).str.strip()
 
-    # Extrair a área total e converter para float
-    df['Area_Total'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área total').astype(float)
+    # Extrai o tipo de imóvel (a primeira palavra da string) e as áreas total, privativa e do terreno em uma única passagem
+    extraido = df['Descricao'].str.extract(REGEX_DESCRICAO)
+    df['Tipo_Imovel'] = extraido['Tipo_Imovel']
+    for coluna in ['Area_Total', 'Area_Privativa', 'Area_Terreno']:
+        df[coluna] = extraido[coluna].astype(float)
 
-    # Extrair a área privativa e converter para float
-    df['Area_Privativa'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área privativa').astype(float)
-
-    # Extrair a área do terreno e converter para float
-    df['Area_Terreno'] = df['Descricao'].str.extract(r', (\d+\.\d+) de área do terreno').astype(float)
-
-    # Converter Preco e Valor_Avaliacao para float
-    # Certifique-se de que as colunas estão no formato string antes de usar o acessor .str
-    df['Preco'] = df['Preco'].astype(str)
-    df['Valor_Avaliacao'] = df['Valor_Avaliacao'].astype(str)
-    df['Preco'] = df['Preco'].str.replace('.', '').str.replace(',', '.').astype(float)
-    df['Valor_Avaliacao'] = df['Valor_Avaliacao'].str.replace('.', '').str.replace(',', '.').astype(float)
+    # Converter Preco e Valor_Avaliacao para float (normalmente já convertidos na leitura do CSV)
+    df['Preco'] = converte_moeda(df['Preco'])
+    df['Valor_Avaliacao'] = converte_moeda(df['Valor_Avaliacao'])
 
     # Garante que o valor do desconto esteja correto
     df['Desconto'] = (df['Valor_Avaliacao'] - df['Preco']) / df['Valor_Avaliacao']*100
@@ -79,6 +333,14 @@ def trata_planilha(df):
     # Adiciona a data de inclusão do registro no dataframe
     df['Data_Inclusao'] = datetime.now().strftime('%Y-%m-%d')
 
+    # Armazena as colunas com poucos valores distintos como category
+    # A string vazia é sempre incluída entre as categorias, pois é usada no lugar de valores ausentes (fillna(""))
+    for coluna in COLUNAS_CATEGORICAS:
+        categorias = df[coluna].fillna("").astype('category')
+        if "" not in categorias.cat.categories:
+            categorias = categorias.cat.add_categories("")
+        df[coluna] = categorias
+
     return df
 
 
@@ -96,14 +358,96 @@ def formata_moeda(value):
     return "R$ " + formatted_value
 
 
+def converte_numericos(df):
+    """
+    Função para converter as colunas numéricas de um DataFrame de imóveis para float.
+    Os valores lidos do Sheets podem vir como texto, com vírgula como separador decimal.
+    Colunas que já são numéricas são mantidas como estão, e apenas os valores que não são números válidos passam pela conversão via texto.
+    """
+
+    df = df.copy()
+    for coluna in COLUNAS_NUMERICAS:
+        if coluna in df.columns and not pd.api.types.is_numeric_dtype(df[coluna]):
+            serie = df[coluna]
+            valores = pd.to_numeric(serie, errors='coerce')
+            pendentes = valores.isna() & serie.notna()
+            if pendentes.any():
+                valores[pendentes] = pd.to_numeric(serie[pendentes].astype(str).str.replace(',', '.'), errors='coerce')
+            df[coluna] = valores.astype(float)
+    return df
+
+
+def organiza_colunas(df):
+    """
+    Função para organizar um DataFrame de imóveis nas colunas da planilha tratada (COLUNAS, na ordem em que são gravadas),
+    com as colunas ausentes vazias e as colunas numéricas convertidas para float.
+    """
+    return converte_numericos(df.reindex(columns=COLUNAS))
+
+
+def prepara_dados_uf(df):
+    """
+    Função para calcular os dados exibidos na página de um estado a partir de um DataFrame de imóveis.
+    Retorna o dicionário utilizado pelo template imoveis_uf.html.
+    """
+
+    df = converte_numericos(df)
+
+    # Filtrar imóveis com Preco >= 100
+    # Exclui imóveis com erro de preenchimento no campo Preço
+    df_filtrado = df[df['Preco'] >= 100]
+
+    # Estado sem imóveis (ou apenas com preços inválidos): não há imóveis extremos nem modalidades a exibir
+    if df_filtrado.empty:
+        return {
+            'mais_baratos': [],
+            'mais_barato_valor': '-',
+            'mais_caro_valor': '-',
+            'mais_caros': [],
+            'mais_descontado': None,
+            'quantidade_imoveis': len(df),
+            'quantidade_desconto': 0,
+            'preco_medio': '-',
+            'modalidade': '-',
+            'venda_direta': '-',
+            'tipo_comum': '-'
+        }
+
+    # Obtém a quantidade de imóveis com desconto maior que zero
+    # Ignora casos em que o desconto é zero ou negativo
+    quantidade_desconto = df_filtrado[df_filtrado['Desconto'] > 0].shape[0]
+
+    # Porcentagem de venda direta
+    # Soma as modalidades de Venda Direta Online e Venda Online
+    venda_direta = df_filtrado['Modalidade_venda'].str.contains('Venda Direta Online|Venda Online').sum()/len(df_filtrado)*100
+
+    # Estrutura de dados para exibição
+    dados = {
+        'mais_baratos': df_filtrado.nsmallest(3, 'Preco').to_dict('records'),
+        'mais_barato_valor': formata_moeda(df_filtrado['Preco'].min()),
+        'mais_caro_valor': formata_moeda(df_filtrado['Preco'].max()),
+        'mais_caros': df_filtrado.nlargest(3, 'Preco').to_dict('records'),
+        'mais_descontado': next(iter(df_filtrado.dropna(subset=['Desconto']).nlargest(1, 'Desconto').to_dict('records')), None),
+        'quantidade_imoveis': len(df),
+        'quantidade_desconto': quantidade_desconto,
+        'preco_medio': formata_moeda(df_filtrado['Preco'].mean().round(2)),
+        'modalidade': df_filtrado['Modalidade_venda'].mode()[0],
+        'venda_direta': f'{venda_direta:.2f}%',
+        'tipo_comum': df_filtrado['Tipo_Imovel'].mode()[0]
+    }
+
+    return dados
+
+
 def calcula_stats(df):
     """
     Função para calcular estatísticas a partir de um DataFrame de imóveis.
     Retorna um dicionário com as estatísticas calculadas.
     Desenhada para ser utilizada em conjunto com a função adiciona_stats, aproveitando o processamento periódico das planilhas.
-    A ser implementado em versões futuras.
     """
 
+    df = converte_numericos(df)
+
     stats = {
         'mais_baratos': df.nsmallest(3, 'Preco').to_dict('records'),
         'mais_caros': df.nlargest(3, 'Preco').to_dict('records'),
@@ -114,9 +458,9 @@ def calcula_stats(df):
     }
     
     # Calcula cidade com maior média de desconto
-    cidade_desconto = df.groupby('Cidade')['Desconto'].mean().idxmax()
-    stats['cidade_maior_media_desconto'] = cidade_desconto
-    stats['valor_media_desconto'] = df.groupby('Cidade')['Desconto'].mean().max()
+    media_desconto = df.groupby('Cidade', observed=True)['Desconto'].mean()
+    stats['cidade_maior_media_desconto'] = media_desconto.idxmax()
+    stats['valor_media_desconto'] = media_desconto.max()
     
     # Ranking de modalidades de venda por contagem (apenas para o cenário nacional)
     if 'Modalidade_venda' in df.columns:
@@ -125,6 +469,92 @@ def calcula_stats(df):
     return stats
 
 
+def identificador(texto):
+    """
+    Função para gerar o identificador de um município ou bairro usado nas URLs (ex.: 'São José dos Campos' -> 'sao-jose-dos-campos').
+    """
+    return re.sub(r'[^a-z0-9]+', '-', normaliza_texto(texto).lower()).strip('-')
+
+
+def _agrega(df, chaves, quantidade_mais_baratos):
+    """
+    Calcula, em uma única passagem de groupby, os agregados dos grupos definidos pelas colunas chaves.
+    Retorna um dicionário {tupla com a chave do grupo: agregados}.
+    """
+
+    grupos = df.groupby(chaves, sort=False, observed=True)
+    resumo = pd.DataFrame({
+        'quantidade': grupos.size(),
+        'preco_medio': grupos['_Preco_valido'].mean(),
+        'preco_mediano': grupos['_Preco_valido'].median(),
+        'desconto_medio': grupos['_Desconto_valido'].mean(),
+        'maior_desconto': grupos['_Desconto_valido'].max(),
+    })
+    resumo = resumo.astype(object).where(resumo.notna(), None)
+
+    # Nome original mais frequente de cada grupo (o identificador agrupa grafias diferentes do mesmo nome)
+    coluna_nome = {'_cidade': 'Cidade', '_bairro': 'Bairro'}[chaves[-1]]
+    nomes = df.groupby(chaves + [coluna_nome], sort=False, observed=True).size().sort_values(ascending=False, kind='stable')
+    nomes_grupos = {}
+    for chave in nomes.index:
+        nomes_grupos.setdefault(chave[:-1], str(chave[-1]))
+
+    # Quantidade de imóveis por modalidade de venda
+    modalidades = df.groupby(chaves + ['Modalidade_venda'], sort=False, observed=True).size()
+    mix_modalidades = {}
+    for chave, contagem in modalidades.items():
+        mix_modalidades.setdefault(chave[:-1], {})[str(chave[-1])] = int(contagem)
+
+    # Imóveis mais baratos de cada grupo: uma ordenação pelo preço e as primeiras linhas de cada grupo,
+    # convertidas em registros de uma única vez e distribuídas entre os grupos
+    colunas_resumo = [coluna for coluna in COLUNAS_RESUMO if coluna in df.columns]
+    validos = df[df['_Preco_valido'].notna()].sort_values('_Preco_valido', kind='stable')
+    topo = validos.groupby(chaves, sort=False, observed=True).head(quantidade_mais_baratos)
+    registros = topo[colunas_resumo].astype(object).where(topo[colunas_resumo].notna(), None).to_dict('records')
+    mais_baratos = {}
+    for chave, registro in zip(topo[chaves].itertuples(index=False, name=None), registros):
+        mais_baratos.setdefault(chave, []).append(registro)
+
+    agregados = {}
+    for chave, linha in zip(resumo.index, resumo.to_dict('records')):
+        chave = chave if isinstance(chave, tuple) else (chave,)
+        agregados[chave] = {
+            'nome': nomes_grupos.get(chave, chave[-1]),
+            **linha,
+            'mais_baratos': mais_baratos.get(chave, []),
+            'modalidades': mix_modalidades.get(chave, {}),
+        }
+    return agregados
+
+
+def calcula_grupos(df, quantidade_mais_baratos=QUANTIDADE_MAIS_BARATOS):
+    """
+    Função para calcular os agregados por município e por bairro de um DataFrame de imóveis:
+    quantidade, preço médio e mediano, desconto médio e máximo, imóveis mais baratos e quantidade por modalidade de venda.
+    Generaliza o cálculo da média de desconto por município de calcula_stats.
+    Assim como em prepara_dados_uf, os preços abaixo de R$ 100 (erros de preenchimento) são ignorados nas estatísticas de preço.
+    Retorna um dicionário indexado pelo identificador do município, com os bairros em 'bairros', indexados da mesma forma.
+    """
+
+    df = converte_numericos(df)
+    if df.empty:
+        return {}
+
+    # Identificadores calculados uma única vez para cada nome distinto
+    for coluna, chave in [('Cidade', '_cidade'), ('Bairro', '_bairro')]:
+        nomes = df[coluna].astype(str)
+        df[chave] = nomes.map({nome: identificador(nome) for nome in nomes.unique()})
+    valido = df['Preco'] >= 100
+    df['_Preco_valido'] = df['Preco'].where(valido)
+    df['_Desconto_valido'] = df['Desconto'].where(valido)
+
+    cidades = {cidade: agregados for (cidade,), agregados in _agrega(df, ['_cidade'], quantidade_mais_baratos).items()}
+    for (cidade, bairro), agregados in _agrega(df, ['_cidade', '_bairro'], quantidade_mais_baratos).items():
+        cidades[cidade].setdefault('bairros', {})[bairro] = agregados
+
+    return cidades
+
+
 def adiciona_stats(planilha, estatisticas, UF="Nacional"):
     """
     Função para adicionar estatísticas a uma planilha do Google Sheets.
@@ -0,0 +1,179 @@
+"""
+Publicação dos imóveis consolidados em arquivos para download, gerados pela atualização periódica (caixa/main.py)
+e servidos pela aplicação Flask na rota /dados/<arquivo> (com suporte a Range e ETag):
+    caixa/dados/publicacao/csv/imoveis_<UF>.csv.gz: CSV compactado (gzip) de cada estado
+    caixa/dados/publicacao/csv/imoveis_BR.csv.gz: CSV nacional, a concatenação dos CSVs dos estados
+    caixa/dados/publicacao/parquet/UF=<UF>/imoveis.parquet: Parquet particionado por estado (apenas com pyarrow ou fastparquet instalado)
+    caixa/dados/publicacao/manifesto.json: quantidade de linhas, tamanho e hash SHA-256 de cada arquivo
+Os arquivos são gravados de forma determinística (sem data no cabeçalho do gzip): dados iguais geram os mesmos bytes,
+e um arquivo cujo hash não mudou não é substituído, preservando a data de modificação e o cache dos clientes.
+"""
+
+import os
+import io
+import gzip
+import hashlib
+import threading
+import importlib.util
+from datetime import datetime
+
+from .snapshot import DIRETORIO_DADOS, _grava_json, _le_json
+
+
+DIRETORIO_PUBLICACAO = os.path.join(DIRETORIO_DADOS, "publicacao")
+ARQUIVO_MANIFESTO = "manifesto.json"
+UF_ARQUIVO_NACIONAL = "BR"
+TIPOS_ARQUIVO = {'csv.gz': "application/gzip", 'parquet': "application/vnd.apache.parquet"}
+TAMANHO_BLOCO = 1024 * 1024
+
+# O manifesto é atualizado pelos workers da atualização, um estado de cada vez
+_trava_manifesto = threading.Lock()
+_cache_manifesto = {}
+
+
+def caminho_csv(UF):
+    return os.path.join("csv", f"imoveis_{UF}.csv.gz")
+
+
+def caminho_parquet(UF):
+    return os.path.join("parquet", f"UF={UF}", "imoveis.parquet")
+
+
+def motor_parquet():
+    """
+    Função para identificar a biblioteca disponível para gravar arquivos Parquet (pyarrow ou fastparquet).
+    Retorna None se nenhuma estiver instalada.
+    """
+    for motor in ('pyarrow', 'fastparquet'):
+        if importlib.util.find_spec(motor) is not None:
+            return motor
+    return None
+
+
+def carrega_manifesto():
+    """
+    Função para carregar o manifesto dos arquivos publicados, reaproveitando a versão em cache enquanto não for modificado.
+    """
+    return _le_json(os.path.join(DIRETORIO_PUBLICACAO, ARQUIVO_MANIFESTO), _cache_manifesto, ARQUIVO_MANIFESTO)
+
+
+def _hash_arquivo(caminho):
+    conteudo = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            conteudo.update(bloco)
+    return conteudo.hexdigest()
+
+
+def _publica(caminho_relativo, grava, UF, linhas):
+    """
+    Grava um arquivo em um caminho temporário (grava recebe o caminho) e o publica de forma atômica, registrando-o no manifesto.
+    Se o conteúdo for igual ao do arquivo já publicado, o arquivo anterior é mantido.
+    """
+
+    caminho = os.path.join(DIRETORIO_PUBLICACAO, caminho_relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_temporario = caminho + ".tmp"
+    grava(caminho_temporario)
+    hash_conteudo = _hash_arquivo(caminho_temporario)
+
+    with _trava_manifesto:
+        # Lê o manifesto do disco, sem o cache: gravações sucessivas podem ter a mesma data de modificação
+        _cache_manifesto.clear()
+        manifesto = carrega_manifesto() or {'arquivos': {}}
+        chave = caminho_relativo.replace(os.sep, "/")
+        anterior = manifesto['arquivos'].get(chave)
+        if anterior is not None and anterior['sha256'] == hash_conteudo and os.path.exists(caminho):
+            os.remove(caminho_temporario)
+            return anterior
+        os.replace(caminho_temporario, caminho)
+        formato = 'parquet' if chave.endswith('.parquet') else 'csv.gz'
+        manifesto['arquivos'][chave] = {
+            'UF': UF,
+            'formato': formato,
+            'tipo': TIPOS_ARQUIVO[formato],
+            'linhas': linhas,
+            'bytes': os.path.getsize(caminho),
+            'sha256': hash_conteudo,
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        manifesto['gerado_em'] = datetime.now().isoformat(timespec='seconds')
+        _grava_json(os.path.join(DIRETORIO_PUBLICACAO, ARQUIVO_MANIFESTO), manifesto)
+        return manifesto['arquivos'][chave]
+
+
+def _prepara(df):
+    """
+    Organiza as colunas de um DataFrame de imóveis para publicação: colunas numéricas como float e as demais como texto.
+    """
+
+    from .planilhas import COLUNAS, COLUNAS_NUMERICAS, organiza_colunas
+
+    df = organiza_colunas(df)
+    for coluna in COLUNAS:
+        if coluna not in COLUNAS_NUMERICAS:
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), "").astype(str)
+    return df.reset_index(drop=True)
+
+
+def _grava_gzip(caminho, escreve):
+    """
+    Abre um arquivo gzip sem data nem nome no cabeçalho, para que o mesmo conteúdo gere sempre os mesmos bytes.
+    """
+    with open(caminho, "wb") as f, gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0, compresslevel=6) as arquivo_gzip:
+        escreve(arquivo_gzip)
+
+
+def publica_estado(UF, df):
+    """
+    Função para publicar os imóveis de um estado em CSV compactado e, se houver biblioteca disponível, em Parquet.
+    Retorna as entradas do manifesto dos arquivos publicados.
+    """
+
+    df = _prepara(df)
+
+    def grava_csv(caminho):
+        def escreve(arquivo_gzip):
+            with io.TextIOWrapper(arquivo_gzip, encoding="utf-8", newline="") as texto:
+                df.to_csv(texto, index=False, lineterminator="\n")
+        _grava_gzip(caminho, escreve)
+
+    publicados = [_publica(caminho_csv(UF), grava_csv, UF, len(df))]
+
+    motor = motor_parquet()
+    if motor is not None:
+        # Particionamento no estilo Hive: o estado fica no caminho do arquivo, e não como coluna
+        publicados.append(_publica(caminho_parquet(UF), lambda caminho: df.drop(columns=['UF']).to_parquet(
+            caminho, engine=motor, index=False, compression='snappy'), UF, len(df)))
+    print(f"Arquivos para download do estado {UF} publicados ({len(df)} imóveis).")
+    return publicados
+
+
+def publica_nacional():
+    """
+    Função para publicar o CSV nacional, concatenando os CSVs já publicados dos estados (sem recalcular os dados).
+    Retorna a entrada do manifesto do arquivo nacional, ou None se nenhum estado tiver sido publicado.
+    """
+
+    manifesto = carrega_manifesto() or {'arquivos': {}}
+    estados = sorted((entrada['UF'], chave) for chave, entrada in manifesto['arquivos'].items()
+                     if entrada['formato'] == 'csv.gz' and entrada['UF'] != UF_ARQUIVO_NACIONAL)
+    if not estados:
+        print("Sem arquivos dos estados para publicar o arquivo nacional.")
+        return None
+    linhas = sum(manifesto['arquivos'][chave]['linhas'] for _, chave in estados)
+
+    def grava_csv(caminho):
+        def escreve(arquivo_gzip):
+            for posicao, (_, chave) in enumerate(estados):
+                with gzip.open(os.path.join(DIRETORIO_PUBLICACAO, chave), "rb") as origem:
+                    cabecalho = origem.readline()
+                    if posicao == 0:
+                        arquivo_gzip.write(cabecalho)
+                    for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b""):
+                        arquivo_gzip.write(bloco)
+        _grava_gzip(caminho, escreve)
+
+    entrada = _publica(caminho_csv(UF_ARQUIVO_NACIONAL), grava_csv, UF_ARQUIVO_NACIONAL, linhas)
+    print(f"Arquivo nacional para download publicado ({linhas} imóveis de {len(estados)} estados).")
+    return entrada
@@ -0,0 +1,230 @@
+"""
+Cliente do Google Sheets com controle de cota, cache de abas e escrita em lote.
+Substitui as pausas fixas entre chamadas por limitadores de taxa ajustados às cotas de leitura e escrita da API,
+com novas tentativas e espera exponencial em caso de erro 429 (cota excedida).
+"""
+
+import os
+import time
+import random
+from bisect import bisect_left
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from .limitador import LimitadorTaxa
+
+
+# Cotas da API do Sheets (requisições por minuto, por usuário)
+LEITURAS_POR_MINUTO = int(os.environ.get("SHEETS_LEITURAS_POR_MINUTO", 60))
+ESCRITAS_POR_MINUTO = int(os.environ.get("SHEETS_ESCRITAS_POR_MINUTO", 60))
+# Novas tentativas em caso de erro temporário da API
+MAX_TENTATIVAS = 6
+CODIGOS_TEMPORARIOS = {429, 500, 502, 503}
+# Número máximo de células enviadas em uma única requisição de escrita
+MAX_CELULAS_POR_LOTE = 100000
+
+
+class ClienteSheets:
+    """
+    Cliente do Google Sheets que acumula as escritas de vários estados e as envia em poucas requisições.
+    As escritas são apenas registradas por adiciona_linhas(), remove_linhas(), atualiza_celulas() e substitui_valores()
+    e enviadas por envia().
+    """
+
+    def __init__(self, planilha, leituras_por_minuto=LEITURAS_POR_MINUTO, escritas_por_minuto=ESCRITAS_POR_MINUTO):
+        self.planilha = planilha
+        self.limitador_leitura = LimitadorTaxa(leituras_por_minuto)
+        self.limitador_escrita = LimitadorTaxa(escritas_por_minuto)
+        self.chamadas = {'leitura': 0, 'escrita': 0}
+        self._abas = None
+        # Próxima linha livre e número de linhas da grade de cada aba
+        self._proxima_linha = {}
+        self._linhas_grade = {}
+        # Escritas pendentes
+        self._substituicoes = {}
+        self._adicoes = {}
+        self._remocoes = {}
+        self._atualizacoes = {}
+
+    def _executa(self, tipo, funcao, *args, **kwargs):
+        """
+        Executa uma chamada à API respeitando o limitador do tipo informado ('leitura' ou 'escrita').
+        Erros temporários (como 429) são repetidos com espera exponencial.
+        """
+        limitador = self.limitador_leitura if tipo == 'leitura' else self.limitador_escrita
+        for tentativa in range(MAX_TENTATIVAS):
+            limitador.aguarda()
+            self.chamadas[tipo] += 1
+            try:
+                return funcao(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if e.code not in CODIGOS_TEMPORARIOS or tentativa == MAX_TENTATIVAS - 1:
+                    raise
+                espera = 2 ** tentativa + random.random()
+                print(f"Erro {e.code} na API do Sheets, nova tentativa em {espera:.1f} s...")
+                time.sleep(espera)
+
+    def aba(self, titulo):
+        """
+        Retorna a aba com o título informado.
+        Todas as abas são obtidas em uma única consulta de metadados e mantidas em cache.
+        """
+        if self._abas is None:
+            abas = self._executa('leitura', self.planilha.worksheets)
+            self._abas = {aba.title: aba for aba in abas}
+            self._linhas_grade = {aba.title: aba.row_count for aba in abas}
+        return self._abas[titulo]
+
+    def le_registros(self, titulo):
+        """
+        Lê os registros de uma aba (equivalente a get_all_records) e memoriza a próxima linha livre.
+        """
+        registros = self._executa('leitura', self.aba(titulo).get_all_records)
+        self._proxima_linha[titulo] = len(registros) + 2
+        return registros
+
+    def proxima_linha(self, titulo):
+        """
+        Retorna a próxima linha livre de uma aba, consultando a primeira coluna caso a aba ainda não tenha sido lida.
+        """
+        if titulo not in self._proxima_linha:
+            valores = self._executa('leitura', self.aba(titulo).col_values, 1)
+            self._proxima_linha[titulo] = len(valores) + 1
+        return self._proxima_linha[titulo]
+
+    def substitui_valores(self, titulo, linhas):
+        """
+        Registra a substituição de todo o conteúdo de uma aba pelas linhas informadas.
+        """
+        self.aba(titulo)
+        self._substituicoes[titulo] = linhas
+        self._adicoes.pop(titulo, None)
+        self._remocoes.pop(titulo, None)
+        self._atualizacoes.pop(titulo, None)
+        self._proxima_linha[titulo] = len(linhas) + 1
+
+    def adiciona_linhas(self, titulo, linhas):
+        """
+        Registra a adição de linhas ao final de uma aba.
+        """
+        if linhas:
+            self._adicoes.setdefault(titulo, []).extend(linhas)
+
+    def remove_linhas(self, titulo, numeros_linhas):
+        """
+        Registra a remoção de linhas de uma aba, identificadas pelo número da linha na planilha (a partir de 1).
+        Os números se referem ao conteúdo lido, antes de qualquer remoção pendente.
+        """
+        if numeros_linhas:
+            self.aba(titulo)
+            self._remocoes.setdefault(titulo, set()).update(numeros_linhas)
+
+    def atualiza_celulas(self, titulo, linha, coluna, valores):
+        """
+        Registra a atualização de células consecutivas de uma linha, a partir da coluna informada (ambas a partir de 1).
+        Assim como em remove_linhas(), o número da linha se refere ao conteúdo lido, antes das remoções pendentes.
+        """
+        self._atualizacoes.setdefault(titulo, []).append((linha, coluna, valores))
+
+    def pendente(self):
+        return bool(self._substituicoes or self._adicoes or self._remocoes or self._atualizacoes)
+
+    def _requisicoes_remocao(self, titulo):
+        """
+        Gera as requisições deleteDimension de uma aba, agrupando linhas consecutivas em um único intervalo.
+        As requisições são ordenadas de baixo para cima, para que uma remoção não desloque as linhas das seguintes.
+        """
+        requisicoes = []
+        linhas = sorted(self._remocoes[titulo], reverse=True)
+        fim = inicio = linhas[0]
+        for linha in linhas[1:] + [None]:
+            if linha is not None and linha == inicio - 1:
+                inicio = linha
+                continue
+            requisicoes.append({'deleteDimension': {'range': {
+                'sheetId': self.aba(titulo).id, 'dimension': 'ROWS', 'startIndex': inicio - 1, 'endIndex': fim
+            }}})
+            fim = inicio = linha
+        return requisicoes
+
+    def _intervalos(self, titulo, linha_inicial, linhas):
+        """
+        Divide as linhas em intervalos que respeitam o limite de células por requisição.
+        """
+        largura = max((len(linha) for linha in linhas), default=1) or 1
+        passo = max(1, MAX_CELULAS_POR_LOTE // largura)
+        for inicio in range(0, len(linhas), passo):
+            yield {'range': f"'{titulo}'!A{linha_inicial + inicio}", 'values': linhas[inicio:inicio + passo]}
+
+    def envia(self):
+        """
+        Envia todas as escritas pendentes:
+        1. Remove as linhas excluídas e amplia a grade das abas que não comportam as novas linhas (uma requisição batch_update)
+        2. Limpa as abas que serão substituídas (uma requisição values_batch_clear)
+        3. Grava todos os valores, de todas as abas, em lotes de values_batch_update
+        """
+        if not self.pendente():
+            return
+
+        # Remove as linhas excluídas, de baixo para cima
+        requisicoes = []
+        for titulo, linhas in self._remocoes.items():
+            requisicoes.extend(self._requisicoes_remocao(titulo))
+            self._proxima_linha[titulo] = self.proxima_linha(titulo) - len(linhas)
+            self._linhas_grade[titulo] -= len(linhas)
+
+        # Atualizações de células, com as linhas deslocadas pelas remoções feitas acima delas
+        intervalos = []
+        for titulo, atualizacoes in self._atualizacoes.items():
+            removidas = sorted(self._remocoes.get(titulo, ()))
+            for linha, coluna, valores in atualizacoes:
+                if linha in self._remocoes.get(titulo, ()):
+                    continue
+                linha_final = linha - bisect_left(removidas, linha)
+                intervalos.append({'range': f"'{titulo}'!{rowcol_to_a1(linha_final, coluna)}", 'values': [valores]})
+
+        for titulo, linhas in self._substituicoes.items():
+            intervalos.extend(self._intervalos(titulo, 1, linhas))
+        for titulo, linhas in self._adicoes.items():
+            linha_inicial = self.proxima_linha(titulo)
+            intervalos.extend(self._intervalos(titulo, linha_inicial, linhas))
+            self._proxima_linha[titulo] = linha_inicial + len(linhas)
+
+        # Amplia a grade das abas, se necessário
+        for titulo in set(self._substituicoes) | set(self._adicoes):
+            faltantes = self._proxima_linha[titulo] - 1 - self._linhas_grade[titulo]
+            if faltantes > 0:
+                requisicoes.append({'appendDimension': {
+                    'sheetId': self.aba(titulo).id, 'dimension': 'ROWS', 'length': faltantes
+                }})
+                self._linhas_grade[titulo] += faltantes
+        if requisicoes:
+            self._executa('escrita', self.planilha.batch_update, {'requests': requisicoes})
+
+        # Limpa as abas que serão substituídas
+        if self._substituicoes:
+            intervalos_limpeza = [f"'{titulo}'" for titulo in self._substituicoes]
+            self._executa('escrita', self.planilha.values_batch_clear, body={'ranges': intervalos_limpeza})
+
+        # Grava os valores em lotes
+        lote, celulas = [], 0
+        for intervalo in intervalos:
+            tamanho = sum(len(linha) for linha in intervalo['values'])
+            if lote and celulas + tamanho > MAX_CELULAS_POR_LOTE:
+                self._grava_lote(lote)
+                lote, celulas = [], 0
+            lote.append(intervalo)
+            celulas += tamanho
+        if lote:
+            self._grava_lote(lote)
+
+        abas_alteradas = sorted(set(self._substituicoes) | set(self._adicoes) | set(self._remocoes) | set(self._atualizacoes))
+        print(f"Escritas enviadas ao Sheets: {len(intervalos)} intervalos e {sum(map(len, self._remocoes.values()))} linhas removidas em {', '.join(abas_alteradas)}.")
+        self._substituicoes = {}
+        self._adicoes = {}
+        self._remocoes = {}
+        self._atualizacoes = {}
+
+    def _grava_lote(self, lote):
+        self._executa('escrita', self.planilha.values_batch_update, body={'valueInputOption': 'RAW', 'data': lote})
@@ -0,0 +1,391 @@
+"""
+Execução da atualização periódica (caixa/main.py): uma fila de estados processados por um pool limitado de workers,
+com novas tentativas (espera exponencial) e um diário persistente do progresso (caixa/dados/sincronizacao.json).
+Cada estado é processado de forma independente: a falha de um estado é registrada no diário sem interromper os demais.
+O diário registra os estados concluídos da execução em andamento e a versão dos seus dados; se a execução for interrompida,
+a próxima retoma a mesma execução e processa apenas os estados não concluídos.
+Um estado só é considerado concluído depois que as suas escritas foram efetivadas: imediatamente no SQLite,
+e somente após o envio em lote (finaliza) quando o Google Sheets é usado como armazenamento ou exportação.
+Um estado interrompido antes da conclusão é refeito: com o Sheets como armazenamento, as diferenças são comparadas novamente
+(o histórico ignora os eventos já registrados); com a exportação, o Sheets é comparado diretamente com o SQLite.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .planilhas import (SEM_ALTERACAO, baixa_planilha, cria_sessao, trata_planilha, prepara_dados_uf, calcula_stats,
+                        calcula_grupos, converte_numericos, salva_metadados_downloads)
+from .snapshot import (DIRETORIO_DADOS, salva_snapshot, carrega_snapshot, salva_grupos, caminho_grupos, salva_parcial,
+                       caminho_parcial)
+from .armazenamento import ArmazenamentoSheets
+from .diferencas import compara_registros
+from .geoloc import GEOCODIFICACOES_POR_MINUTO, geocodifica_df
+from .limitador import LimitadorTaxa
+from .mapa import salva_indice_pontos, caminho_indice_pontos
+from .nacional import calcula_parcial
+from .tabela import salva_tabela, caminho_tabela
+from .publicacao import DIRETORIO_PUBLICACAO, caminho_csv, publica_estado
+from .metricas import etapa
+
+
+ARQUIVO_DIARIO = os.path.join(DIRETORIO_DADOS, "sincronizacao.json")
+# Quantidade de estados processados simultaneamente
+MAX_ESTADOS = int(os.environ.get("MAX_ESTADOS", 4))
+# Tentativas de processamento de cada estado, com espera exponencial entre elas (em segundos: 2, 4, 8...)
+MAX_TENTATIVAS = int(os.environ.get("TENTATIVAS_ESTADO", 3))
+ESPERA_INICIAL = 2
+
+# Situações de um estado no diário
+INICIADO = "iniciado"
+PROCESSADO = "processado"  # processado, com escritas em lote ainda não enviadas
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+
+
+class FalhaDownload(RuntimeError):
+    """
+    Indica que a planilha de um estado não pôde ser baixada ou analisada.
+    """
+
+
+class DiarioSincronizacao:
+    """
+    Diário persistente da execução em andamento, gravado de forma atômica a cada alteração:
+        {'execucao', 'iniciada_em', 'concluida_em', 'fila', 'estados': {UF: {'situacao', 'atualizado_em', 'versao', ...}}}
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or ARQUIVO_DIARIO
+        self.trava = threading.Lock()
+        try:
+            with open(self.caminho, encoding="utf-8") as f:
+                self.conteudo = json.load(f)
+        except (OSError, ValueError):
+            self.conteudo = None
+
+    def inicia(self, estados, reinicia=False):
+        """
+        Retoma a execução interrompida com a mesma fila de estados, se houver, ou inicia uma nova.
+        Retorna os estados da fila ainda não concluídos.
+        """
+        estados = list(estados)
+        if (self.conteudo is not None and not self.conteudo.get('concluida_em') and not reinicia
+                and self.conteudo.get('fila') == estados):
+            concluidos = self.concluidos()
+            print(f"Retomando a execução {self.conteudo['execucao']}: estados já concluídos: {', '.join(concluidos) or 'nenhum'}.")
+            return [UF for UF in estados if UF not in concluidos]
+        agora = datetime.now()
+        self.conteudo = {'execucao': agora.strftime("%Y%m%dT%H%M%S"), 'iniciada_em': agora.isoformat(timespec='seconds'),
+                         'concluida_em': None, 'fila': estados, 'estados': {}}
+        self._grava()
+        return estados
+
+    def situacao(self, UF):
+        return self.conteudo['estados'].get(UF, {}).get('situacao')
+
+    def concluidos(self):
+        return [UF for UF, dados in self.conteudo['estados'].items() if dados.get('situacao') == CONCLUIDO]
+
+    def registra(self, UF, situacao, **dados):
+        with self.trava:
+            registro = self.conteudo['estados'].setdefault(UF, {})
+            registro.update(dados, situacao=situacao, atualizado_em=datetime.now().isoformat(timespec='seconds'))
+            self._grava()
+
+    def conclui(self):
+        """
+        Encerra a execução quando todos os estados da fila foram concluídos. Retorna True se a execução foi encerrada.
+        """
+        if not set(self.conteudo['fila']) <= set(self.concluidos()):
+            return False
+        self.conteudo['concluida_em'] = datetime.now().isoformat(timespec='seconds')
+        self._grava()
+        return True
+
+    def _grava(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+        caminho_temporario = self.caminho + ".tmp"
+        with open(caminho_temporario, "w", encoding="utf-8") as f:
+            json.dump(self.conteudo, f, indent=2)
+        os.replace(caminho_temporario, self.caminho)
+
+
+def executa_com_tentativas(funcao, descricao, tentativas=MAX_TENTATIVAS, espera_inicial=ESPERA_INICIAL):
+    """
+    Executa uma função, repetindo-a em caso de erro com espera exponencial (e uma variação aleatória).
+    A função recebe o número da tentativa (a partir de 1).
+    Retorna o resultado e a quantidade de tentativas; o erro da última tentativa é propagado.
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao(tentativa), tentativa
+        except Exception as e:
+            if tentativa == tentativas:
+                raise
+            espera = espera_inicial * 2 ** (tentativa - 1) + random.random()
+            print(f"Erro em {descricao} ({type(e).__name__}: {e}), nova tentativa em {espera:.1f} s...")
+            time.sleep(espera)
+
+
+class Sincronizacao:
+    """
+    Atualização dos estados a partir das planilhas da Caixa.
+    Com simulacao=True, apenas baixa, trata e compara as planilhas, informando as diferenças sem gravar nada
+    (armazenamento, histórico, snapshots, metadados de download e diário).
+    """
+
+    def __init__(self, armazenamento, exportacao=None, historico=None, cache_geocodificacao=None,
+                 metadados_downloads=None, diario=None, simulacao=False):
+        self.armazenamento = armazenamento
+        self.exportacao = exportacao
+        self.historico = historico
+        self.cache_geocodificacao = cache_geocodificacao
+        self.metadados_downloads = metadados_downloads if metadados_downloads is not None else {}
+        self.diario = diario
+        self.simulacao = simulacao
+        # O armazenamento (SQLite ou Sheets) e o histórico são acessados por um worker de cada vez
+        self.trava = threading.Lock()
+        # Limite de geocodificações por minuto compartilhado entre os estados processados simultaneamente
+        self.limitador_geocodificacao = LimitadorTaxa(GEOCODIFICACOES_POR_MINUTO)
+        # Com o Sheets, as escritas de todos os estados são acumuladas e enviadas em lote ao final
+        self.escritas_em_lote = any(isinstance(backend, ArmazenamentoSheets) for backend in (armazenamento, exportacao))
+        # Estados com estatísticas recalculadas nesta execução e estados aguardando o envio das escritas
+        self.estados_atualizados = []
+        self._pendentes = {}
+        # Estados com as diferenças já gravadas nesta execução, reaproveitadas em uma nova tentativa
+        self._gravados = {}
+
+    def chamadas_sheets(self):
+        """
+        Retorna o total de chamadas à API do Sheets feitas até o momento (o armazenamento SQLite não faz chamadas).
+        """
+        return sum(sum(backend.cliente.chamadas.values()) for backend in (self.armazenamento, self.exportacao)
+                   if isinstance(backend, ArmazenamentoSheets))
+
+    def salva_stats(self, UF, df):
+        """
+        Calcula as estatísticas de um estado e salva os arquivos consumidos pela aplicação Flask.
+        Retorna a versão do snapshot.
+        """
+        # As colunas numéricas são convertidas uma única vez; as funções abaixo recebem o DataFrame já convertido
+        df = converte_numericos(df)
+        # O agregado parcial é salvo mesmo sem registros, para que o estado deixe de contar nas estatísticas nacionais
+        salva_parcial(UF, calcula_parcial(df))
+        # O snapshot binário também, para que os workers da aplicação não leiam imóveis que já saíram da planilha
+        salva_tabela(UF, df)
+        # E os arquivos para download (CSV e Parquet), para que não contenham imóveis que já saíram da planilha
+        publica_estado(UF, df)
+        self.estados_atualizados.append(UF)
+        # Os demais arquivos também são salvos para um estado sem registros, substituindo os da última execução com imóveis
+        if df.empty:
+            print(f"Sem registros para calcular estatísticas do estado {UF}.")
+        versao = salva_snapshot(UF, prepara_dados_uf(df), calcula_stats(df) if not df.empty else None)
+        salva_grupos(UF, calcula_grupos(df))
+        salva_indice_pontos(UF, df)
+        return versao
+
+    @staticmethod
+    def snapshot_ausente(UF):
+        """
+        Verifica se o snapshot, os agregados por município, o índice do mapa, o agregado parcial, o snapshot binário
+        ou os arquivos para download de um estado ainda não foram gerados.
+        """
+        return (carrega_snapshot(UF) is None or not os.path.exists(caminho_grupos(UF))
+                or not os.path.exists(caminho_indice_pontos(UF)) or not os.path.exists(caminho_parcial(UF))
+                or not os.path.exists(caminho_tabela(UF))
+                or not os.path.exists(os.path.join(DIRETORIO_PUBLICACAO, caminho_csv(UF))))
+
+    def processa_estado(self, UF, sessao, refaz=False):
+        """
+        Baixa, trata e compara a planilha de um estado e grava as diferenças.
+        Com refaz=True (estado interrompido em uma execução anterior, ou nova tentativa), as estatísticas são recalculadas
+        mesmo sem diferenças, já que a interrupção pode ter ocorrido entre a gravação dos registros e a dos snapshots,
+        e a exportação é comparada diretamente com o armazenamento, já que as suas escritas em lote podem não ter sido enviadas.
+        Retorna um dicionário com o resumo do processamento.
+        """
+
+        # Nova tentativa de um estado cujas diferenças já foram gravadas nesta execução: as escritas acumuladas para o Sheets
+        # ainda não foram enviadas, e uma nova comparação as repetiria; apenas as estatísticas são recalculadas
+        if UF in self._gravados:
+            df_armazenado, metadados_uf, resumo = self._gravados[UF]
+            with etapa('estatisticas', UF, linhas=len(df_armazenado)):
+                resumo['versao'] = self.salva_stats(UF, df_armazenado)
+            self._registra_download(UF, metadados_uf)
+            return resumo
+
+        reconcilia = refaz and self.exportacao is not None
+        # Cópia dos metadados do último download: baixa_planilha atualiza os validadores quando o conteúdo não mudou
+        metadados_uf = dict(self.metadados_downloads.get(UF) or {})
+        df_caixa = baixa_planilha(UF, sessao, metadados_uf)
+        if df_caixa is None:
+            raise FalhaDownload(f"Não foi possível baixar a planilha do estado {UF}.")
+
+        if df_caixa is SEM_ALTERACAO:
+            print(f"Planilha do estado {UF} sem alterações desde a última execução.")
+            resumo = {'sem_alteracao': True}
+            # Gera o snapshot caso ainda não exista para o estado
+            if not self.simulacao and (refaz or self.snapshot_ausente(UF)):
+                with self.trava:
+                    df_armazenado = self.armazenamento.le_estado(UF)
+                    if reconcilia:
+                        self._reconcilia_exportacao(UF, df_armazenado)
+                resumo['versao'] = self.salva_stats(UF, df_armazenado)
+            # O servidor pode ter enviado novos validadores para o mesmo conteúdo
+            if not self.simulacao:
+                self._registra_download(UF, metadados_uf)
+            return resumo
+        metadados_uf = df_caixa.attrs.get('metadados')
+
+        # Importa os dados armazenados do estado para um dataframe
+        with etapa('leitura_armazenamento', UF) as registro, self.trava:
+            chamadas_antes = self.chamadas_sheets()
+            df_armazenado = self.armazenamento.le_estado(UF)
+            registro.update(linhas=len(df_armazenado), chamadas_sheets=self.chamadas_sheets() - chamadas_antes)
+
+        # Trata os dados da planilha, limpando e padronizando as colunas
+        with etapa('tratamento', UF, linhas=len(df_caixa)):
+            df_caixa = trata_planilha(df_caixa).fillna("")  # Substitui NaN por string vazia
+
+        # Compara os dados da planilha com os dados armazenados (a partir do ID do imóvel)
+        with etapa('comparacao', UF, linhas=len(df_caixa)) as registro:
+            diferencas = compara_registros(df_caixa, df_armazenado)
+            registro.update({chave: len(valor) for chave, valor in diferencas.items()})
+        # Registros na planilha mas não no armazenamento (Novos), no armazenamento mas não na planilha (Arquivados)
+        # e presentes em ambos, mas com preço ou desconto alterado (Alterados)
+        df_novos, df_arquivados, df_alterados = diferencas['novos'], diferencas['arquivados'], diferencas['alterados']
+        print(f"Novos registros encontrados para o estado {UF}: {len(df_novos)}")
+        print(f"Registros arquivados encontrados para o estado {UF}: {len(df_arquivados)}")
+        print(f"Registros com preço ou desconto alterado para o estado {UF}: {len(df_alterados)}")
+        resumo = {'novos': len(df_novos), 'arquivados': len(df_arquivados), 'alterados': len(df_alterados),
+                  'hash': (metadados_uf or {}).get('hash')}
+        if self.simulacao:
+            return resumo
+
+        # Busca as coordenadas geográficas dos imóveis do dataframe Novos
+        # Apenas os endereços ausentes do cache de geocodificação são enviados à API do Google Maps
+        if self.cache_geocodificacao is not None and not df_novos.empty:
+            with etapa('geocodificacao', UF, linhas=len(df_novos)) as registro:
+                df_novos = geocodifica_df(df_novos, cache=self.cache_geocodificacao, limitador=self.limitador_geocodificacao)
+                registro['chamadas_geocodificacao'] = df_novos.attrs['geocodificacoes']
+
+        # Se não houver registros em df_novos, df_arquivados nem df_alterados, não há a necessidade de atualizar o armazenamento
+        if df_novos.empty and df_arquivados.empty and df_alterados.empty:
+            print(f"Não há registros para atualizar no estado {UF}.")
+            # Gera o snapshot caso ainda não exista para o estado
+            if reconcilia:
+                with self.trava:
+                    self._reconcilia_exportacao(UF, df_armazenado)
+            if refaz or self.snapshot_ausente(UF):
+                resumo['versao'] = self.salva_stats(UF, df_armazenado)
+            self._registra_download(UF, metadados_uf)
+            return resumo
+
+        # Arquiva os registros de df_arquivados, inclui os registros de df_novos e atualiza os preços de df_alterados
+        # No Sheets, as escritas são apenas acumuladas aqui e enviadas na etapa de escrita final
+        with etapa('escrita_armazenamento', UF, linhas=len(df_novos) + len(df_arquivados) + len(df_alterados)) as registro, self.trava:
+            chamadas_antes = self.chamadas_sheets()
+            df_armazenado = self.armazenamento.atualiza_estado(UF, df_novos, df_arquivados, df_alterados)
+            # Registra as diferenças no histórico, em uma única transação por estado
+            if self.historico is not None:
+                self.historico.registra(UF, df_novos, df_arquivados, df_alterados)
+            if reconcilia:
+                self._reconcilia_exportacao(UF, df_armazenado)
+            elif self.exportacao is not None:
+                self.exportacao.atualiza_estado(UF, df_novos, df_arquivados, df_alterados)
+            self._gravados[UF] = (df_armazenado, metadados_uf, resumo)
+            registro['chamadas_sheets'] = self.chamadas_sheets() - chamadas_antes
+
+        # Calcula as estatísticas e salva o snapshot consumido pela aplicação Flask
+        with etapa('estatisticas', UF, linhas=len(df_armazenado)):
+            resumo['versao'] = self.salva_stats(UF, df_armazenado)
+        self._registra_download(UF, metadados_uf)
+
+        print(f"Dataframes atualizados para o estado {UF}.")
+        return resumo
+
+    def _reconcilia_exportacao(self, UF, df_armazenado):
+        """
+        Aplica à exportação as diferenças entre ela e o armazenamento principal (e não as diferenças da planilha da Caixa).
+        Usado ao refazer um estado: o SQLite já pode conter as alterações cujas escritas em lote para o Sheets se perderam.
+        """
+        diferencas = compara_registros(df_armazenado.fillna(""), self.exportacao.le_estado(UF))
+        print(f"Exportação do estado {UF} comparada com o armazenamento: {len(diferencas['novos'])} novos, "
+              f"{len(diferencas['arquivados'])} arquivados, {len(diferencas['alterados'])} alterados.")
+        self.exportacao.atualiza_estado(UF, diferencas['novos'], diferencas['arquivados'], diferencas['alterados'])
+
+    def _registra_download(self, UF, metadados):
+        """
+        Registra os metadados do download processado, permitindo ignorar a planilha do estado enquanto ela não mudar.
+        Os metadados só são gravados em disco quando o estado é confirmado (após o envio das escritas pendentes).
+        """
+        if metadados:
+            with self.trava:
+                self.metadados_downloads[UF] = metadados
+
+    def _confirma(self, estados):
+        """
+        Efetiva as escritas dos estados processados: envia as escritas pendentes, grava os metadados de download
+        e marca os estados como concluídos no diário.
+        """
+        with etapa('escrita_armazenamento') as registro, self.trava:
+            chamadas_antes = self.chamadas_sheets()
+            self.armazenamento.finaliza()
+            if self.exportacao is not None:
+                self.exportacao.finaliza()
+            registro['chamadas_sheets'] = self.chamadas_sheets() - chamadas_antes
+            salva_metadados_downloads(self.metadados_downloads)
+        for UF in estados:
+            resumo = self._pendentes.pop(UF)
+            if self.diario is not None:
+                self.diario.registra(UF, CONCLUIDO, **resumo)
+
+    def _executa_estado(self, UF, sessao):
+        refaz = self.diario is not None and self.diario.situacao(UF) in (INICIADO, PROCESSADO, FALHOU)
+        if self.diario is not None and not self.simulacao:
+            self.diario.registra(UF, INICIADO)
+        # As novas tentativas também refazem o estado, que pode ter sido interrompido após gravar parte das alterações
+        resumo, tentativas = executa_com_tentativas(
+            lambda tentativa: self.processa_estado(UF, sessao, refaz or tentativa > 1), f"estado {UF}")
+        self._gravados.pop(UF, None)
+        resumo['tentativas'] = tentativas
+        if self.simulacao:
+            return resumo
+
+        with self.trava:
+            self._pendentes[UF] = resumo
+        if self.escritas_em_lote:
+            if self.diario is not None:
+                self.diario.registra(UF, PROCESSADO, **resumo)
+        else:
+            self._confirma([UF])
+        return resumo
+
+    def executa(self, estados, max_estados=MAX_ESTADOS):
+        """
+        Processa a fila de estados com até max_estados workers simultâneos.
+        Retorna os dicionários {UF: resumo} dos estados processados e {UF: erro} dos que falharam.
+        """
+
+        resumos = {}
+        falhas = {}
+        with cria_sessao(max_estados) as sessao, ThreadPoolExecutor(max_workers=max_estados) as executor:
+            futuros = {executor.submit(self._executa_estado, UF, sessao): UF for UF in estados}
+            for futuro in as_completed(futuros):
+                UF = futuros[futuro]
+                try:
+                    resumos[UF] = futuro.result()
+                except Exception as e:
+                    print(f"Falha no processamento do estado {UF} após {MAX_TENTATIVAS} tentativas: {type(e).__name__}: {e}")
+                    falhas[UF] = f"{type(e).__name__}: {e}"
+                    if self.diario is not None and not self.simulacao:
+                        self.diario.registra(UF, FALHOU, erro=falhas[UF], tentativas=MAX_TENTATIVAS)
+
+        # Envia as escritas acumuladas (Sheets) e só então confirma os estados processados
+        if not self.simulacao and self._pendentes:
+            self._confirma(list(self._pendentes))
+        return resumos, falhas
@@ -0,0 +1,192 @@
+"""
+Funções para salvar e carregar snapshots das estatísticas de cada estado (e dos agregados por município e bairro).
+As estatísticas são calculadas uma única vez durante a atualização periódica das planilhas (caixa/main.py)
+e gravadas em arquivos JSON, que são lidos diretamente pela aplicação Flask.
+"""
+
+import os
+import json
+import math
+import hashlib
+from datetime import datetime
+
+
+# Diretório onde são gravados os arquivos de dados gerados pela atualização
+DIRETORIO_DADOS = os.environ.get(
+    "DIRETORIO_DADOS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dados")
+)
+DIRETORIO_SNAPSHOTS = os.path.join(DIRETORIO_DADOS, "snapshots")
+DIRETORIO_GRUPOS = os.path.join(DIRETORIO_DADOS, "grupos")
+DIRETORIO_PARCIAIS = os.path.join(DIRETORIO_DADOS, "parciais")
+
+# Cache em memória dos arquivos já lidos, invalidado pela data de modificação do arquivo
+_cache_snapshots = {}
+_cache_grupos = {}
+_cache_parciais = {}
+
+
+def _converte_json(valor):
+    """
+    Função auxiliar para serializar tipos do numpy/pandas que o módulo json não reconhece.
+    """
+    if hasattr(valor, 'item'):
+        return valor.item()
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def caminho_snapshot(UF):
+    """
+    Função para obter o caminho do arquivo de snapshot de um estado.
+    """
+    return os.path.join(DIRETORIO_SNAPSHOTS, f"{UF}.json")
+
+
+def _sem_nan(conteudo):
+    """
+    Substitui recursivamente os valores NaN por None, para que o arquivo seja um JSON válido (servido também pela API).
+    """
+    if isinstance(conteudo, dict):
+        return {chave: _sem_nan(valor) for chave, valor in conteudo.items()}
+    if isinstance(conteudo, (list, tuple)):
+        return [_sem_nan(valor) for valor in conteudo]
+    if isinstance(conteudo, float) and math.isnan(conteudo):
+        return None
+    return conteudo
+
+
+def _grava_json(caminho, conteudo):
+    """
+    Grava um arquivo JSON de forma atômica, para que a aplicação nunca leia um arquivo incompleto.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, "w", encoding="utf-8") as f:
+        json.dump(_sem_nan(conteudo), f, default=_converte_json, ensure_ascii=False)
+    os.replace(caminho_temporario, caminho)
+
+
+def _le_json(caminho, cache, chave):
+    """
+    Lê um arquivo JSON, reaproveitando a versão em cache enquanto o arquivo não for modificado.
+    Retorna None caso o arquivo não exista.
+    """
+    try:
+        modificado_em = os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+    em_cache = cache.get(chave)
+    if em_cache and em_cache[0] == modificado_em:
+        return em_cache[1]
+
+    with open(caminho, encoding="utf-8") as f:
+        conteudo = json.load(f)
+    cache[chave] = (modificado_em, conteudo)
+    return conteudo
+
+
+def _versao(conteudo):
+    """
+    Calcula a versão de um conteúdo a partir do seu hash, de forma que dados iguais geram a mesma versão.
+    """
+    serializado = json.dumps(conteudo, default=_converte_json, sort_keys=True)
+    return hashlib.sha1(serializado.encode('utf-8')).hexdigest()[:16]
+
+
+def salva_snapshot(UF, dados, stats=None):
+    """
+    Função para salvar o snapshot das estatísticas de um estado.
+    A versão do snapshot é derivada do conteúdo, de forma que dados iguais geram a mesma versão.
+    O arquivo é gravado de forma atômica para que a aplicação nunca leia um snapshot incompleto.
+    """
+
+    versao = _versao({'dados': dados, 'stats': stats})
+
+    snapshot = {
+        'UF': UF,
+        'versao': versao,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'dados': dados,
+        'stats': stats
+    }
+    _grava_json(caminho_snapshot(UF), snapshot)
+
+    print(f"Snapshot do estado {UF} salvo (versão {versao}).")
+    return versao
+
+
+def carrega_snapshot(UF):
+    """
+    Função para carregar o snapshot das estatísticas de um estado.
+    Retorna None caso ainda não exista snapshot para o estado.
+    """
+    return _le_json(caminho_snapshot(UF), _cache_snapshots, UF)
+
+
+def caminho_grupos(UF):
+    """
+    Função para obter o caminho do arquivo com os agregados por município e bairro de um estado.
+    """
+    return os.path.join(DIRETORIO_GRUPOS, f"{UF}.json")
+
+
+def salva_grupos(UF, cidades):
+    """
+    Função para salvar os agregados por município (e, dentro de cada município, por bairro) de um estado.
+    Os agregados são indexados pelo identificador do município, de forma que cada página é uma consulta direta ao dicionário.
+    """
+
+    versao = _versao(cidades)
+    grupos = {
+        'UF': UF,
+        'versao': versao,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'cidades': cidades
+    }
+    _grava_json(caminho_grupos(UF), grupos)
+
+    print(f"Agregados por município do estado {UF} salvos ({len(cidades)} municípios).")
+    return versao
+
+
+def carrega_grupos(UF):
+    """
+    Função para carregar os agregados por município e bairro de um estado.
+    Retorna None caso ainda não existam agregados para o estado.
+    """
+    return _le_json(caminho_grupos(UF), _cache_grupos, UF)
+
+
+def caminho_parcial(UF):
+    """
+    Função para obter o caminho do arquivo com o agregado parcial de um estado, usado nas estatísticas nacionais.
+    """
+    return os.path.join(DIRETORIO_PARCIAIS, f"{UF}.json")
+
+
+def salva_parcial(UF, parcial):
+    """
+    Função para salvar o agregado parcial de um estado.
+    """
+    _grava_json(caminho_parcial(UF), parcial)
+
+
+def carrega_parciais():
+    """
+    Função para carregar os agregados parciais de todos os estados já processados.
+    Apenas os arquivos modificados desde a última leitura são lidos novamente.
+    Retorna um dicionário {UF: agregado parcial}.
+    """
+    if not os.path.isdir(DIRETORIO_PARCIAIS):
+        return {}
+    parciais = {}
+    for arquivo in sorted(os.listdir(DIRETORIO_PARCIAIS)):
+        if arquivo.endswith(".json"):
+            UF = arquivo[:-len(".json")]
+            parcial = _le_json(caminho_parcial(UF), _cache_parciais, UF)
+            if parcial is not None:
+                parciais[UF] = parcial
+    return parciais
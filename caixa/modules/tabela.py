@@ -0,0 +1,210 @@
+"""
+Snapshot binário dos imóveis de cada estado, compartilhado entre os workers da aplicação Flask.
+O arquivo é gravado pela atualização periódica (caixa/main.py) e mapeado em memória (mmap) apenas para leitura pelos workers:
+todos os processos compartilham a mesma cópia física, mantida pelo cache de páginas do sistema operacional.
+Novas versões são gravadas em um arquivo temporário e trocadas de forma atômica (os.replace); cada worker passa a usar
+a nova versão na leitura seguinte, enquanto as leituras em andamento continuam válidas sobre a versão anterior.
+
+Formato do arquivo (UF.imoveis):
+    MAGICO | tamanho do cabeçalho (uint64) | cabeçalho JSON | seções alinhadas em 8 bytes
+    - registros: array estruturado do numpy, com as colunas numéricas (float64) e um código (int32) para cada coluna de texto
+    - para cada coluna de texto, uma tabela de strings internadas: offsets (int64) e os bytes UTF-8 concatenados
+    Os códigos indexam a tabela de strings da coluna; valores ausentes têm código -1.
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+
+import numpy as np
+
+from .snapshot import DIRETORIO_DADOS
+
+
+DIRETORIO_TABELAS = os.path.join(DIRETORIO_DADOS, "tabelas")
+MAGICO = b"IMOVEIS1"
+ALINHAMENTO = 8
+
+# Tabelas já mapeadas, invalidadas quando o arquivo é substituído
+_cache_tabelas = {}
+
+
+def caminho_tabela(UF):
+    """
+    Função para obter o caminho do snapshot binário de um estado.
+    """
+    return os.path.join(DIRETORIO_TABELAS, f"{UF}.imoveis")
+
+
+def _alinha(posicao):
+    return (posicao + ALINHAMENTO - 1) // ALINHAMENTO * ALINHAMENTO
+
+
+def salva_tabela(UF, df):
+    """
+    Função para gravar o snapshot binário dos imóveis de um estado, de forma atômica.
+    """
+
+    import pandas as pd
+    from .planilhas import COLUNAS, COLUNAS_NUMERICAS, organiza_colunas
+
+    df = organiza_colunas(df)
+    colunas_texto = [coluna for coluna in COLUNAS if coluna not in COLUNAS_NUMERICAS]
+    tipo = np.dtype([(coluna, '<f8') for coluna in COLUNAS_NUMERICAS] + [(coluna, '<i4') for coluna in colunas_texto])
+
+    registros = np.empty(len(df), dtype=tipo)
+    for coluna in COLUNAS_NUMERICAS:
+        registros[coluna] = df[coluna].to_numpy(dtype=float)
+
+    # Strings internadas: cada valor distinto é gravado uma única vez, e os registros guardam apenas o seu código
+    # (a seção dos registros é preenchida após o cálculo dos códigos)
+    secoes = [None]
+    textos = {}
+    for coluna in colunas_texto:
+        serie = df[coluna].astype(object)
+        ausentes = serie.isna() | (serie == "")
+        codigos, unicos = pd.factorize(serie.map(str).where(~ausentes, None))
+        registros[coluna] = codigos
+        valores = [valor.encode('utf-8') for valor in unicos]
+        offsets = np.zeros(len(valores) + 1, dtype='<i8')
+        offsets[1:] = np.cumsum([len(valor) for valor in valores])
+        textos[coluna] = {'quantidade': len(valores)}
+        secoes.extend([offsets.tobytes(), b"".join(valores)])
+    secoes[0] = registros.tobytes()
+
+    # Posição de cada seção, relativa ao início da área de dados
+    posicoes = []
+    posicao = 0
+    for secao in secoes:
+        posicoes.append(posicao)
+        posicao = _alinha(posicao + len(secao))
+    for indice, coluna in enumerate(colunas_texto):
+        textos[coluna]['offsets'] = posicoes[1 + 2 * indice]
+        textos[coluna]['bytes'] = posicoes[2 + 2 * indice]
+
+    conteudo = hashlib.sha1()
+    for secao in secoes:
+        conteudo.update(secao)
+    versao = conteudo.hexdigest()[:16]
+
+    cabecalho = json.dumps({
+        'UF': UF,
+        'versao': versao,
+        'linhas': len(registros),
+        'tipo': [list(campo) for campo in tipo.descr],
+        'registros': posicoes[0],
+        'textos': textos,
+    }).encode('utf-8')
+
+    os.makedirs(DIRETORIO_TABELAS, exist_ok=True)
+    caminho = caminho_tabela(UF)
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, "wb") as f:
+        inicio = len(MAGICO) + 8 + len(cabecalho)
+        f.write(MAGICO + struct.pack('<Q', len(cabecalho)) + cabecalho + b"\0" * (_alinha(inicio) - inicio))
+        for posicao, secao in zip(posicoes, secoes):
+            f.write(b"\0" * (_alinha(inicio) + posicao - f.tell()))
+            f.write(secao)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(caminho_temporario, caminho)
+
+    print(f"Snapshot binário do estado {UF} salvo ({len(registros)} imóveis, versão {versao}).")
+    return versao
+
+
+class TabelaImoveis:
+    """
+    Snapshot binário de um estado, mapeado em memória apenas para leitura.
+    As colunas numéricas e os códigos das colunas de texto são arrays do numpy sobre o próprio mapeamento (sem cópia);
+    as strings são decodificadas apenas quando solicitadas.
+    """
+
+    def __init__(self, caminho):
+        with open(caminho, "rb") as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[:len(MAGICO)] != MAGICO:
+            raise ValueError(f"Arquivo de snapshot binário inválido: {caminho}")
+
+        tamanho_cabecalho, = struct.unpack_from('<Q', self._mapa, len(MAGICO))
+        inicio_cabecalho = len(MAGICO) + 8
+        cabecalho = json.loads(self._mapa[inicio_cabecalho:inicio_cabecalho + tamanho_cabecalho])
+        inicio = _alinha(inicio_cabecalho + tamanho_cabecalho)
+
+        self.UF = cabecalho['UF']
+        self.versao = cabecalho['versao']
+        tipo = np.dtype([tuple(campo) for campo in cabecalho['tipo']])
+        self.registros = np.frombuffer(self._mapa, dtype=tipo, count=cabecalho['linhas'], offset=inicio + cabecalho['registros'])
+        self.colunas_texto = list(cabecalho['textos'])
+        self._textos = {}
+        for coluna, secao in cabecalho['textos'].items():
+            offsets = np.frombuffer(self._mapa, dtype='<i8', count=secao['quantidade'] + 1, offset=inicio + secao['offsets'])
+            self._textos[coluna] = (offsets, inicio + secao['bytes'])
+        self._valores = {}
+
+    def __len__(self):
+        return len(self.registros)
+
+    def coluna(self, nome):
+        """
+        Retorna uma coluna numérica, ou os códigos de uma coluna de texto, sem cópia.
+        """
+        return self.registros[nome]
+
+    def valores(self, coluna):
+        """
+        Retorna a lista de valores distintos de uma coluna de texto (indexada pelos códigos), decodificada uma única vez.
+        """
+        if coluna not in self._valores:
+            offsets, inicio = self._textos[coluna]
+            dados = self._mapa[inicio:inicio + int(offsets[-1])]
+            self._valores[coluna] = [dados[a:b].decode('utf-8') for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        return self._valores[coluna]
+
+    def texto(self, coluna, linha):
+        """
+        Retorna o valor de uma coluna de texto em uma linha, decodificando apenas essa string.
+        """
+        codigo = int(self.registros[coluna][linha])
+        if codigo < 0:
+            return None
+        offsets, inicio = self._textos[coluna]
+        return self._mapa[inicio + int(offsets[codigo]):inicio + int(offsets[codigo + 1])].decode('utf-8')
+
+    def para_dataframe(self, colunas=None):
+        """
+        Converte o snapshot (ou algumas colunas) em um DataFrame, com as colunas de texto como category.
+        """
+        import pandas as pd
+
+        dados = {}
+        for nome in colunas or self.registros.dtype.names:
+            if nome in self._textos:
+                dados[nome] = pd.Categorical.from_codes(self.registros[nome], categories=pd.Index(self.valores(nome), dtype=object), validate=False)
+            else:
+                dados[nome] = np.array(self.registros[nome])
+        return pd.DataFrame(dados)
+
+
+def carrega_tabela(UF):
+    """
+    Função para obter o snapshot binário de um estado, mapeado em memória.
+    O mapeamento é reaproveitado enquanto o arquivo não for substituído por uma nova versão.
+    Retorna None caso ainda não exista snapshot binário para o estado.
+    """
+
+    try:
+        estado = os.stat(caminho_tabela(UF))
+    except OSError:
+        return None
+    identificacao = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+    em_cache = _cache_tabelas.get(UF)
+    if em_cache and em_cache[0] == identificacao:
+        return em_cache[1]
+
+    tabela = TabelaImoveis(caminho_tabela(UF))
+    _cache_tabelas[UF] = (identificacao, tabela)
+    return tabela
@@ -0,0 +1,17 @@
+"""
+Configuração dos testes: os arquivos gerados (snapshots, tabelas, publicação e métricas) ficam em um diretório temporário,
+e não em caixa/dados. As variáveis de ambiente são definidas antes da importação dos módulos, que leem os caminhos ao serem importados.
+"""
+
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+os.environ["DIRETORIO_DADOS"] = tempfile.mkdtemp(prefix="caixa-testes-")
+os.environ["LOG_METRICAS"] = ""
+os.environ["MAPS_API"] = ""
+for variavel in ("CAMINHO_BANCO", "CAMINHO_HISTORICO", "CACHE_GEOCODIFICACAO", "ARMAZENAMENTO", "EXPORTA_SHEETS"):
+    os.environ.pop(variavel, None)
@@ -0,0 +1,84 @@
+"""
+Testes do armazenamento local em SQLite (caixa/modules/armazenamento.py): inclusão, arquivamento e atualização de preços,
+migração das colunas de bancos antigos e abertura somente para leitura.
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from caixa.modules.armazenamento import ArmazenamentoSQLite, abre_armazenamento
+from caixa.modules.planilhas import COLUNAS
+
+
+def imoveis(*ids, UF='SP', preco=100000.0):
+    return pd.DataFrame([{'ID_imovel': ID, 'UF': UF, 'Cidade': "Campinas", 'Preco': preco, 'Valor_Avaliacao': 2 * preco,
+                          'Desconto': 50.0, 'Data_Inclusao': "2024-01-01"} for ID in ids], columns=COLUNAS)
+
+
+@pytest.fixture
+def banco(tmp_path):
+    return str(tmp_path / "imoveis.db")
+
+
+def test_inclui_arquiva_e_altera_precos(banco):
+    armazenamento = ArmazenamentoSQLite(banco)
+    df = armazenamento.atualiza_estado('SP', imoveis("1", "2", "3"), imoveis())
+    assert sorted(df['ID_imovel']) == ["1", "2", "3"] and df['Preco'].dtype == float
+    # Outros estados não são afetados
+    armazenamento.atualiza_estado('RJ', imoveis("9", UF='RJ'), imoveis())
+
+    alterados = imoveis("2", preco=80000.0)
+    df = armazenamento.atualiza_estado('SP', imoveis("4"), imoveis("1"), alterados)
+    assert sorted(df['ID_imovel']) == ["2", "3", "4"]
+    assert df.set_index('ID_imovel').loc["2", 'Preco'] == 80000.0
+    # A data de inclusão e os demais campos do imóvel alterado são mantidos
+    assert df.set_index('ID_imovel').loc["2", 'Data_Inclusao'] == "2024-01-01"
+    assert armazenamento.le_arquivados('SP')['ID_imovel'].tolist() == ["1"]
+    assert armazenamento.le_estado('RJ')['ID_imovel'].tolist() == ["9"]
+
+    # Os dados persistem no arquivo
+    assert sorted(ArmazenamentoSQLite(banco).le_estado('SP')['ID_imovel']) == ["2", "3", "4"]
+
+
+def test_ids_normalizados_e_valores_vazios_como_null(banco):
+    armazenamento = ArmazenamentoSQLite(banco)
+    df = imoveis(1234, 5)
+    df['ID_imovel'] = df['ID_imovel'].astype(int)
+    df['Bairro'] = ["", None]
+    armazenamento.atualiza_estado('SP', df, imoveis())
+    # Reinclusão do mesmo imóvel (com o ID como texto) substitui o registro
+    armazenamento.atualiza_estado('SP', imoveis(" 1234 ", preco=1.0), imoveis())
+    df = armazenamento.le_estado('SP').set_index('ID_imovel')
+    assert sorted(df.index) == ["1234", "5"] and df.loc["1234", 'Preco'] == 1.0
+    assert df['Bairro'].isna().all()
+
+
+def test_migra_colunas_de_banco_antigo(banco):
+    conexao = sqlite3.connect(banco)
+    conexao.execute('CREATE TABLE imoveis ("ID_imovel" TEXT, "UF" TEXT, "Preco" REAL)')
+    conexao.execute("INSERT INTO imoveis VALUES ('1', 'SP', 10.0)")
+    conexao.commit()
+    conexao.close()
+
+    df = ArmazenamentoSQLite(banco).le_estado('SP')
+    assert set(COLUNAS) <= set(df.columns)
+    assert df['ID_imovel'].tolist() == ["1"] and df['Latitude'].isna().all()
+
+
+def test_somente_leitura(banco):
+    assert ArmazenamentoSQLite(banco, somente_leitura=True).le_estado('SP').empty
+    assert not os.path.exists(banco)
+
+    ArmazenamentoSQLite(banco).atualiza_estado('SP', imoveis("1"), imoveis())
+    armazenamento = ArmazenamentoSQLite(banco, somente_leitura=True)
+    assert armazenamento.le_estado('SP')['ID_imovel'].tolist() == ["1"]
+    with pytest.raises(sqlite3.OperationalError):
+        armazenamento.atualiza_estado('SP', imoveis("2"), imoveis())
+
+
+def test_backend_desconhecido():
+    with pytest.raises(ValueError):
+        abre_armazenamento(tipo="csv")
@@ -0,0 +1,50 @@
+"""
+Testes do gerador de planilhas sintéticas (caixa/benchmarks/gerador.py) e de uma execução reduzida da suíte de benchmarks.
+"""
+
+import pytest
+
+from caixa.benchmarks import suite
+from caixa.benchmarks.bench_diferencas import prepara_dados
+from caixa.benchmarks.gerador import CABECALHO, gera_csv
+from caixa.modules.diferencas import compara_registros
+from caixa.modules.planilhas import ArquivoLinhas, le_csv_caixa, linhas_csv, trata_planilha
+
+
+def test_gerador_deterministico():
+    assert gera_csv(300, ['SP', 'RJ'], 7) == gera_csv(300, ['SP', 'RJ'], 7)
+    assert gera_csv(300, ['SP', 'RJ'], 7) != gera_csv(300, ['SP', 'RJ'], 8)
+
+
+def test_csv_gerado_no_formato_da_caixa():
+    conteudo = gera_csv(1000, ['SP', 'RJ'], 1)
+    linhas = conteudo.decode('iso-8859-1').split("\r\n")
+    assert linhas[1] == CABECALHO and ";;;;;;;;;;" in linhas
+    df = trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([conteudo]))))
+    # As linhas em branco são descartadas na leitura
+    assert len(df) == 1000 and df['ID_imovel'].is_unique
+    assert set(df['UF']) == {'SP', 'RJ'}
+    assert df['Preco'].notna().all() and (df['Preco'] <= df['Valor_Avaliacao']).all()
+    assert df['Tipo_Imovel'].notna().all() and df['Area_Total'].notna().mean() > 0.8
+
+
+def test_dados_da_comparacao():
+    df_caixa, df_armazenado = prepara_dados(10000)
+    diferencas = compara_registros(df_caixa, df_armazenado)
+    # 1% substituídos por outros IDs e 1% ausentes do armazenamento: 2% de novos, 1% de arquivados e 1% de alterados
+    assert len(diferencas['novos']) == 200
+    assert len(diferencas['arquivados']) == len(diferencas['alterados']) == 100
+
+
+def test_suite_reduzida(capsys):
+    suite.executa([200], memoria=False)
+    saida = capsys.readouterr().out
+    for etapa in suite.ETAPAS:
+        assert f"{etapa:>13}" in saida
+    assert "chamadas à API" in saida
+
+
+@pytest.mark.parametrize("etapa", suite.ETAPAS)
+def test_etapas_executam(etapa):
+    _, funcoes = suite.prepara_etapas(100)
+    assert funcoes[etapa]() is not None
@@ -0,0 +1,158 @@
+"""
+Testes da busca por múltiplos critérios (caixa/modules/busca.py e rota /api/busca): critérios combinados,
+limites das faixas, ordenação com valores ausentes e paginação, comparados com o mesmo filtro feito pelo pandas.
+"""
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.modules import tabela
+from caixa.modules.busca import MAX_POR_PAGINA, IndiceBusca, le_parametros
+from caixa.modules.tabela import carrega_tabela
+
+ESTADOS = ['RJ', 'SP']
+IMOVEIS_POR_ESTADO = 40
+CIDADES = {'RJ': ['Rio de Janeiro', 'Niterói'], 'SP': ['São Paulo', 'Campinas']}
+TIPOS = ['Casa', 'Apartamento', 'Terreno']
+
+
+@pytest.fixture
+def imoveis(tmp_path, monkeypatch):
+    """
+    Imóveis sintéticos com preços e descontos distintos (sem empates na ordenação) e alguns descontos ausentes,
+    gravados como snapshots binários em um diretório temporário.
+    """
+    monkeypatch.setattr(tabela, "DIRETORIO_TABELAS", str(tmp_path))
+    aleatorio = random.Random(0)
+    precos = aleatorio.sample(range(50000, 900000, 1000), len(ESTADOS) * IMOVEIS_POR_ESTADO)
+    linhas = []
+    for UF in ESTADOS:
+        for i in range(IMOVEIS_POR_ESTADO):
+            preco = float(precos[len(linhas)])
+            avaliacao = preco * aleatorio.uniform(1.0, 2.0)
+            linhas.append({
+                'ID_imovel': f"{UF}{i:04d}",
+                'UF': UF,
+                'Cidade': aleatorio.choice(CIDADES[UF]),
+                'Bairro': "Centro",
+                'Preco': preco,
+                'Valor_Avaliacao': avaliacao,
+                'Desconto': np.nan if i % 7 == 0 else (1 - preco / avaliacao) * 100,
+                'Tipo_Imovel': aleatorio.choice(TIPOS),
+                'Modalidade_venda': "Venda Online",
+                'Area_Total': float(aleatorio.randint(40, 400)),
+            })
+    df = pd.DataFrame(linhas)
+    for UF, df_uf in df.groupby('UF'):
+        tabela.salva_tabela(UF, df_uf)
+    return df
+
+
+@pytest.fixture
+def indice(imoveis):
+    return IndiceBusca([carrega_tabela(UF) for UF in ESTADOS])
+
+
+def esperado(df, coluna, decrescente=False):
+    """
+    IDs dos imóveis de df na ordem da busca: valores em ordem crescente (ou decrescente) e ausentes ao final.
+    """
+    validos = df[df[coluna].notna()].sort_values(coluna, ascending=not decrescente, kind='stable')
+    return validos['ID_imovel'].tolist() + df[df[coluna].isna()]['ID_imovel'].tolist()
+
+
+def percorre_paginas(indice, por_pagina, **criterios):
+    """
+    Percorre todas as páginas de uma busca, verificando o total e o tamanho de cada página. Retorna os IDs encontrados.
+    """
+    primeira = indice.busca(por_pagina=por_pagina, **criterios)
+    assert primeira['paginas'] == -(-primeira['total'] // por_pagina)
+    ids = []
+    for pagina in range(1, primeira['paginas'] + 1):
+        resultado = indice.busca(pagina=pagina, por_pagina=por_pagina, **criterios)
+        assert resultado['total'] == primeira['total'] and resultado['pagina'] == pagina
+        restantes = primeira['total'] - (pagina - 1) * por_pagina
+        assert len(resultado['imoveis']) == min(por_pagina, restantes)
+        ids += [imovel['ID_imovel'] for imovel in resultado['imoveis']]
+    return ids
+
+
+@pytest.mark.parametrize("por_pagina", [1, 3, 7, MAX_POR_PAGINA])
+def test_criterios_combinados_em_todas_as_paginas(imoveis, indice, por_pagina):
+    criterios = {
+        'faixas': {'preco': (100000, 600000), 'desconto': (10, None)},
+        'categorias': {'uf': ['SP'], 'tipo': ['casa', 'APARTAMENTO']},
+    }
+    filtro = (imoveis['Preco'].between(100000, 600000) & (imoveis['Desconto'] >= 10) & (imoveis['UF'] == 'SP')
+              & imoveis['Tipo_Imovel'].isin(['Casa', 'Apartamento']))
+    ids = percorre_paginas(indice, por_pagina, **criterios)
+    assert ids == esperado(imoveis[filtro], 'Preco')
+    assert ids
+
+
+def test_limites_das_faixas_sao_inclusivos(imoveis, indice):
+    imovel = imoveis.iloc[5]
+    resultado = indice.busca(faixas={'preco': (imovel['Preco'], imovel['Preco'])})
+    assert [encontrado['ID_imovel'] for encontrado in resultado['imoveis']] == [imovel['ID_imovel']]
+    # Os limites abertos incluem todos os imóveis com o valor
+    assert indice.busca(faixas={'preco': (None, imovel['Preco'])})['total'] == (imoveis['Preco'] <= imovel['Preco']).sum()
+    assert indice.busca(faixas={'desconto': (None, None)})['total'] == imoveis['Desconto'].notna().sum()
+
+
+def test_ordem_decrescente_com_ausentes_ao_final(imoveis, indice):
+    criterios = {'categorias': {'uf': ['RJ'], 'cidade': ['niteroi']}, 'ordem': '-desconto'}
+    ids = percorre_paginas(indice, 4, **criterios)
+    df_filtrado = imoveis[(imoveis['UF'] == 'RJ') & (imoveis['Cidade'] == 'Niterói')]
+    assert ids == esperado(df_filtrado, 'Desconto', decrescente=True)
+    ultima = indice.busca(pagina=-(-len(ids) // 4), por_pagina=4, **criterios)
+    assert ultima['imoveis'][-1]['Desconto'] is None
+
+
+def test_pagina_alem_do_total(indice):
+    resultado = indice.busca(categorias={'uf': ['SP']}, pagina=4, por_pagina=10)
+    assert resultado['paginas'] == 4 and len(resultado['imoveis']) == 10
+    resultado = indice.busca(categorias={'uf': ['SP']}, pagina=5, por_pagina=10)
+    assert resultado['total'] == IMOVEIS_POR_ESTADO and resultado['paginas'] == 4 and resultado['imoveis'] == []
+
+
+def test_sem_resultados(indice):
+    resultado = indice.busca(categorias={'cidade': ['Inexistente']}, faixas={'preco': (0, None)})
+    assert resultado['total'] == 0 and resultado['paginas'] == 0 and resultado['imoveis'] == []
+
+
+@pytest.mark.parametrize("argumentos", [
+    {'pagina': '0'},
+    {'por_pagina': '0'},
+    {'por_pagina': str(MAX_POR_PAGINA + 1)},
+    {'pagina': 'dois'},
+    {'preco_min': 'barato'},
+    {'ordem': 'cidade'},
+])
+def test_parametros_invalidos(argumentos):
+    with pytest.raises(ValueError):
+        le_parametros(argumentos)
+
+
+def test_parametros_validos():
+    parametros = le_parametros({'preco_min': '1000,5', 'desconto_max': '40', 'cidade': 'Campinas,,São Paulo',
+                                'ordem': '-area_total', 'pagina': '2', 'por_pagina': str(MAX_POR_PAGINA)})
+    assert parametros == {'faixas': {'preco': (1000.5, None), 'desconto': (None, 40.0)},
+                          'categorias': {'cidade': ['Campinas', 'São Paulo']}, 'ordem': '-area_total',
+                          'pagina': 2, 'por_pagina': MAX_POR_PAGINA}
+
+
+def test_rota_busca_paginada(imoveis):
+    cliente = aplicacao.app.test_client()
+    resposta = cliente.get("/api/busca?uf=SP&tipo=Terreno&ordem=-preco&por_pagina=2&pagina=1")
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    filtro = (imoveis['UF'] == 'SP') & (imoveis['Tipo_Imovel'] == 'Terreno')
+    assert dados['total'] == filtro.sum()
+    assert [imovel['ID_imovel'] for imovel in dados['imoveis']] == esperado(imoveis[filtro], 'Preco', decrescente=True)[:2]
+
+    assert cliente.get(f"/api/busca?por_pagina={MAX_POR_PAGINA + 1}").status_code == 400
+    assert cliente.get("/api/busca?ordem=bairro").status_code == 400
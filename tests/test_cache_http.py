@@ -0,0 +1,107 @@
+"""
+Testes da validação condicional (ETag e If-None-Match) das respostas geradas por resposta_cacheavel, com e sem gzip,
+e do cache das respostas da API de um estado (/api/imoveis/<uf>).
+"""
+
+import gzip
+
+import pytest
+
+import app as aplicacao
+from app import CACHE_CONTROL, resposta_cacheavel
+from caixa.modules import snapshot
+from caixa.modules.snapshot import salva_snapshot
+
+# Estado não utilizado pelos demais testes
+UF = 'MA'
+
+CORPO_GRANDE = "imóvel;" * 1000
+CORPO_PEQUENO = "imóvel"
+
+
+def responde(corpo, versao="v1", **cabecalhos):
+    with aplicacao.app.test_request_context("/", headers=cabecalhos):
+        return resposta_cacheavel(versao, lambda: corpo)
+
+
+def test_corpo_grande_e_compactado_para_cliente_com_gzip():
+    resposta = responde(CORPO_GRANDE, **{'Accept-Encoding': 'gzip'})
+    assert resposta.status_code == 200
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert resposta.get_etag() == ("v1-gz", False)
+    assert gzip.decompress(resposta.get_data()).decode() == CORPO_GRANDE
+
+
+@pytest.mark.parametrize("corpo", [CORPO_GRANDE, CORPO_PEQUENO], ids=["grande", "pequeno"])
+def test_304_sem_gzip(corpo):
+    resposta = responde(corpo)
+    assert 'Content-Encoding' not in resposta.headers
+    etag = resposta.headers['ETag']
+    assert etag == '"v1"'
+
+    revalidacao = responde(corpo, **{'If-None-Match': etag})
+    assert revalidacao.status_code == 304
+    assert revalidacao.headers['ETag'] == etag
+    assert revalidacao.get_data() == b""
+
+
+@pytest.mark.parametrize("corpo", [CORPO_GRANDE, CORPO_PEQUENO], ids=["grande", "pequeno"])
+def test_304_com_gzip(corpo):
+    # Corpos pequenos não são compactados, e a ETag enviada é a da versão sem compressão
+    resposta = responde(corpo, **{'Accept-Encoding': 'gzip'})
+    etag = resposta.headers['ETag']
+    assert etag == ('"v1-gz"' if corpo is CORPO_GRANDE else '"v1"')
+
+    revalidacao = responde(corpo, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidacao.status_code == 304
+    assert revalidacao.headers['ETag'] == etag
+
+
+def test_etag_compactada_nao_vale_para_cliente_sem_gzip():
+    resposta = responde(CORPO_GRANDE, **{'If-None-Match': '"v1-gz"'})
+    assert resposta.status_code == 200
+    assert 'Content-Encoding' not in resposta.headers
+    assert resposta.get_data(as_text=True) == CORPO_GRANDE
+
+
+def test_nova_versao_gera_o_corpo_novamente():
+    chamadas = []
+    with aplicacao.app.test_request_context("/", headers={'If-None-Match': '"v1"'}):
+        resposta = resposta_cacheavel("v2", lambda: chamadas.append(1) or CORPO_PEQUENO)
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] == '"v2"'
+    assert chamadas == [1]
+
+
+def test_304_nao_gera_o_corpo():
+    with aplicacao.app.test_request_context("/", headers={'If-None-Match': '"v1"'}):
+        resposta = resposta_cacheavel("v1", lambda: pytest.fail("o corpo não deveria ser gerado"))
+    assert resposta.status_code == 304
+
+
+def test_api_do_estado_com_versao_e_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "DIRETORIO_SNAPSHOTS", str(tmp_path))
+    monkeypatch.setattr(snapshot, "_cache_snapshots", {})
+    monkeypatch.setattr(aplicacao, "_cache_respostas", {})
+    serializacoes = []
+    serializa_json = aplicacao.serializa_json
+    monkeypatch.setattr(aplicacao, "serializa_json", lambda conteudo: serializacoes.append(1) or serializa_json(conteudo))
+    cliente = aplicacao.app.test_client()
+
+    versao = salva_snapshot(UF, {'quantidade_imoveis': 3})
+    resposta = cliente.get(f"/api/imoveis/{UF}")
+    assert resposta.status_code == 200 and resposta.get_json()['versao'] == versao
+    assert resposta.headers['ETag'] == f'"{versao}"' and resposta.headers['Cache-Control'] == CACHE_CONTROL
+    assert resposta.headers['Vary'] == 'Accept-Encoding'
+
+    # O cliente que já tem a versão recebe 304, e os demais recebem o corpo guardado em memória
+    assert cliente.get(f"/api/imoveis/{UF}", headers={'If-None-Match': f'"{versao}"'}).status_code == 304
+    assert cliente.get(f"/api/imoveis/{UF}").get_json()['versao'] == versao
+    assert serializacoes == [1]
+
+    # Um novo snapshot muda a versão: a ETag anterior deixa de valer
+    nova_versao = salva_snapshot(UF, {'quantidade_imoveis': 4})
+    snapshot._cache_snapshots.clear()
+    resposta = cliente.get(f"/api/imoveis/{UF}", headers={'If-None-Match': f'"{versao}"'})
+    assert resposta.status_code == 200 and resposta.get_json()['versao'] == nova_versao
+    assert resposta.get_json()['dados'] == {'quantidade_imoveis': 4} and len(serializacoes) == 2
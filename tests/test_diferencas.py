@@ -0,0 +1,72 @@
+"""
+Testes da comparação entre a planilha da Caixa e os registros armazenados (caixa/modules/diferencas.py).
+"""
+
+import numpy as np
+import pandas as pd
+
+from caixa.modules.diferencas import compara_registros, normaliza_ids
+
+
+def registros(*linhas):
+    return pd.DataFrame(linhas, columns=['ID_imovel', 'Preco', 'Desconto'])
+
+
+def test_novos_arquivados_e_alterados():
+    df_caixa = registros(("1", 100.0, 10.0), ("2", 200.0, 20.0), ("4", 400.0, 40.0), ("5", 500.0, 50.0))
+    df_armazenado = registros(("1", 100.0, 10.0), ("2", 250.0, 20.0), ("3", 300.0, 30.0), ("5", 500.0, 45.0))
+    resultado = compara_registros(df_caixa, df_armazenado)
+    assert resultado['novos']['ID_imovel'].tolist() == ["4"]
+    assert resultado['arquivados']['ID_imovel'].tolist() == ["3"]
+    alterados = resultado['alterados']
+    assert alterados['ID_imovel'].tolist() == ["2", "5"]
+    # Os valores atuais vêm da Caixa, e os anteriores do armazenamento
+    assert alterados['Preco'].tolist() == [200.0, 500.0] and alterados['Preco_anterior'].tolist() == [250.0, 500.0]
+    assert alterados['Desconto_anterior'].tolist() == [20.0, 45.0]
+
+
+def test_ids_numericos_e_texto_com_espacos():
+    df_caixa = registros((" 1234 ", 100.0, 10.0), ("0056", 200.0, 20.0))
+    df_armazenado = registros((1234, 100.0, 10.0), (56, 200.0, 20.0))
+    df_armazenado['ID_imovel'] = df_armazenado['ID_imovel'].astype(int)
+    assert normaliza_ids(df_armazenado['ID_imovel']).tolist() == ["1234", "56"]
+    resultado = compara_registros(df_caixa, df_armazenado)
+    # Zeros à esquerda fazem parte do ID: "0056" não corresponde a 56
+    assert resultado['novos']['ID_imovel'].tolist() == ["0056"]
+    assert resultado['arquivados']['ID_imovel'].tolist() == [56]
+    assert resultado['alterados'].empty
+
+
+def test_valores_do_sheets_como_texto_e_tolerancia():
+    df_caixa = registros(("1", 100.004, 10.0), ("2", 200.0, 20.0), ("3", 300.0, np.nan))
+    df_armazenado = registros(("1", "100", "10,0"), ("2", "199,5", "20"), ("3", "300", ""))
+    alterados = compara_registros(df_caixa, df_armazenado)['alterados']
+    # Diferenças abaixo da tolerância e desconto ausente nas duas bases não são alterações
+    assert alterados['ID_imovel'].tolist() == ["2"] and alterados['Preco_anterior'].tolist() == [199.5]
+
+    # Um valor que deixa de existir é uma alteração
+    df_armazenado.loc[2, 'Desconto'] = "30"
+    assert compara_registros(df_caixa, df_armazenado)['alterados']['ID_imovel'].tolist() == ["2", "3"]
+
+
+def test_ids_duplicados_no_armazenamento():
+    df_caixa = registros(("1", 100.0, 10.0))
+    df_armazenado = registros(("1", 150.0, 10.0), ("1", 100.0, 10.0), ("2", 200.0, 20.0), ("2", 200.0, 20.0))
+    resultado = compara_registros(df_caixa, df_armazenado)
+    # A primeira ocorrência de cada ID é a comparada; todas as ocorrências de um ID ausente são arquivadas
+    assert resultado['alterados']['Preco_anterior'].tolist() == [150.0]
+    assert resultado['arquivados'].index.tolist() == [2, 3]
+
+
+def test_igual_a_comparacao_por_conjuntos():
+    aleatorio = np.random.default_rng(1)
+    ids_caixa = aleatorio.choice(5000, 3000, replace=False)
+    ids_armazenados = aleatorio.choice(5000, 3000, replace=False)
+    df_caixa = pd.DataFrame({'ID_imovel': ids_caixa.astype(str), 'Preco': ids_caixa * 10.0, 'Desconto': 0.0})
+    df_armazenado = pd.DataFrame({'ID_imovel': ids_armazenados.astype(str), 'Preco': ids_armazenados * 10.0,
+                                  'Desconto': np.where(ids_armazenados % 7 == 0, 1.0, 0.0)})
+    resultado = compara_registros(df_caixa, df_armazenado)
+    assert set(resultado['novos']['ID_imovel']) == set(map(str, set(ids_caixa) - set(ids_armazenados)))
+    assert set(resultado['arquivados']['ID_imovel']) == set(map(str, set(ids_armazenados) - set(ids_caixa)))
+    assert set(resultado['alterados']['ID_imovel']) == {str(ID) for ID in set(ids_caixa) & set(ids_armazenados)
+                                                        if ID % 7 == 0}
@@ -0,0 +1,161 @@
+"""
+Testes do download das planilhas da Caixa (baixa_planilha): requisições condicionais, comparação do hash do conteúdo,
+leitura em streaming e downloads simultâneos dos estados, com respostas HTTP simuladas.
+"""
+
+import hashlib
+import threading
+
+import pytest
+
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules import planilhas, sincronizacao
+from caixa.modules.armazenamento import ArmazenamentoSQLite
+from caixa.modules.planilhas import (HEADERS, SEM_ALTERACAO, ArquivoLinhas, baixa_planilha, carrega_metadados_downloads,
+                                     cria_sessao, le_csv_caixa, linhas_csv)
+from caixa.modules.sincronizacao import Sincronizacao
+
+CONTEUDO = gera_csv(10, ['AC'], 1)
+
+
+class Resposta:
+    """
+    Resposta HTTP simulada, com a parte da interface do requests utilizada por baixa_planilha.
+    """
+
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.fechada = False
+
+    def iter_content(self, tamanho):
+        for inicio in range(0, len(self.content), tamanho):
+            yield self.content[inicio:inicio + tamanho]
+
+    def close(self):
+        self.fechada = True
+
+
+class Sessao:
+    """
+    Sessão simulada: retorna a resposta configurada e guarda os cabeçalhos de cada requisição.
+    """
+
+    def __init__(self, resposta):
+        self.resposta = resposta
+        self.requisicoes = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requisicoes.append(headers)
+        return self.resposta
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["completo", "streaming"])
+def test_conteudo_novo_retorna_dataframe_com_metadados(streaming):
+    sessao = Sessao(Resposta(200, CONTEUDO, {'ETag': '"a"', 'Last-Modified': "Mon, 01 Jan 2024 00:00:00 GMT"}))
+    df = baixa_planilha('AC', sessao, streaming=streaming)
+    assert len(df) == 10
+    assert df.attrs['metadados'] == {'etag': '"a"', 'last_modified': "Mon, 01 Jan 2024 00:00:00 GMT",
+                                     'hash': hashlib.sha256(CONTEUDO).hexdigest()}
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["completo", "streaming"])
+def test_mesmo_conteudo_com_novos_validadores(streaming):
+    metadados = {'etag': '"a"', 'last_modified': None, 'hash': hashlib.sha256(CONTEUDO).hexdigest()}
+    sessao = Sessao(Resposta(200, CONTEUDO, {'ETag': '"b"', 'Last-Modified': "Tue, 02 Jan 2024 00:00:00 GMT"}))
+    assert baixa_planilha('AC', sessao, metadados, streaming=streaming) is SEM_ALTERACAO
+    assert sessao.requisicoes[0]['If-None-Match'] == '"a"'
+    # Os novos validadores são guardados, para que a próxima requisição condicional receba 304
+    assert metadados == {'etag': '"b"', 'last_modified': "Tue, 02 Jan 2024 00:00:00 GMT",
+                         'hash': hashlib.sha256(CONTEUDO).hexdigest()}
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["completo", "streaming"])
+def test_304_fecha_a_resposta(streaming):
+    resposta = Resposta(304)
+    assert baixa_planilha('AC', Sessao(resposta), {'etag': '"a"'}, streaming=streaming) is SEM_ALTERACAO
+    assert resposta.fechada
+
+
+def test_streaming_le_blocos_com_linhas_partidas(monkeypatch):
+    # Blocos pequenos partem as linhas (e o fim de linha \r\n) entre blocos
+    monkeypatch.setattr("caixa.modules.planilhas.TAMANHO_BLOCO", 7)
+    resposta = Resposta(200, CONTEUDO)
+    df = baixa_planilha('AC', Sessao(resposta), streaming=True)
+    assert df.equals(baixa_planilha('AC', Sessao(Resposta(200, CONTEUDO)), streaming=False))
+    assert resposta.fechada
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["completo", "streaming"])
+def test_pagina_html_no_lugar_do_csv(streaming):
+    resposta = Resposta(200, b"\r\n<!DOCTYPE html>\r\n<html><body>Manuten\xe7\xe3o</body></html>\r\n")
+    assert baixa_planilha('AC', Sessao(resposta), streaming=streaming) is None
+
+
+def test_sessao_compartilhada_com_pool_de_conexoes():
+    with cria_sessao(8) as sessao:
+        adaptador = sessao.get_adapter("https://venda-imoveis.caixa.gov.br/")
+        assert adaptador._pool_maxsize == 8
+        assert sessao.headers['User-Agent'] == HEADERS['User-Agent']
+
+
+def test_estados_baixados_simultaneamente_pela_mesma_sessao(monkeypatch, tmp_path):
+    estados = ['AC', 'AL', 'AM', 'AP']
+    # Cada download espera os demais: a barreira só é liberada se os quatro estiverem em andamento ao mesmo tempo
+    barreira = threading.Barrier(len(estados), timeout=10)
+    sessoes = set()
+
+    def baixa(UF, sessao, metadados):
+        sessoes.add(id(sessao))
+        barreira.wait()
+        return le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(5, [UF], 1)])))
+
+    monkeypatch.setattr(sincronizacao, "baixa_planilha", baixa)
+    armazenamento = ArmazenamentoSQLite(str(tmp_path / "imoveis.db"), somente_leitura=True)
+    resumos, falhas = Sincronizacao(armazenamento, simulacao=True).executa(estados, max_estados=len(estados))
+    assert not falhas and all(resumos[UF]['novos'] == 5 for UF in estados)
+    assert len(sessoes) == 1
+
+
+class ServidorCaixa(Sessao):
+    """
+    Sessão simulada que responde 304 às requisições condicionais com a ETag atual.
+    """
+
+    def __init__(self, conteudo, etag):
+        super().__init__(None)
+        self.conteudo, self.etag = conteudo, etag
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requisicoes.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            return Resposta(304)
+        return Resposta(200, self.conteudo, {'ETag': self.etag})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        pass
+
+
+def test_planilha_sem_alteracao_nao_e_processada_na_execucao_seguinte(monkeypatch, tmp_path):
+    monkeypatch.setattr(planilhas, "ARQUIVO_METADADOS_DOWNLOADS", str(tmp_path / "downloads.json"))
+    servidor = ServidorCaixa(gera_csv(10, ['TO'], 1), '"v1"')
+    monkeypatch.setattr(sincronizacao, "cria_sessao", lambda max_conexoes: servidor)
+    armazenamento = ArmazenamentoSQLite(str(tmp_path / "imoveis.db"))
+
+    resumos, _ = Sincronizacao(armazenamento, metadados_downloads=carrega_metadados_downloads()).executa(['TO'])
+    assert resumos['TO']['novos'] == 10
+    assert carrega_metadados_downloads()['TO']['etag'] == '"v1"'
+
+    # Sem alteração na Caixa: a requisição condicional recebe 304 e o estado não é comparado nem gravado
+    armazenamento.atualiza_estado = None
+    resumos, _ = Sincronizacao(armazenamento, metadados_downloads=carrega_metadados_downloads()).executa(['TO'])
+    assert resumos['TO']['sem_alteracao'] and servidor.requisicoes[-1]['If-None-Match'] == '"v1"'
+
+    # Nova ETag com o mesmo conteúdo: o hash evita o processamento, e a nova ETag é guardada
+    servidor.etag = '"v2"'
+    resumos, _ = Sincronizacao(armazenamento, metadados_downloads=carrega_metadados_downloads()).executa(['TO'])
+    assert resumos['TO']['sem_alteracao'] and carrega_metadados_downloads()['TO']['etag'] == '"v2"'
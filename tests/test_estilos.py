@@ -0,0 +1,36 @@
+"""
+Testes do CSS compilado (static/css/output.css): todas as classes usadas nos templates precisam ter regras próprias,
+já que o Tailwind gera apenas as classes encontradas em ./templates/**/*.html ao compilar o arquivo.
+"""
+
+import glob
+import os
+import re
+
+import pytest
+
+from conftest import RAIZ
+
+CSS = open(os.path.join(RAIZ, "static", "css", "output.css"), encoding="utf-8").read()
+TEMPLATES = sorted(glob.glob(os.path.join(RAIZ, "templates", "*.html")))
+
+
+def classes(caminho):
+    """
+    Classes dos atributos class="..." e das atribuições className de um template (sem as partes geradas pelo Jinja).
+    """
+    conteudo = open(caminho, encoding="utf-8").read()
+    valores = re.findall(r'class="([^"]*)"', conteudo) + re.findall(r"className = '([^']*)'", conteudo)
+    return {classe for valor in valores for classe in valor.split() if not re.search(r"[{}%]", classe)}
+
+
+def seletor(classe):
+    # Caracteres como ':' e '/' são escapados no seletor gerado pelo Tailwind (lg:stats-horizontal -> .lg\:stats-horizontal)
+    return "." + re.sub(r"([:/.\[\]])", r"\\\1", classe)
+
+
+@pytest.mark.parametrize("template", TEMPLATES, ids=os.path.basename)
+def test_classes_dos_templates_estao_compiladas(template):
+    ausentes = sorted(classe for classe in classes(template)
+                      if not re.search(r"^\s*" + re.escape(seletor(classe)) + r"[\s,:{]", CSS, re.MULTILINE))
+    assert not ausentes, f"classes ausentes em output.css (recompile o Tailwind): {', '.join(ausentes)}"
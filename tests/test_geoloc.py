@@ -0,0 +1,106 @@
+"""
+Testes da geocodificação dos imóveis (caixa/modules/geoloc.py): cache persistente, endereços repetidos consultados uma
+única vez e consultas simultâneas limitadas, com um geocodificador offline.
+"""
+
+import threading
+import time
+
+import pandas as pd
+
+from caixa.modules.geoloc import CacheGeocodificacao, GeocodificadorLocal, chave_endereco, geocodifica_df
+from caixa.modules.limitador import LimitadorTaxa
+
+COORDENADAS = {
+    "Rua A, N. 1, Centro, Campinas, SP": (-22.9, -47.06),
+    "Rua B, N. 2, Centro, Campinas, SP": (-22.91, -47.07),
+}
+
+
+def imoveis(*enderecos):
+    return pd.DataFrame([{'ID_imovel': str(i), 'Endereco': endereco, 'Bairro': "Centro", 'Cidade': "Campinas", 'UF': "SP"}
+                         for i, endereco in enumerate(enderecos)])
+
+
+def limitador():
+    return LimitadorTaxa(10 ** 9)
+
+
+def test_chave_normalizada():
+    assert chave_endereco("Rua  São João, 10", "centro", "Itajubá", "mg") == "RUA SAO JOAO, 10|CENTRO|ITAJUBA|MG"
+
+
+def test_enderecos_consultados_uma_unica_vez(tmp_path):
+    caminho = str(tmp_path / "geocodificacao.db")
+    geocodificador = GeocodificadorLocal(COORDENADAS)
+    df = imoveis("Rua A, N. 1", "RUA A,  N. 1", "Rua B, N. 2", "Rua C, N. 3")
+    df = geocodifica_df(df, geocodificador, CacheGeocodificacao(caminho), limitador())
+    # Endereços iguais após a normalização são consultados uma única vez
+    assert geocodificador.consultas == 3 and df.attrs['geocodificacoes'] == 3
+    assert df['Latitude'].tolist()[:3] == [-22.9, -22.9, -22.91] and pd.isna(df['Latitude'].iloc[3])
+    assert df['Longitude'].dtype == float
+
+    # Em uma nova execução, todos os endereços (inclusive os não encontrados) vêm do cache gravado em disco
+    geocodificador = GeocodificadorLocal(COORDENADAS)
+    df = geocodifica_df(imoveis("Rua B, N. 2", "Rua C, N. 3"), geocodificador, CacheGeocodificacao(caminho), limitador())
+    assert geocodificador.consultas == 0 and df.attrs['geocodificacoes'] == 0
+    assert df['Latitude'].iloc[0] == -22.91 and pd.isna(df['Latitude'].iloc[1])
+
+
+class GeocodificadorInstavel(GeocodificadorLocal):
+    """
+    Geocodificador que falha na primeira consulta de cada endereço.
+    """
+
+    def __init__(self, coordenadas):
+        super().__init__(coordenadas)
+        self.falhas = set()
+
+    def geocodifica(self, endereco):
+        if endereco not in self.falhas:
+            self.falhas.add(endereco)
+            raise TimeoutError("tempo esgotado")
+        return super().geocodifica(endereco)
+
+
+def test_erros_nao_gravados_no_cache():
+    cache = CacheGeocodificacao(":memory:")
+    geocodificador = GeocodificadorInstavel(COORDENADAS)
+    df = geocodifica_df(imoveis("Rua A, N. 1"), geocodificador, cache, limitador())
+    assert pd.isna(df['Latitude'].iloc[0]) and cache.busca([chave_endereco("Rua A, N. 1", "Centro", "Campinas", "SP")]) == {}
+    # O endereço é consultado novamente na execução seguinte
+    df = geocodifica_df(imoveis("Rua A, N. 1"), geocodificador, cache, limitador())
+    assert df['Latitude'].iloc[0] == -22.9
+
+
+class GeocodificadorLento(GeocodificadorLocal):
+    """
+    Geocodificador que registra quantas consultas estão em andamento ao mesmo tempo.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.trava = threading.Lock()
+        self.em_andamento = self.maximo = 0
+
+    def geocodifica(self, endereco):
+        with self.trava:
+            self.em_andamento += 1
+            self.maximo = max(self.maximo, self.em_andamento)
+        time.sleep(0.01)
+        with self.trava:
+            self.em_andamento -= 1
+        return super().geocodifica(endereco)
+
+
+def test_consultas_simultaneas_limitadas():
+    geocodificador = GeocodificadorLento()
+    df = imoveis(*[f"Rua {i}" for i in range(20)])
+    geocodifica_df(df, geocodificador, CacheGeocodificacao(":memory:"), limitador(), max_geocodificacoes=3)
+    assert geocodificador.consultas == 20
+    assert 1 < geocodificador.maximo <= 3
+
+
+def test_dataframe_vazio():
+    df = geocodifica_df(imoveis(), cache=CacheGeocodificacao(":memory:"))
+    assert df.empty and {'Latitude', 'Longitude'} <= set(df.columns)
@@ -0,0 +1,92 @@
+"""
+Testes dos agregados por município e bairro (calcula_grupos) e das páginas de município e bairro.
+"""
+
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules import snapshot
+from caixa.modules.planilhas import (ArquivoLinhas, calcula_grupos, identificador, le_csv_caixa, linhas_csv,
+                                     trata_planilha)
+from caixa.modules.snapshot import salva_grupos
+
+# Estado não utilizado pelos demais testes
+UF = 'SE'
+
+
+@pytest.fixture(autouse=True)
+def diretorio_grupos(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "DIRETORIO_GRUPOS", str(tmp_path))
+    monkeypatch.setattr(snapshot, "_cache_grupos", {})
+
+
+def imoveis():
+    return trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(2000, [UF], 3)]))))
+
+
+def test_identificador():
+    assert identificador("São José dos Campos") == "sao-jose-dos-campos"
+    assert identificador(" JARDIM  AMÉRICA ") == "jardim-america"
+
+
+def test_agregados_iguais_ao_calculo_direto():
+    df = imoveis()
+    # Preços abaixo de R$ 100 são ignorados nas estatísticas de preço, mas contam na quantidade
+    df.loc[df.index[:5], 'Preco'] = 50.0
+    cidades = calcula_grupos(df, quantidade_mais_baratos=3)
+
+    df['cidade'] = df['Cidade'].astype(str).map(identificador)
+    df['bairro'] = df['Bairro'].astype(str).map(identificador)
+    validos = df[df['Preco'] >= 100]
+    assert set(cidades) == set(df['cidade'])
+    for (cidade, bairro), grupo in df.groupby(['cidade', 'bairro']):
+        agregados = cidades[cidade]['bairros'][bairro]
+        grupo_valido = validos[(validos['cidade'] == cidade) & (validos['bairro'] == bairro)]
+        assert agregados['quantidade'] == len(grupo)
+        assert agregados['preco_medio'] == pytest.approx(grupo_valido['Preco'].mean())
+        assert agregados['preco_mediano'] == pytest.approx(grupo_valido['Preco'].median())
+        assert agregados['desconto_medio'] == pytest.approx(grupo_valido['Desconto'].mean())
+        assert agregados['maior_desconto'] == pytest.approx(grupo_valido['Desconto'].max())
+        assert [imovel['Preco'] for imovel in agregados['mais_baratos']] == sorted(grupo_valido['Preco'])[:3]
+        assert agregados['modalidades'] == grupo['Modalidade_venda'].astype(str).value_counts().to_dict()
+    for cidade, grupo in df.groupby('cidade'):
+        assert cidades[cidade]['quantidade'] == len(grupo)
+        assert cidades[cidade]['nome'] == grupo['Cidade'].iloc[0]
+        assert sum(bairro['quantidade'] for bairro in cidades[cidade]['bairros'].values()) == len(grupo)
+
+
+def test_grafias_diferentes_agrupadas():
+    df = pd.DataFrame({'ID_imovel': ["1", "2", "3"], 'Cidade': ["SÃO PAULO", "Sao Paulo", "SÃO PAULO"],
+                       'Bairro': ["Centro", "CENTRO", "Sé"], 'Preco': [100.0, 200.0, None], 'Desconto': [10.0, 20.0, None],
+                       'Modalidade_venda': ["Venda Online"] * 3})
+    cidades = calcula_grupos(df)
+    assert list(cidades) == ["sao-paulo"]
+    # O nome exibido é a grafia mais frequente
+    assert cidades["sao-paulo"]['nome'] == "SÃO PAULO" and cidades["sao-paulo"]['quantidade'] == 3
+    assert set(cidades["sao-paulo"]['bairros']) == {"centro", "se"}
+    # Grupos sem preços válidos ficam sem estatísticas de preço
+    se = cidades["sao-paulo"]['bairros']["se"]
+    assert se['preco_medio'] is None and se['mais_baratos'] == []
+    assert calcula_grupos(df.iloc[:0]) == {}
+
+
+def test_paginas_de_municipio_e_bairro():
+    cidades = calcula_grupos(imoveis())
+    salva_grupos(UF, cidades)
+    cidade, dados_cidade = next(iter(cidades.items()))
+    bairro, dados_bairro = next(iter(dados_cidade['bairros'].items()))
+    cliente = aplicacao.app.test_client()
+
+    resposta = cliente.get(f"/imoveis/{UF}/{cidade}")
+    assert resposta.status_code == 200 and dados_cidade['nome'] in resposta.get_data(as_text=True)
+    etag = resposta.headers['ETag']
+    assert cliente.get(f"/imoveis/{UF}/{cidade}", headers={'If-None-Match': etag}).status_code == 304
+
+    resposta = cliente.get(f"/imoveis/{UF}/{cidade}/{bairro}")
+    assert resposta.status_code == 200 and dados_bairro['nome'] in resposta.get_data(as_text=True)
+    assert resposta.headers['ETag'] != etag
+
+    assert cliente.get(f"/imoveis/{UF}/inexistente").status_code == 404
+    assert cliente.get(f"/imoveis/{UF}/{cidade}/inexistente").status_code == 404
@@ -0,0 +1,84 @@
+"""
+Testes do histórico de eventos dos imóveis (caixa/modules/historico.py): listagem, alterações de preço e desconto,
+arquivamento e relistagem, e as consultas do histórico de preços e dos dias no mercado.
+"""
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from caixa.modules.diferencas import compara_registros
+from caixa.modules.historico import (ARQUIVADO, DESCONTO_ALTERADO, LISTADO, PRECO_ALTERADO, RELISTADO,
+                                     HistoricoImoveis)
+
+DATAS = [datetime(2024, 1, 1), datetime(2024, 1, 11), datetime(2024, 2, 1), datetime(2024, 3, 1)]
+
+
+def registros(*linhas):
+    return pd.DataFrame(linhas, columns=['ID_imovel', 'Preco', 'Desconto'])
+
+
+@pytest.fixture
+def historico():
+    return HistoricoImoveis(":memory:")
+
+
+def atualiza(historico, df_caixa, df_armazenado, data):
+    """
+    Registra as diferenças entre a planilha da Caixa e os registros armazenados, como na sincronização.
+    """
+    diferencas = compara_registros(df_caixa, df_armazenado)
+    return historico.registra('SP', diferencas['novos'], diferencas['arquivados'], diferencas['alterados'], data)
+
+
+def test_ciclo_de_vida_de_um_imovel(historico):
+    vazio = registros()
+    assert atualiza(historico, registros(("1", 100000.0, 20.0), ("2", 50000.0, 10.0)), vazio, DATAS[0]) == 2
+    # Preço e desconto alterados na mesma atualização; imóvel 2 arquivado
+    assert atualiza(historico, registros(("1", 90000.0, 28.0)), registros(("1", 100000.0, 20.0), ("2", 50000.0, 10.0)),
+                    DATAS[1]) == 3
+    # Imóvel 1 arquivado e depois relistado
+    assert atualiza(historico, vazio, registros(("1", 90000.0, 28.0)), DATAS[2]) == 1
+    assert atualiza(historico, registros(("1", 85000.0, 32.0)), vazio, DATAS[3]) == 1
+
+    eventos = historico.eventos(" 1 ")
+    assert eventos['tipo'].tolist() == [LISTADO, PRECO_ALTERADO, DESCONTO_ALTERADO, ARQUIVADO, RELISTADO]
+    assert eventos['data'].tolist()[0] == DATAS[0] and set(eventos['UF']) == {'SP'}
+    assert historico.eventos("2")['tipo'].tolist() == [LISTADO, ARQUIVADO]
+
+    # Um único ponto por atualização com alteração de preço ou desconto
+    assert historico.historico_precos("1") == [(DATAS[0], 100000.0, 20.0), (DATAS[1], 90000.0, 28.0),
+                                               (DATAS[3], 85000.0, 32.0)]
+    assert historico.historico_precos("3") == []
+
+
+def test_dias_no_mercado(historico):
+    atualiza(historico, registros(("1", 100.0, 1.0)), registros(), DATAS[0])
+    assert historico.dias_no_mercado("1", ate=datetime(2024, 1, 21)) == 20
+    atualiza(historico, registros(), registros(("1", 100.0, 1.0)), DATAS[1])
+    # Arquivado: a contagem para na data do arquivamento
+    assert historico.dias_no_mercado("1", ate=datetime(2024, 6, 1)) == 10
+    atualiza(historico, registros(("1", 100.0, 1.0)), registros(), DATAS[2])
+    assert historico.dias_no_mercado("1", ate=datetime(2024, 2, 6)) == 15
+    assert historico.dias_no_mercado("9") is None
+
+
+def test_diferencas_repetidas_nao_duplicam_eventos(historico):
+    df_armazenado = registros(("1", 100.0, 10.0), ("3", 5.0, 1.0))
+    df_caixa = registros(("1", 90.0, 10.0), ("2", 200.0, 0.0))
+    assert atualiza(historico, df_armazenado, registros(), DATAS[0]) == 2
+    assert atualiza(historico, df_caixa, df_armazenado, DATAS[1]) == 3
+    # Execução retomada: as mesmas diferenças (novas, alteradas e arquivadas) são registradas novamente em outra data
+    assert atualiza(historico, df_caixa, df_armazenado, DATAS[2]) == 0
+    assert historico.eventos("1")['tipo'].tolist() == [LISTADO, PRECO_ALTERADO]
+    assert historico.eventos("2")['tipo'].tolist() == [LISTADO]
+    assert historico.eventos("3")['tipo'].tolist() == [LISTADO, ARQUIVADO]
+
+
+def test_persistencia_e_valores_como_texto(tmp_path):
+    caminho = str(tmp_path / "historico.db")
+    df = registros((1234, "100,5", ""))
+    df['ID_imovel'] = df['ID_imovel'].astype(int)
+    HistoricoImoveis(caminho).registra('RJ', df, registros(), data=DATAS[0])
+    assert HistoricoImoveis(caminho).historico_precos("1234") == [(DATAS[0], 100.5, None)]
@@ -0,0 +1,79 @@
+"""
+Testes da inicialização da aplicação Flask: a importação não carrega pandas, numpy nem gspread e não abre o armazenamento,
+que é aberto uma única vez, na primeira requisição que precisa dele.
+"""
+
+import threading
+
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.bench_inicializacao import mede_processo
+from caixa.modules import armazenamento
+
+
+@pytest.mark.parametrize("rota", ["/", "/saude"])
+def test_importacao_sem_bibliotecas_pesadas(rota):
+    # Em um novo processo, como em um worker recém-criado do gunicorn
+    medida = mede_processo(rota)
+    assert medida['status'] == 200 and medida['modulos'] == []
+
+
+@pytest.fixture
+def sem_armazenamento(monkeypatch):
+    monkeypatch.setattr(aplicacao, "_armazenamento", None)
+    aberturas = []
+
+    def abre_armazenamento():
+        aberturas.append(threading.get_ident())
+        raise ConnectionError("Google Sheets indisponível")
+
+    monkeypatch.setattr(armazenamento, "abre_armazenamento", abre_armazenamento)
+    return aberturas
+
+
+def test_saude_nao_abre_o_armazenamento(sem_armazenamento):
+    cliente = aplicacao.app.test_client()
+    assert cliente.get("/saude").get_json() == {'status': 'ok'}
+    assert cliente.get("/").status_code == 200
+    assert sem_armazenamento == []
+
+
+def test_prontidao(sem_armazenamento, tmp_path, monkeypatch):
+    monkeypatch.setattr(aplicacao, "DIRETORIO_SNAPSHOTS", str(tmp_path))
+    cliente = aplicacao.app.test_client()
+    # Sem snapshots, as páginas dependem do armazenamento, que está indisponível
+    resposta = cliente.get("/saude/pronto")
+    assert resposta.status_code == 503 and resposta.get_json()['status'] == 'indisponível'
+    assert len(sem_armazenamento) == 1
+
+    # Com snapshots, o armazenamento não é necessário
+    (tmp_path / "SP.json").write_text("{}")
+    resposta = cliente.get("/saude/pronto")
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'status': 'ok', 'snapshots': 1, 'armazenamento': 'não aberto'}
+    assert len(sem_armazenamento) == 1
+
+
+def test_armazenamento_aberto_uma_unica_vez(monkeypatch):
+    monkeypatch.setattr(aplicacao, "_armazenamento", None)
+    aberturas = []
+    barreira = threading.Barrier(8, timeout=10)
+
+    def abre_armazenamento():
+        aberturas.append(1)
+        return object()
+
+    monkeypatch.setattr(armazenamento, "abre_armazenamento", abre_armazenamento)
+    resultados = []
+
+    def obtem():
+        barreira.wait()
+        resultados.append(aplicacao.obtem_armazenamento())
+
+    threads = [threading.Thread(target=obtem) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(aberturas) == 1 and len({id(resultado) for resultado in resultados}) == 1
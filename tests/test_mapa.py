@@ -0,0 +1,104 @@
+"""
+Testes do índice espacial do mapa (caixa/modules/mapa.py): agrupamento em grade por zoom, consulta por área e
+a rota /imoveis/<uf>/pontos.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.modules import mapa
+from caixa.modules.mapa import (ZOOM_MAXIMO, constroi_indice_pontos, consulta_pontos, limites_indice, salva_indice_pontos,
+                                tiles_area)
+
+# Estado não utilizado pelos demais testes
+UF = 'AP'
+# Área com todos os imóveis do teste (oeste, sul, leste, norte)
+BBOX = (-52.0, -11.0, -50.0, -9.0)
+
+
+@pytest.fixture(autouse=True)
+def diretorio_mapas(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapa, "DIRETORIO_MAPAS", str(tmp_path))
+    monkeypatch.setattr(mapa, "_cache_indices", {})
+
+
+def imoveis(quantidade=500, semente=1):
+    aleatorio = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        'ID_imovel': [str(i) for i in range(quantidade)],
+        'Latitude': aleatorio.uniform(-10.9, -9.1, quantidade),
+        'Longitude': aleatorio.uniform(-51.9, -50.1, quantidade),
+        'Preco': aleatorio.uniform(50000, 500000, quantidade).round(2),
+        'Desconto': aleatorio.uniform(0, 60, quantidade),
+        'Endereco': [f"Rua {i}" for i in range(quantidade)],
+        'Link_acesso': [f"link-{i}" for i in range(quantidade)],
+    })
+    # Imóveis sem coordenadas ou sem preço
+    df.loc[0, 'Latitude'] = None
+    df.loc[1, 'Preco'] = None
+    return df
+
+
+@pytest.mark.parametrize("zoom", [0, 4, 8, 12, ZOOM_MAXIMO])
+def test_grupos_cobrem_todos_os_imoveis(zoom):
+    df = imoveis()
+    indice = constroi_indice_pontos(df)
+    features = consulta_pontos(indice, tiles_area(BBOX, zoom), zoom)['features']
+    # Cada imóvel com coordenadas está em exatamente um grupo
+    assert sum(feature['properties']['quantidade'] for feature in features) == len(df) - 1
+    precos = df['Preco'].dropna()
+    minimos = [feature['properties'].get('preco_minimo', feature['properties'].get('preco')) for feature in features]
+    assert min(valor for valor in minimos if valor is not None) == precos[df['Latitude'].notna()].min()
+    if zoom == 0:
+        assert len(features) == 1 and features[0]['properties']['quantidade'] == len(df) - 1
+
+
+def test_grupo_guarda_o_imovel_mais_barato():
+    df = imoveis(4)
+    df['Latitude'] = [-10.0, -10.001, -10.002, -10.003]
+    df['Longitude'] = -51.0
+    df['Preco'] = [300.0, None, 100.0, 200.0]
+    indice = constroi_indice_pontos(df)
+    (grupo,) = consulta_pontos(indice, tiles_area(BBOX, 6), 6)['features']
+    assert grupo['properties'] == {'quantidade': 4, 'preco_minimo': 100.0}
+    assert grupo['geometry']['coordinates'] == [-51.0, -10.0015]
+
+
+def test_imoveis_individuais_acima_do_zoom_maximo():
+    df = imoveis()
+    indice = constroi_indice_pontos(df)
+    area = (-51.0, -10.5, -50.5, -10.0)
+    zoom = ZOOM_MAXIMO + 1
+    features = consulta_pontos(indice, tiles_area(area, zoom), zoom)['features']
+    oeste, sul, leste, norte = area
+    esperados = df[df['Latitude'].between(sul, norte) & df['Longitude'].between(oeste, leste)]
+    # A consulta é alinhada aos tiles: pode incluir imóveis logo além da área, mas nunca deixa de fora os de dentro
+    ids = {feature['properties']['ID_imovel'] for feature in features}
+    assert set(esperados['ID_imovel']) <= ids
+    assert all(feature['properties']['quantidade'] == 1 for feature in features)
+
+
+def test_limites_e_indice_sem_coordenadas():
+    df = imoveis()
+    assert limites_indice(constroi_indice_pontos(df)) == [[df['Latitude'].min(), df['Longitude'].min()],
+                                                          [df['Latitude'].max(), df['Longitude'].max()]]
+    indice = constroi_indice_pontos(df.drop(columns=['Latitude', 'Longitude']))
+    assert limites_indice(indice) is None
+    assert consulta_pontos(indice, (0, 0, 0, 0), 0)['features'] == []
+
+
+def test_rota_de_pontos():
+    salva_indice_pontos(UF, imoveis())
+    cliente = aplicacao.app.test_client()
+    resposta = cliente.get(f"/imoveis/{UF}/pontos?zoom=8&bbox={','.join(map(str, BBOX))}")
+    assert resposta.status_code == 200 and resposta.mimetype == "application/geo+json"
+    assert sum(feature['properties']['quantidade'] for feature in resposta.get_json()['features']) == 499
+    # Respostas de áreas no mesmo intervalo de tiles compartilham a ETag
+    etag = resposta.headers['ETag']
+    resposta = cliente.get(f"/imoveis/{UF}/pontos?zoom=8&bbox=-51.99,-10.99,-50.01,-9.01")
+    assert resposta.headers['ETag'] == etag
+    for bbox in ["1,2,3", "a,b,c,d", "nan,0,1,1", "-inf,0,1,1"]:
+        assert cliente.get(f"/imoveis/{UF}/pontos?bbox={bbox}").status_code == 400
+    assert cliente.get("/imoveis/XX/pontos").status_code == 404
@@ -0,0 +1,98 @@
+"""
+Testes das métricas de desempenho (caixa/modules/metricas.py): registro das etapas da atualização em JSON Lines
+e exportação das métricas HTTP no formato do Prometheus pela rota /metrics.
+"""
+
+import json
+
+import pytest
+
+import app as aplicacao
+from caixa.modules import metricas
+from caixa.modules.metricas import MetricasHTTP, etapa, resumo_etapas
+
+
+@pytest.fixture
+def log_metricas(tmp_path, monkeypatch):
+    caminho = tmp_path / "metricas.jsonl"
+    monkeypatch.setattr(metricas, "LOG_METRICAS", str(caminho))
+    monkeypatch.setattr(metricas, "etapas_registradas", [])
+    return caminho
+
+
+def test_etapas_gravadas_em_json_lines(log_metricas):
+    with etapa('download', 'SP', bytes=10) as registro:
+        registro['chamadas_caixa'] = 1
+    with pytest.raises(ValueError):
+        with etapa('tratamento', 'SP', linhas=5):
+            raise ValueError("planilha inválida")
+
+    registros = [json.loads(linha) for linha in log_metricas.read_text(encoding="utf-8").splitlines()]
+    assert [registro['etapa'] for registro in registros] == ['download', 'tratamento']
+    assert registros[0]['UF'] == 'SP' and registros[0]['bytes'] == 10 and registros[0]['chamadas_caixa'] == 1
+    assert registros[0]['execucao'] == metricas.EXECUCAO and registros[0]['duracao'] >= 0
+    # Etapas interrompidas por erro também são registradas
+    assert registros[1]['erro'] == 'ValueError' and 'erro' not in registros[0]
+    assert metricas.etapas_registradas == registros
+
+
+def test_log_desativado_e_saida_padrao(log_metricas, monkeypatch, capsys):
+    metricas.desativa_log()
+    with etapa('leitura', 'SP'):
+        pass
+    assert not log_metricas.exists() and len(metricas.etapas_registradas) == 1
+
+    monkeypatch.setattr(metricas, "LOG_METRICAS", "-")
+    metricas.desativa_log()
+    with etapa('leitura', 'RJ'):
+        pass
+    assert json.loads(capsys.readouterr().out)['UF'] == 'RJ'
+
+
+def test_resumo_das_etapas(capsys):
+    resumo_etapas([
+        {'etapa': 'download', 'UF': 'SP', 'duracao': 2.0, 'chamadas_caixa': 1},
+        {'etapa': 'download', 'UF': 'RJ', 'duracao': 1.0, 'chamadas_caixa': 1},
+        {'etapa': 'escrita', 'UF': 'SP', 'duracao': 0.5, 'chamadas_sheets': 3},
+    ])
+    saida = capsys.readouterr().out
+    assert "  download: 3.00 s" in saida and "  SP / download: 2.00 s" in saida
+    assert "Chamadas a APIs: caixa: 2, sheets: 3" in saida
+
+
+def test_exportacao_no_formato_do_prometheus():
+    metricas_http = MetricasHTTP(limites=(0.1, 1.0))
+    for duracao in [0.05, 0.5, 5.0]:
+        metricas_http.observa('/imoveis/<uf>', 'GET', 200, duracao)
+    metricas_http.observa('/rota "com" aspas', 'GET', 404, 0.01)
+    for resultado in ['validado', 'memoria', 'gerado', 'gerado']:
+        metricas_http.registra_cache('/imoveis/<uf>', resultado)
+
+    linhas = metricas_http.exporta().splitlines()
+    rotulos = 'rota="/imoveis/<uf>",metodo="GET",status="200"'
+    # As faixas do histograma são cumulativas
+    assert f'caixa_http_requisicao_segundos_bucket{{{rotulos},le="0.1"}} 1' in linhas
+    assert f'caixa_http_requisicao_segundos_bucket{{{rotulos},le="1.0"}} 2' in linhas
+    assert f'caixa_http_requisicao_segundos_bucket{{{rotulos},le="+Inf"}} 3' in linhas
+    assert f'caixa_http_requisicao_segundos_sum{{{rotulos}}} 5.550000' in linhas
+    assert f'caixa_http_requisicao_segundos_count{{{rotulos}}} 3' in linhas
+    assert 'caixa_http_requisicao_segundos_count{rota="/rota \\"com\\" aspas",metodo="GET",status="404"} 1' in linhas
+    assert 'caixa_cache_respostas_total{rota="/imoveis/<uf>",resultado="gerado"} 2' in linhas
+    assert 'caixa_cache_acertos_razao{rota="/imoveis/<uf>"} 0.500000' in linhas
+    # Cada métrica é precedida por HELP e TYPE
+    assert "# TYPE caixa_http_requisicao_segundos histogram" in linhas
+    assert "# TYPE caixa_cache_respostas_total counter" in linhas
+
+
+def test_rota_metrics(monkeypatch):
+    monkeypatch.setattr(aplicacao, "metricas_http", MetricasHTTP())
+    cliente = aplicacao.app.test_client()
+    cliente.get("/saude")
+    cliente.get("/saude")
+    cliente.get("/imoveis/XX")
+    resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200 and resposta.content_type.startswith("text/plain; version=0.0.4")
+    texto = resposta.get_data(as_text=True)
+    assert 'caixa_http_requisicao_segundos_count{rota="/saude",metodo="GET",status="200"} 2' in texto
+    # As métricas usam o modelo da rota, e não o caminho da requisição
+    assert 'caixa_http_requisicao_segundos_count{rota="/imoveis/<uf>",metodo="GET",status="404"} 1' in texto
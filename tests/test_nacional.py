@@ -0,0 +1,97 @@
+"""
+Testes das estatísticas nacionais combinadas a partir dos agregados parciais de cada estado (caixa/modules/nacional.py)
+e da página nacional.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules import snapshot
+from caixa.modules.nacional import (LARGURA_FAIXA_DESCONTO, TOP_K, atualiza_nacional, calcula_parcial, combina_parciais,
+                                    prepara_dados_nacionais, quantil_esboco)
+from caixa.modules.planilhas import ArquivoLinhas, le_csv_caixa, linhas_csv, trata_planilha
+from caixa.modules.snapshot import salva_parcial
+
+ESTADOS = ['BA', 'CE', 'DF']
+
+
+@pytest.fixture(autouse=True)
+def diretorios(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "DIRETORIO_SNAPSHOTS", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshot, "DIRETORIO_PARCIAIS", str(tmp_path / "parciais"))
+    monkeypatch.setattr(snapshot, "_cache_snapshots", {})
+    monkeypatch.setattr(snapshot, "_cache_parciais", {})
+
+
+def imoveis(UF, quantidade=300):
+    return trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(quantidade, [UF], len(UF) + ord(UF[0]))]))))
+
+
+def test_combinacao_igual_ao_parcial_de_todos_os_imoveis():
+    dfs = {UF: imoveis(UF, 200 + 50 * i) for i, UF in enumerate(ESTADOS)}
+    combinado = combina_parciais(calcula_parcial(df) for df in dfs.values())
+    direto = calcula_parcial(pd.concat(dfs.values(), ignore_index=True))
+
+    assert combinado['quantidade'] == direto['quantidade'] == 750
+    for campo in ['preco', 'desconto']:
+        for chave in ['n', 'soma', 'soma_quadrados']:
+            assert combinado[campo][chave] == pytest.approx(direto[campo][chave])
+    assert combinado['desconto']['esboco'] == direto['desconto']['esboco']
+    assert combinado['modalidades'] == direto['modalidades'] and combinado['tipos'] == direto['tipos']
+    for ranking in ['mais_baratos', 'mais_caros', 'mais_descontados']:
+        assert [r['ID_imovel'] for r in combinado[ranking]] == [r['ID_imovel'] for r in direto[ranking]]
+        assert len(combinado[ranking]) == TOP_K
+
+
+def test_mediana_do_esboco():
+    df = pd.concat([imoveis(UF) for UF in ESTADOS], ignore_index=True)
+    esboco = calcula_parcial(df)['desconto']['esboco']
+    mediana = np.median(df.loc[df['Preco'] >= 100, 'Desconto'])
+    assert abs(quantil_esboco(esboco, 0.5) - mediana) <= LARGURA_FAIXA_DESCONTO
+    assert quantil_esboco(esboco, 1.0) == pytest.approx(round(df['Desconto'].max() / LARGURA_FAIXA_DESCONTO) * LARGURA_FAIXA_DESCONTO)
+    assert quantil_esboco({}, 0.5) is None
+
+
+def test_descontos_infinitos_e_precos_invalidos_ignorados():
+    df = imoveis('BA', 20)
+    # Valor de avaliação zerado (desconto infinito) e preço abaixo de R$ 100
+    df.loc[0, ['Valor_Avaliacao', 'Desconto']] = [0.0, -np.inf]
+    df.loc[1, ['Preco', 'Desconto']] = [10.0, 99.9]
+    parcial = calcula_parcial(df)
+    assert parcial['quantidade'] == 20 and parcial['preco']['n'] == 19 and parcial['desconto']['n'] == 18
+    assert np.isfinite(parcial['desconto']['soma'])
+    assert all(np.isfinite(r['Desconto']) for r in parcial['mais_descontados'])
+    assert df.loc[1, 'ID_imovel'] not in {r['ID_imovel'] for r in parcial['mais_baratos']}
+
+
+def test_dados_nacionais():
+    dfs = {UF: imoveis(UF) for UF in ESTADOS}
+    dados = prepara_dados_nacionais({UF: calcula_parcial(df) for UF, df in dfs.items()})
+    df = pd.concat(dfs.values(), ignore_index=True)
+    assert dados['quantidade_imoveis'] == 900 and dados['quantidade_estados'] == 3
+    assert dados['desconto_medio'] == pytest.approx(df['Desconto'].mean())
+    assert dados['mais_baratos'][0]['Preco'] == df['Preco'].min()
+    assert dados['mais_descontado']['Desconto'] == df['Desconto'].max()
+    assert [estado['UF'] for estado in dados['estados']] == ESTADOS
+
+
+def test_pagina_nacional_combina_os_parciais_gravados():
+    cliente = aplicacao.app.test_client()
+    assert cliente.get("/imoveis/brasil").status_code == 404
+
+    # Sem snapshot nacional: a página combina os parciais dos estados
+    for UF in ESTADOS[:2]:
+        salva_parcial(UF, calcula_parcial(imoveis(UF)))
+    resposta = cliente.get("/imoveis/brasil")
+    assert resposta.status_code == 200 and "600" in resposta.get_data(as_text=True)
+
+    # Com o snapshot nacional, o parcial de um estado atualizado entra na versão seguinte
+    versao = atualiza_nacional()
+    salva_parcial(ESTADOS[2], calcula_parcial(imoveis(ESTADOS[2])))
+    nova_versao = atualiza_nacional()
+    assert nova_versao != versao and snapshot.carrega_snapshot("Nacional")['dados']['quantidade_imoveis'] == 900
+    resposta = cliente.get("/imoveis/brasil")
+    assert resposta.status_code == 200 and resposta.headers['ETag'].strip('"').startswith(nova_versao)
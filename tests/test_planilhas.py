@@ -0,0 +1,93 @@
+"""
+Testes da leitura e do tratamento do CSV da Caixa (le_csv_caixa e trata_planilha) e dos dados exibidos na página de um
+estado (prepara_dados_uf), inclusive para estados sem imóveis.
+"""
+
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.modules.planilhas import (COLUNAS, COLUNAS_CATEGORICAS, ArquivoLinhas, le_csv_caixa, linhas_csv,
+                                     prepara_dados_uf, trata_planilha)
+
+# Estado não utilizado pelos demais testes: sem snapshot nem imóveis armazenados
+UF_VAZIO = 'RR'
+
+
+CSV_CAIXA = "\r\n".join([
+    " Lista de Imóveis da Caixa;;;;;;;;;;",
+    " N° do imóvel;UF;Cidade;Bairro;Endereço;Preço;Valor de avaliação;Desconto;Descrição;Modalidade de venda;Link de acesso",
+    " 00012345 ;SP;CAMPINAS;CENTRO;RUA A, N. 1;123.456,78;246.913,56;50,00;"
+    "Apartamento, 48.48 de área total, 43.37 de área privativa, 0.00 de área do terreno, 2 qto(s), WC.;"
+    "Venda Online;https://venda-imoveis.caixa.gov.br/1",
+    ";;;;;;;;;;",
+    " 67890;SP;SANTOS;;RUA B, N. 2;80.000,00;100.000,00;10,00;Terreno, 360.00 de área do terreno.;Licitação Aberta;"
+    "https://venda-imoveis.caixa.gov.br/2",
+]).encode('iso-8859-1')
+
+
+def test_le_e_trata_csv_da_caixa():
+    df = trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([CSV_CAIXA]))))
+    assert len(df) == 2 and set(COLUNAS) - {'Latitude', 'Longitude'} <= set(df.columns)
+    # O ID é mantido como texto (com os zeros à esquerda), sem os espaços ao redor
+    assert df['ID_imovel'].tolist() == ["00012345", "67890"]
+    # Valores monetários no formato brasileiro convertidos para float na leitura
+    assert df['Preco'].tolist() == [123456.78, 80000.0] and df['Valor_Avaliacao'].dtype == float
+    # O desconto é recalculado a partir do preço e do valor de avaliação
+    assert df['Desconto'].tolist() == pytest.approx([50.0, 20.0])
+    assert df['Tipo_Imovel'].tolist() == ["Apartamento", "Terreno"]
+    assert df['Area_Total'].tolist()[0] == 48.48 and pd.isna(df['Area_Total'].tolist()[1])
+    assert df['Area_Privativa'].tolist()[0] == 43.37 and pd.isna(df['Area_Privativa'].tolist()[1])
+    assert df['Area_Terreno'].tolist() == [0.0, 360.0]
+    for coluna in COLUNAS_CATEGORICAS:
+        assert isinstance(df[coluna].dtype, pd.CategoricalDtype) and "" in df[coluna].cat.categories
+    # Valores ausentes nas colunas categóricas viram a string vazia
+    assert df['Bairro'].tolist() == ["CENTRO", ""]
+
+
+def test_precos_como_texto_convertidos():
+    df = pd.DataFrame({' N° do imóvel': [" 1"], 'Preço': ["1.234,50"], 'Valor de avaliação': ["2.469,00"],
+                       'Descrição': ["Casa."], 'UF': ["SP"], 'Cidade': ["CAMPINAS"], 'Bairro': [None],
+                       'Modalidade de venda': ["Venda Online"]})
+    df = trata_planilha(df)
+    assert df['Preco'].tolist() == [1234.5] and df['Desconto'].tolist() == pytest.approx([50.0])
+    assert df['Tipo_Imovel'].tolist() == ["Casa"] and pd.isna(df['Area_Total'].iloc[0])
+
+
+def imovel(ID, preco, desconto, modalidade="Venda Online"):
+    return {'ID_imovel': ID, 'UF': 'SP', 'Cidade': "Campinas", 'Preco': preco, 'Valor_Avaliacao': preco * 2,
+            'Desconto': desconto, 'Tipo_Imovel': "Casa", 'Modalidade_venda': modalidade, 'Link_acesso': f"link-{ID}"}
+
+
+def test_prepara_dados_uf():
+    df = pd.DataFrame([imovel("1", 50.0, 90.0), imovel("2", 100000.0, 20.0),
+                       imovel("3", 300000.0, 45.5, "Leilão SFI"), imovel("4", 200000.0, None)])
+    dados = prepara_dados_uf(df)
+    assert dados['quantidade_imoveis'] == 4
+    # O imóvel com preço abaixo de R$ 100 não entra nas estatísticas
+    assert [registro['ID_imovel'] for registro in dados['mais_baratos']] == ["2", "4", "3"]
+    assert dados['mais_descontado']['ID_imovel'] == "3"
+    assert dados['quantidade_desconto'] == 2
+    assert dados['venda_direta'] == "66.67%"
+
+
+def test_prepara_dados_uf_sem_imoveis():
+    for df in [pd.DataFrame(columns=COLUNAS), pd.DataFrame([imovel("1", 50.0, 90.0)])]:
+        dados = prepara_dados_uf(df)
+        assert dados['mais_baratos'] == [] and dados['mais_caros'] == [] and dados['mais_descontado'] is None
+        assert dados['quantidade_imoveis'] == len(df) and dados['venda_direta'] == '-'
+
+
+def test_prepara_dados_uf_sem_descontos():
+    dados = prepara_dados_uf(pd.DataFrame([imovel("1", 1000.0, None)]))
+    assert dados['mais_descontado'] is None and dados['mais_caros'][0]['ID_imovel'] == "1"
+
+
+def test_rotas_do_estado_sem_imoveis_armazenados():
+    cliente = aplicacao.app.test_client()
+    resposta = cliente.get(f"/imoveis/{UF_VAZIO}")
+    assert resposta.status_code == 200
+    assert "Imóveis disponíveis" in resposta.get_data(as_text=True)
+    resposta = cliente.get(f"/api/imoveis/{UF_VAZIO}")
+    assert resposta.status_code == 200
+    assert resposta.get_json()['dados']['quantidade_imoveis'] == 0
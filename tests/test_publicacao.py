@@ -0,0 +1,111 @@
+"""
+Testes da publicação dos arquivos para download (caixa/modules/publicacao.py) e da rota /dados/<arquivo>.
+"""
+
+import gzip
+import hashlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules import publicacao
+from caixa.modules.planilhas import COLUNAS, ArquivoLinhas, le_csv_caixa, linhas_csv, trata_planilha
+from caixa.modules.publicacao import carrega_manifesto, publica_estado, publica_nacional
+
+
+@pytest.fixture(autouse=True)
+def diretorio_publicacao(tmp_path, monkeypatch):
+    monkeypatch.setattr(publicacao, "DIRETORIO_PUBLICACAO", str(tmp_path))
+    monkeypatch.setattr(publicacao, "_cache_manifesto", {})
+    return tmp_path
+
+
+def imoveis(UF, quantidade=100, semente=1):
+    return trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(quantidade, [UF], semente)]))))
+
+
+def le_publicado(diretorio, chave):
+    return pd.read_csv(os.path.join(diretorio, chave), dtype={'ID_imovel': str}, keep_default_na=False)
+
+
+def test_csv_compactado_com_manifesto(diretorio_publicacao, monkeypatch):
+    monkeypatch.setattr(publicacao, "motor_parquet", lambda: None)
+    df = imoveis('SP')
+    (entrada,) = publica_estado('SP', df)
+
+    chave = "csv/imoveis_SP.csv.gz"
+    caminho = diretorio_publicacao / chave
+    assert carrega_manifesto()['arquivos'][chave] == entrada
+    assert entrada['linhas'] == 100 and entrada['bytes'] == caminho.stat().st_size
+    assert entrada['sha256'] == hashlib.sha256(caminho.read_bytes()).hexdigest()
+    publicado = le_publicado(diretorio_publicacao, chave)
+    assert list(publicado.columns) == COLUNAS
+    assert publicado['ID_imovel'].tolist() == df['ID_imovel'].tolist()
+    assert publicado['Preco'].tolist() == pytest.approx(df['Preco'].tolist())
+    assert not list(diretorio_publicacao.rglob("*.tmp"))
+
+
+def test_arquivo_sem_alteracao_nao_e_substituido(diretorio_publicacao, monkeypatch):
+    monkeypatch.setattr(publicacao, "motor_parquet", lambda: None)
+    publica_estado('SP', imoveis('SP'))
+    caminho = diretorio_publicacao / "csv" / "imoveis_SP.csv.gz"
+    os.utime(caminho, (1000000000, 1000000000))
+
+    # Os mesmos dados geram os mesmos bytes (sem data no cabeçalho do gzip): o arquivo e a sua data são mantidos
+    publica_estado('SP', imoveis('SP'))
+    assert caminho.stat().st_mtime == 1000000000
+    publica_estado('SP', imoveis('SP', semente=2))
+    assert caminho.stat().st_mtime != 1000000000
+
+
+def test_csv_nacional_concatena_os_estados(diretorio_publicacao, monkeypatch):
+    monkeypatch.setattr(publicacao, "motor_parquet", lambda: None)
+    assert publica_nacional() is None
+    dfs = {UF: imoveis(UF, 50 + i) for i, UF in enumerate(['SP', 'AC', 'RJ'])}
+    for UF, df in dfs.items():
+        publica_estado(UF, df)
+    entrada = publica_nacional()
+    assert entrada['UF'] == "BR" and entrada['linhas'] == 153
+
+    publicado = le_publicado(diretorio_publicacao, "csv/imoveis_BR.csv.gz")
+    # Um único cabeçalho, com os estados em ordem alfabética
+    assert len(publicado) == 153 and list(publicado.columns) == COLUNAS
+    assert publicado['ID_imovel'].tolist() == pd.concat([dfs[UF] for UF in ['AC', 'RJ', 'SP']])['ID_imovel'].tolist()
+    # O arquivo nacional não entra na sua própria concatenação
+    assert publica_nacional()['linhas'] == 153
+
+
+def test_parquet_particionado_por_estado(diretorio_publicacao):
+    pytest.importorskip("pyarrow")
+    df = imoveis('SP')
+    publica_estado('SP', df)
+    publicado = pd.read_parquet(diretorio_publicacao / "parquet" / "UF=SP" / "imoveis.parquet")
+    assert 'UF' not in publicado.columns and publicado['ID_imovel'].tolist() == df['ID_imovel'].tolist()
+
+
+def test_rota_de_download_com_range(monkeypatch):
+    monkeypatch.setattr(publicacao, "motor_parquet", lambda: None)
+    publica_estado('SP', imoveis('SP'))
+    entrada = carrega_manifesto()['arquivos']["csv/imoveis_SP.csv.gz"]
+    cliente = aplicacao.app.test_client()
+
+    resposta = cliente.get("/dados/csv/imoveis_SP.csv.gz")
+    conteudo = resposta.get_data()
+    assert resposta.status_code == 200 and resposta.mimetype == "application/gzip"
+    assert resposta.headers['ETag'].strip('"') == entrada['sha256'] and resposta.headers['Accept-Ranges'] == 'bytes'
+    assert len(gzip.GzipFile(fileobj=io.BytesIO(conteudo)).read().splitlines()) == 101
+
+    # Download retomado a partir do byte 100
+    resposta = cliente.get("/dados/csv/imoveis_SP.csv.gz", headers={'Range': "bytes=100-"})
+    assert resposta.status_code == 206 and resposta.get_data() == conteudo[100:]
+    resposta = cliente.get("/dados/csv/imoveis_SP.csv.gz", headers={'If-None-Match': f'"{entrada["sha256"]}"'})
+    assert resposta.status_code == 304
+
+    assert cliente.get("/dados/manifesto.json").get_json()['arquivos'].keys() == {"csv/imoveis_SP.csv.gz"}
+    # Apenas os arquivos do manifesto são servidos
+    assert cliente.get("/dados/csv/imoveis_RJ.csv.gz").status_code == 404
+    assert cliente.get("/dados/csv/imoveis_SP.csv.gz.tmp").status_code == 404
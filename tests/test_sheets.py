@@ -0,0 +1,166 @@
+"""
+Testes do acesso ao Google Sheets, com a planilha simulada em memória (caixa/benchmarks/sheets_memoria.py):
+limitador de taxa, escrita em lote do ClienteSheets, novas tentativas em caso de cota excedida e atualização das abas
+por diferença (ArmazenamentoSheets).
+"""
+
+import gspread
+import pytest
+
+from caixa.benchmarks.sheets_memoria import PlanilhaMemoria
+from caixa.modules import limitador, sheets
+from caixa.modules.armazenamento import ArmazenamentoSheets
+from caixa.modules.limitador import LimitadorTaxa
+from caixa.modules.planilhas import COLUNAS
+from caixa.modules.sheets import ClienteSheets
+
+CABECALHO = ['ID_imovel', 'Preco']
+
+
+class Relogio:
+    """
+    Relógio simulado para o limitador: time.sleep apenas avança o tempo de time.monotonic.
+    """
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(limitador.time, "monotonic", relogio.monotonic)
+    monkeypatch.setattr(limitador.time, "sleep", relogio.sleep)
+    return relogio
+
+
+def cliente(planilha):
+    return ClienteSheets(planilha, leituras_por_minuto=10 ** 9, escritas_por_minuto=10 ** 9)
+
+
+def test_limitador_consome_a_capacidade_e_depois_respeita_a_taxa(relogio):
+    limitador_taxa = LimitadorTaxa(60, capacidade=3)
+    assert [limitador_taxa.aguarda() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Sem fichas: uma ficha por segundo
+    assert limitador_taxa.aguarda() == pytest.approx(1.0)
+    relogio.agora += 2.5
+    assert limitador_taxa.aguarda() == 0.0 and limitador_taxa.aguarda() == 0.0
+    assert limitador_taxa.aguarda() == pytest.approx(0.5)
+    # Após um longo intervalo, o balde não passa da capacidade
+    relogio.agora += 600
+    assert [limitador_taxa.aguarda() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limitador_taxa.aguarda() == pytest.approx(1.0)
+
+
+def test_escritas_de_varias_abas_enviadas_em_lote():
+    planilha = PlanilhaMemoria({
+        'AC': [CABECALHO] + [[str(i), i * 10] for i in range(1, 6)],
+        'SP': [CABECALHO],
+        'Arquivados': [CABECALHO],
+    })
+    cliente_sheets = cliente(planilha)
+    assert len(cliente_sheets.le_registros('AC')) == 5
+    # Remove as linhas 3, 4 e 6 (IDs 2, 3 e 5) e atualiza o preço do ID 4 (linha 5, deslocada pelas remoções acima dela)
+    cliente_sheets.remove_linhas('AC', [3, 4, 6])
+    cliente_sheets.atualiza_celulas('AC', 5, 2, [400])
+    cliente_sheets.adiciona_linhas('AC', [["7", 70]])
+    cliente_sheets.adiciona_linhas('Arquivados', [["2", 20], ["3", 30], ["5", 50]])
+    cliente_sheets.substitui_valores('SP', [CABECALHO] + [[str(i), i] for i in range(1500)])
+    assert cliente_sheets.pendente()
+    planilha.chamadas.clear()
+    cliente_sheets.envia()
+
+    assert not cliente_sheets.pendente()
+    assert planilha.abas['AC'].valores == [CABECALHO, ["1", 10], ["4", 400], ["7", 70]]
+    assert planilha.abas['Arquivados'].valores == [CABECALHO, ["2", 20], ["3", 30], ["5", 50]]
+    # A grade da aba SP (1000 linhas) é ampliada para comportar as novas linhas
+    assert len(planilha.abas['SP'].valores) == 1501 and planilha.abas['SP'].row_count >= 1501
+    # Todas as escritas nas três abas: uma remoção/ampliação, uma limpeza e um único lote de valores
+    # (e uma leitura da primeira coluna da aba Arquivados, ainda não lida, para encontrar a próxima linha livre)
+    assert planilha.chamadas == {'batch_update': 1, 'values_batch_clear': 1, 'values_batch_update': 1, 'col_values': 1}
+
+    # Sem escritas pendentes, envia() não faz chamadas
+    cliente_sheets.envia()
+    assert sum(planilha.chamadas.values()) == 4
+
+
+def test_lotes_limitados_pela_quantidade_de_celulas(monkeypatch):
+    monkeypatch.setattr(sheets, "MAX_CELULAS_POR_LOTE", 100)
+    planilha = PlanilhaMemoria({'AC': [CABECALHO]})
+    cliente_sheets = cliente(planilha)
+    cliente_sheets.adiciona_linhas('AC', [[str(i), i] for i in range(120)])
+    cliente_sheets.envia()
+    assert planilha.chamadas['values_batch_update'] == 3
+    assert [linha[0] for linha in planilha.abas['AC'].valores[1:]] == [str(i) for i in range(120)]
+
+
+class RespostaErro:
+    def __init__(self, codigo):
+        self.codigo = codigo
+
+    def json(self):
+        return {'error': {'code': self.codigo, 'message': "erro simulado", 'status': "ERRO"}}
+
+
+def test_cota_excedida_repetida_com_espera(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(sheets.time, "sleep", esperas.append)
+    planilha = PlanilhaMemoria({'AC': [CABECALHO]})
+    falhas = [429, 503]
+    worksheets = planilha.worksheets
+
+    def worksheets_com_falhas():
+        if falhas:
+            raise gspread.exceptions.APIError(RespostaErro(falhas.pop(0)))
+        return worksheets()
+
+    planilha.worksheets = worksheets_com_falhas
+    cliente_sheets = cliente(planilha)
+    assert cliente_sheets.le_registros('AC') == []
+    assert len(esperas) == 2 and 2 <= esperas[1] < 3
+    assert cliente_sheets.chamadas['leitura'] == 4
+
+    # Erros que não são temporários não são repetidos
+    def worksheets_sem_permissao():
+        raise gspread.exceptions.APIError(RespostaErro(403))
+
+    planilha.worksheets = worksheets_sem_permissao
+    cliente_sheets = cliente(planilha)
+    with pytest.raises(gspread.exceptions.APIError):
+        cliente_sheets.aba('AC')
+    assert cliente_sheets.chamadas['leitura'] == 1
+
+
+def test_armazenamento_sheets_grava_apenas_as_diferencas():
+    linhas = [[str(i), 'AC', "Rio Branco", "", "", 1000.0 * i, 2000.0 * i, 50.0] + [""] * (len(COLUNAS) - 8)
+              for i in range(1, 11)]
+    planilha = PlanilhaMemoria({'AC': [COLUNAS] + linhas, 'Arquivados': [COLUNAS]})
+    armazenamento = ArmazenamentoSheets(planilha)
+    armazenamento.cliente = cliente(planilha)
+
+    df = armazenamento.le_estado('AC')
+    df_novos = df.iloc[:1].assign(ID_imovel="11")
+    df_arquivados = df[df['ID_imovel'].isin(["3", "7"])]
+    df_alterados = df[df['ID_imovel'] == "5"].assign(Preco=500.0, Desconto=75.0)
+    df_atualizado = armazenamento.atualiza_estado('AC', df_novos, df_arquivados, df_alterados)
+    assert sorted(df_atualizado['ID_imovel'].astype(int)) == [1, 2, 4, 5, 6, 8, 9, 10, 11]
+    planilha.chamadas.clear()
+    armazenamento.finaliza()
+
+    # A aba não é limpa nem regravada: apenas as linhas arquivadas são removidas e as novas adicionadas ao final
+    assert 'values_batch_clear' not in planilha.chamadas
+    valores = planilha.abas['AC'].valores
+    assert [linha[0] for linha in valores[1:]] == ["1", "2", "4", "5", "6", "8", "9", "10", "11"]
+    assert valores[4][5:8] == [500.0, 10000.0, 75.0]
+    assert [linha[0] for linha in planilha.abas['Arquivados'].valores[1:]] == ["3", "7"]
+
+    # Alterações já refletidas na aba (ex.: estado refeito após uma interrupção) não são repetidas
+    armazenamento.le_estado('AC')
+    armazenamento.atualiza_estado('AC', df_novos, df_arquivados)
+    assert not armazenamento.cliente.pendente()
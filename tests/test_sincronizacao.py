@@ -0,0 +1,267 @@
+"""
+Testes da atualização periódica em fila (caixa/modules/sincronizacao.py): novas tentativas e retomada de uma execução
+interrompida antes ou depois da gravação no armazenamento, com o SQLite e com o Google Sheets (simulado em memória).
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.gerador import gera_csv
+from caixa.benchmarks.sheets_memoria import PlanilhaMemoria
+from caixa.modules import sincronizacao
+from caixa.modules.armazenamento import ArmazenamentoSQLite, ArmazenamentoSheets
+from caixa.modules.diferencas import normaliza_ids
+from caixa.modules.historico import ARQUIVADO, CODIGOS, DESCONTO_ALTERADO, LISTADO, PRECO_ALTERADO, HistoricoImoveis
+from caixa.modules.planilhas import COLUNAS, ArquivoLinhas, le_csv_caixa, linhas_csv
+from caixa.modules.sheets import ClienteSheets
+from caixa.modules.snapshot import carrega_snapshot
+from caixa.modules.sincronizacao import INICIADO, PROCESSADO, DiarioSincronizacao, Sincronizacao
+
+ESTADOS = ['AC', 'SP']
+IMOVEIS_POR_ESTADO = 20
+
+
+class Queda(BaseException):
+    """
+    Interrupção do processo: assim como KeyboardInterrupt, não é tratada como erro de um estado.
+    """
+
+
+def interrompe(*args, **kwargs):
+    raise Queda()
+
+
+@pytest.fixture
+def planilhas(monkeypatch):
+    """
+    Planilhas da Caixa de cada estado, retornadas pelo download simulado (o teste pode substituí-las).
+    """
+    planilhas = {UF: le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(IMOVEIS_POR_ESTADO, [UF], semente)])))
+                 for semente, UF in enumerate(ESTADOS, 1)}
+    monkeypatch.setattr(sincronizacao, "baixa_planilha", lambda UF, sessao, metadados: planilhas[UF].copy())
+    monkeypatch.setattr(sincronizacao.time, "sleep", lambda segundos: None)
+    return planilhas
+
+
+@pytest.fixture
+def caminhos(tmp_path):
+    return {nome: str(tmp_path / arquivo) for nome, arquivo in
+            [('banco', "imoveis.db"), ('historico', "historico.db"), ('diario', "sincronizacao.json")]}
+
+
+def planilha_vazia():
+    return PlanilhaMemoria({aba: [COLUNAS] for aba in ESTADOS + ['Arquivados']})
+
+
+def sheets(planilha):
+    armazenamento = ArmazenamentoSheets(planilha)
+    armazenamento.cliente = ClienteSheets(planilha, leituras_por_minuto=10 ** 9, escritas_por_minuto=10 ** 9)
+    return armazenamento
+
+
+def executa(caminhos, armazenamento, exportacao=None, historico=None):
+    """
+    Executa a fila de estados, retomando a execução registrada no diário.
+    Retorna (resumos, falhas), ou None se a execução foi interrompida.
+    """
+    diario = DiarioSincronizacao(caminhos['diario'])
+    sincronizacao_estados = Sincronizacao(armazenamento, exportacao, historico, diario=diario)
+    try:
+        resultado = sincronizacao_estados.executa(diario.inicia(ESTADOS), max_estados=2)
+    except Queda:
+        return None
+    diario.conclui()
+    return resultado
+
+
+def aba(planilha, titulo):
+    valores = planilha.abas[titulo].valores
+    return pd.DataFrame(valores[1:], columns=valores[0])
+
+
+def ids(df):
+    return sorted(normaliza_ids(df['ID_imovel']))
+
+
+def contagem_eventos(historico):
+    return dict(historico.conexao.execute("SELECT tipo, COUNT(*) FROM eventos GROUP BY tipo").fetchall())
+
+
+def situacoes(caminhos):
+    diario = DiarioSincronizacao(caminhos['diario'])
+    return {UF: diario.situacao(UF) for UF in ESTADOS}
+
+
+def test_exportacao_interrompida_apos_gravacao_no_sqlite_e_refeita(planilhas, caminhos):
+    planilha = planilha_vazia()
+    historico = HistoricoImoveis(caminhos['historico'])
+
+    exportacao = sheets(planilha)
+    exportacao.finaliza = interrompe
+    assert executa(caminhos, ArmazenamentoSQLite(caminhos['banco']), exportacao, historico) is None
+    # O SQLite já contém os imóveis, mas as escritas em lote para o Sheets se perderam
+    assert situacoes(caminhos) == {UF: PROCESSADO for UF in ESTADOS}
+    assert all(aba(planilha, UF).empty for UF in ESTADOS)
+
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    resumos, falhas = executa(caminhos, armazenamento, sheets(planilha), historico)
+    assert not falhas and DiarioSincronizacao(caminhos['diario']).conteudo['concluida_em']
+    for UF in ESTADOS:
+        assert resumos[UF]['novos'] == 0
+        assert ids(aba(planilha, UF)) == ids(armazenamento.le_estado(UF))
+        assert len(aba(planilha, UF)) == IMOVEIS_POR_ESTADO
+
+    # Nova interrupção, agora com imóveis arquivados e um preço alterado
+    planilhas['SP'] = planilhas['SP'].iloc[3:].copy()
+    planilhas['SP'].iloc[0, planilhas['SP'].columns.get_loc("Preço")] = 1000.0
+    alterado = normaliza_ids(planilhas['SP'][' N° do imóvel']).iloc[0]
+    exportacao = sheets(planilha)
+    exportacao.finaliza = interrompe
+    assert executa(caminhos, ArmazenamentoSQLite(caminhos['banco']), exportacao, historico) is None
+
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    resumos, falhas = executa(caminhos, armazenamento, sheets(planilha), historico)
+    assert not falhas
+    df_sheets = aba(planilha, 'SP')
+    assert ids(df_sheets) == ids(armazenamento.le_estado('SP'))
+    assert len(df_sheets) == IMOVEIS_POR_ESTADO - 3
+    assert len(aba(planilha, 'Arquivados')) == 3
+    preco = df_sheets.loc[normaliza_ids(df_sheets['ID_imovel']) == alterado, 'Preco'].iloc[0]
+    assert float(str(preco).replace(',', '.')) == 1000
+    # A alteração do preço também altera o desconto
+    assert contagem_eventos(historico) == {CODIGOS[LISTADO]: 2 * IMOVEIS_POR_ESTADO, CODIGOS[ARQUIVADO]: 3,
+                                           CODIGOS[PRECO_ALTERADO]: 1, CODIGOS[DESCONTO_ALTERADO]: 1}
+
+
+def test_sheets_interrompido_antes_do_envio_nao_duplica_historico(planilhas, caminhos):
+    planilha = planilha_vazia()
+    historico = HistoricoImoveis(caminhos['historico'])
+
+    armazenamento = sheets(planilha)
+    armazenamento.finaliza = interrompe
+    assert executa(caminhos, armazenamento, historico=historico) is None
+    assert all(aba(planilha, UF).empty for UF in ESTADOS)
+    # O histórico (SQLite) já registrou os imóveis listados
+    assert contagem_eventos(historico) == {CODIGOS[LISTADO]: 2 * IMOVEIS_POR_ESTADO}
+
+    resumos, falhas = executa(caminhos, sheets(planilha), historico=historico)
+    assert not falhas
+    for UF in ESTADOS:
+        assert resumos[UF]['novos'] == IMOVEIS_POR_ESTADO
+        assert len(set(ids(aba(planilha, UF)))) == len(aba(planilha, UF)) == IMOVEIS_POR_ESTADO
+    # Sem eventos repetidos nem relistagens
+    assert contagem_eventos(historico) == {CODIGOS[LISTADO]: 2 * IMOVEIS_POR_ESTADO}
+
+
+def test_interrupcao_antes_da_gravacao_no_armazenamento(planilhas, caminhos):
+    planilha = planilha_vazia()
+    historico = HistoricoImoveis(caminhos['historico'])
+
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    armazenamento.atualiza_estado = interrompe
+    assert executa(caminhos, armazenamento, sheets(planilha), historico) is None
+    assert situacoes(caminhos) == {UF: INICIADO for UF in ESTADOS}
+    assert all(ArmazenamentoSQLite(caminhos['banco']).le_estado(UF).empty for UF in ESTADOS)
+    assert contagem_eventos(historico) == {}
+
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    resumos, falhas = executa(caminhos, armazenamento, sheets(planilha), historico)
+    assert not falhas
+    for UF in ESTADOS:
+        assert resumos[UF]['novos'] == IMOVEIS_POR_ESTADO
+        assert ids(aba(planilha, UF)) == ids(armazenamento.le_estado(UF))
+    assert contagem_eventos(historico) == {CODIGOS[LISTADO]: 2 * IMOVEIS_POR_ESTADO}
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "sheets"])
+def test_nova_tentativa_apos_gravacao_refaz_apenas_as_estatisticas(planilhas, caminhos, monkeypatch, backend):
+    planilha = planilha_vazia()
+    if backend == "sqlite":
+        armazenamento, exportacao = ArmazenamentoSQLite(caminhos['banco']), sheets(planilha)
+    else:
+        armazenamento, exportacao = sheets(planilha), None
+
+    # As estatísticas do estado SP falham na primeira tentativa, depois de gravadas as diferenças
+    chamadas = []
+    falhas_estatisticas = {'SP'}
+    processa_estado, salva_stats = Sincronizacao.processa_estado, Sincronizacao.salva_stats
+
+    def processa_estado_registrado(self, UF, sessao, refaz=False):
+        chamadas.append((UF, refaz))
+        return processa_estado(self, UF, sessao, refaz)
+
+    def salva_stats_com_falha(self, UF, df):
+        if UF in falhas_estatisticas:
+            falhas_estatisticas.discard(UF)
+            raise RuntimeError("falha simulada")
+        return salva_stats(self, UF, df)
+
+    monkeypatch.setattr(Sincronizacao, "processa_estado", processa_estado_registrado)
+    monkeypatch.setattr(Sincronizacao, "salva_stats", salva_stats_com_falha)
+    resumos, falhas = executa(caminhos, armazenamento, exportacao)
+
+    assert not falhas
+    assert resumos['SP']['tentativas'] == 2 and resumos['AC']['tentativas'] == 1
+    assert sorted(chamadas) == [('AC', False), ('SP', False), ('SP', True)]
+    assert resumos['SP']['novos'] == IMOVEIS_POR_ESTADO and resumos['SP']['versao']
+    # As escritas acumuladas para o Sheets não são repetidas pela nova tentativa
+    assert len(aba(planilha, 'SP')) == IMOVEIS_POR_ESTADO
+
+
+def test_simulacao_nao_cria_nem_altera_o_banco(planilhas, caminhos):
+    resumos, falhas = Sincronizacao(ArmazenamentoSQLite(caminhos['banco'], somente_leitura=True), simulacao=True).executa(ESTADOS)
+    assert not falhas and resumos['SP']['novos'] == IMOVEIS_POR_ESTADO
+    assert not os.path.exists(caminhos['banco'])
+
+    executa(caminhos, ArmazenamentoSQLite(caminhos['banco']))
+    modificado = os.path.getmtime(caminhos['banco'])
+    planilhas['SP'] = planilhas['SP'].iloc[5:]
+    resumos, falhas = Sincronizacao(ArmazenamentoSQLite(caminhos['banco'], somente_leitura=True), simulacao=True).executa(ESTADOS)
+    assert resumos['SP']['arquivados'] == 5
+    assert os.path.getmtime(caminhos['banco']) == modificado
+    assert len(ArmazenamentoSQLite(caminhos['banco']).le_estado('SP')) == IMOVEIS_POR_ESTADO
+
+
+def test_estado_sem_imoveis_substitui_o_snapshot(planilhas, caminhos):
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    executa(caminhos, armazenamento)
+    assert carrega_snapshot('AC')['dados']['quantidade_imoveis'] == IMOVEIS_POR_ESTADO
+
+    # Todos os imóveis do estado saem da planilha
+    planilhas['AC'] = planilhas['AC'].iloc[:0]
+    resumos, falhas = executa(caminhos, armazenamento)
+    assert not falhas and resumos['AC']['arquivados'] == IMOVEIS_POR_ESTADO
+    snapshot = carrega_snapshot('AC')
+    assert snapshot['versao'] == resumos['AC']['versao']
+    assert snapshot['dados']['quantidade_imoveis'] == 0 and snapshot['dados']['mais_descontado'] is None
+    assert aplicacao.app.test_client().get("/imoveis/AC").status_code == 200
+
+
+def test_banco_vazio_importado_do_sheets(planilhas, caminhos):
+    # Instalação anterior, com o Sheets como armazenamento principal e três imóveis de SP já arquivados
+    planilha = planilha_vazia()
+    executa(caminhos, sheets(planilha))
+    planilhas['SP'] = planilhas['SP'].iloc[3:].copy()
+    executa(caminhos, sheets(planilha))
+    coluna_data = COLUNAS.index('Data_Inclusao')
+    for linha in planilha.abas['SP'].valores[1:]:
+        linha[coluna_data] = "2024-01-01"
+
+    armazenamento = ArmazenamentoSQLite(caminhos['banco'])
+    assert armazenamento.vazio()
+    assert armazenamento.importa(sheets(planilha), ESTADOS) == (2 * IMOVEIS_POR_ESTADO - 3, 3)
+    assert not armazenamento.vazio()
+    assert set(armazenamento.le_estado('SP')['Data_Inclusao']) == {"2024-01-01"}
+    assert len(armazenamento.le_arquivados('SP')) == 3
+
+    # Após a importação, a planilha da Caixa não traz imóveis novos, e os arquivamentos seguintes chegam à exportação
+    resumos, falhas = executa(caminhos, armazenamento, sheets(planilha))
+    assert not falhas and all(resumos[UF]['novos'] == resumos[UF]['arquivados'] == 0 for UF in ESTADOS)
+    planilhas['AC'] = planilhas['AC'].iloc[2:].copy()
+    resumos, falhas = executa(caminhos, armazenamento, sheets(planilha))
+    assert resumos['AC']['arquivados'] == 2
+    assert ids(aba(planilha, 'AC')) == ids(armazenamento.le_estado('AC'))
+    assert len(aba(planilha, 'Arquivados')) == len(armazenamento.le_arquivados()) == 5
@@ -0,0 +1,79 @@
+"""
+Testes dos snapshots das estatísticas de cada estado (caixa/modules/snapshot.py) e do seu uso pelas rotas do estado,
+que não devem ler os imóveis enquanto houver snapshot.
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.modules import snapshot
+from caixa.modules.planilhas import prepara_dados_uf
+from caixa.modules.snapshot import caminho_snapshot, carrega_snapshot, salva_snapshot
+
+# Estado não utilizado pelos demais testes
+UF = 'PI'
+
+
+@pytest.fixture(autouse=True)
+def diretorio_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "DIRETORIO_SNAPSHOTS", str(tmp_path))
+    monkeypatch.setattr(snapshot, "_cache_snapshots", {})
+
+
+def dados_estado(quantidade):
+    df = pd.DataFrame({
+        'ID_imovel': [str(i) for i in range(quantidade)],
+        'Preco': [1000.0 * (i + 1) for i in range(quantidade)],
+        'Valor_Avaliacao': [2000.0 * (i + 1) for i in range(quantidade)],
+        'Desconto': [50.0] * quantidade,
+        'Modalidade_venda': ["Venda Online"] * quantidade,
+        'Tipo_Imovel': ["Casa"] * quantidade,
+        'Link_acesso': [f"link-{i}" for i in range(quantidade)],
+    })
+    return prepara_dados_uf(df)
+
+
+def test_versao_derivada_do_conteudo():
+    versao = salva_snapshot(UF, dados_estado(3), {'media': 1.5})
+    assert salva_snapshot(UF, dados_estado(3), {'media': 1.5}) == versao
+    assert salva_snapshot(UF, dados_estado(4), {'media': 1.5}) != versao
+    assert carrega_snapshot(UF)['versao'] != versao
+    # A gravação é atômica: não sobram arquivos temporários
+    assert os.listdir(os.path.dirname(caminho_snapshot(UF))) == [f"{UF}.json"]
+
+
+def test_nan_gravado_como_null():
+    salva_snapshot(UF, {'desconto_medio': float('nan'), 'valores': [1.0, float('nan')]})
+    with open(caminho_snapshot(UF), encoding="utf-8") as f:
+        conteudo = json.load(f)
+    assert conteudo['dados'] == {'desconto_medio': None, 'valores': [1.0, None]}
+
+
+def test_snapshot_relido_apenas_quando_o_arquivo_muda():
+    salva_snapshot(UF, dados_estado(3))
+    primeiro = carrega_snapshot(UF)
+    assert carrega_snapshot(UF) is primeiro
+    salva_snapshot(UF, dados_estado(5))
+    modificado_em = os.path.getmtime(caminho_snapshot(UF)) + 10
+    os.utime(caminho_snapshot(UF), (modificado_em, modificado_em))
+    assert carrega_snapshot(UF)['dados']['quantidade_imoveis'] == 5
+
+
+def test_rotas_do_estado_usam_o_snapshot(monkeypatch):
+    def le_imoveis(uf):
+        raise AssertionError("os imóveis não devem ser lidos quando há snapshot")
+
+    monkeypatch.setattr(aplicacao, "le_imoveis", le_imoveis)
+    versao = salva_snapshot(UF, dados_estado(7))
+    cliente = aplicacao.app.test_client()
+    resposta = cliente.get(f"/api/imoveis/{UF}")
+    assert resposta.status_code == 200
+    assert resposta.get_json()['versao'] == versao and resposta.get_json()['dados']['quantidade_imoveis'] == 7
+    resposta = cliente.get(f"/imoveis/{UF}")
+    assert resposta.status_code == 200 and resposta.headers['ETag'].strip('"').startswith(versao)
+    assert carrega_snapshot('XX') is None
+    assert cliente.get("/imoveis/XX").status_code == 404
@@ -0,0 +1,92 @@
+"""
+Testes do snapshot binário dos imóveis de cada estado (caixa/modules/tabela.py), mapeado em memória pelos workers.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as aplicacao
+from caixa.benchmarks.gerador import gera_csv
+from caixa.modules import tabela
+from caixa.modules.planilhas import (COLUNAS, COLUNAS_NUMERICAS, ArquivoLinhas, le_csv_caixa, linhas_csv, organiza_colunas,
+                                     trata_planilha)
+from caixa.modules.tabela import TabelaImoveis, carrega_tabela, salva_tabela
+
+# Estado não utilizado pelos demais testes
+UF = 'ES'
+
+
+@pytest.fixture(autouse=True)
+def diretorio_tabelas(tmp_path, monkeypatch):
+    monkeypatch.setattr(tabela, "DIRETORIO_TABELAS", str(tmp_path))
+    monkeypatch.setattr(tabela, "_cache_tabelas", {})
+
+
+def imoveis(quantidade=200, semente=1):
+    df = trata_planilha(le_csv_caixa(ArquivoLinhas(linhas_csv([gera_csv(quantidade, [UF], semente)]))))
+    # Valores ausentes e texto com acentos
+    df['Latitude'] = np.where(np.arange(len(df)) % 3 == 0, np.nan, -20.3)
+    df['Longitude'] = -40.3
+    df['Bairro'] = df['Bairro'].cat.add_categories(["JARDIM CAMBURI – ÁREA 2"])
+    df.loc[1, 'Bairro'] = "JARDIM CAMBURI – ÁREA 2"
+    df.loc[2, 'Bairro'] = ""
+    return df
+
+
+def test_ida_e_volta():
+    df = imoveis()
+    versao = salva_tabela(UF, df)
+    tabela_uf = carrega_tabela(UF)
+    assert tabela_uf.versao == versao and len(tabela_uf) == len(df)
+
+    esperado = organiza_colunas(df)
+    lido = tabela_uf.para_dataframe()
+    assert list(lido.columns) == COLUNAS_NUMERICAS + [coluna for coluna in COLUNAS if coluna not in COLUNAS_NUMERICAS]
+    for coluna in COLUNAS_NUMERICAS:
+        np.testing.assert_array_equal(lido[coluna].to_numpy(), esperado[coluna].to_numpy(dtype=float))
+    for coluna in ['ID_imovel', 'Cidade', 'Endereco', 'Descricao', 'Link_acesso']:
+        assert lido[coluna].astype(str).tolist() == esperado[coluna].astype(str).tolist()
+    # Strings vazias são gravadas como valores ausentes
+    assert lido.loc[1, 'Bairro'] == "JARDIM CAMBURI – ÁREA 2" and pd.isna(lido.loc[2, 'Bairro'])
+    assert tabela_uf.texto('Bairro', 1) == "JARDIM CAMBURI – ÁREA 2" and tabela_uf.texto('Bairro', 2) is None
+    assert isinstance(lido['Cidade'].dtype, pd.CategoricalDtype)
+
+    # Mesmo conteúdo, mesma versão
+    assert salva_tabela(UF, df) == versao
+
+
+def test_colunas_sem_copia():
+    salva_tabela(UF, imoveis())
+    tabela_uf = carrega_tabela(UF)
+    precos = tabela_uf.coluna('Preco')
+    assert not precos.flags.owndata and not precos.flags.writeable
+    assert list(tabela_uf.para_dataframe(['Preco', 'UF']).columns) == ['Preco', 'UF']
+
+
+def test_nova_versao_substitui_o_mapeamento():
+    salva_tabela(UF, imoveis(200))
+    antiga = carrega_tabela(UF)
+    assert carrega_tabela(UF) is antiga
+    salva_tabela(UF, imoveis(300, semente=2))
+    nova = carrega_tabela(UF)
+    assert nova is not antiga and len(nova) == 300
+    # A versão anterior continua legível por quem ainda a utiliza
+    assert len(antiga.para_dataframe()) == 200
+
+
+def test_arquivo_invalido(tmp_path):
+    (tmp_path / "invalido.imoveis").write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        TabelaImoveis(str(tmp_path / "invalido.imoveis"))
+    assert carrega_tabela('XX') is None
+
+
+def test_rotas_leem_o_snapshot_binario(monkeypatch):
+    def obtem_armazenamento():
+        raise AssertionError("o armazenamento não deve ser aberto quando há snapshot binário")
+
+    monkeypatch.setattr(aplicacao, "obtem_armazenamento", obtem_armazenamento)
+    df = imoveis()
+    salva_tabela(UF, df)
+    assert aplicacao.le_imoveis(UF)['ID_imovel'].astype(str).tolist() == df['ID_imovel'].tolist()